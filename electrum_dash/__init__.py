@@ -12,19 +12,40 @@ if is_local and os.name == 'nt':
 
 
 from .version import ELECTRUM_VERSION
-from .util import format_satoshis
-from .wallet import Wallet
-from .storage import WalletStorage
-from .coinchooser import COIN_CHOOSERS
-from .network import Network, pick_random_server
-from .interface import Interface
-from .simple_config import SimpleConfig
-from . import bitcoin
-from . import transaction
-from . import daemon
-from .transaction import Transaction
-from .plugin import BasePlugin
-from .commands import Commands, known_commands
 
 
 __version__ = ELECTRUM_VERSION
+
+
+# Heavy subsystems are imported on first use, to keep startup of
+# the command line client fast
+_LAZY_ATTRS = {
+    'format_satoshis': 'util',
+    'Wallet': 'wallet',
+    'WalletStorage': 'storage',
+    'COIN_CHOOSERS': 'coinchooser',
+    'Network': 'network',
+    'pick_random_server': 'network',
+    'Interface': 'interface',
+    'SimpleConfig': 'simple_config',
+    'Transaction': 'transaction',
+    'BasePlugin': 'plugin',
+    'Commands': 'commands',
+    'known_commands': 'commands',
+}
+
+
+def __getattr__(name):
+    import importlib
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is not None:
+        value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+        globals()[name] = value
+        return value
+    # submodules, e.g. electrum_dash.bitcoin after "import electrum_dash"
+    try:
+        return importlib.import_module(f'.{name}', __name__)
+    except ModuleNotFoundError as e:
+        if e.name != f'{__name__}.{name}':
+            raise
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
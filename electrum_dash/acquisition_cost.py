@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, Optional, TYPE_CHECKING
+
+from .bitcoin import COIN
+
+if TYPE_CHECKING:
+    from .wallet import Abstract_Wallet
+
+
+NaN = Decimal('NaN')
+DEC_COIN = Decimal(COIN)
+
+
+class AcquisitionCostEngine:
+    '''Average acquisition price of wallet txs inputs for capital gains.
+
+    Prices of txs spending wallet coins are computed once per tx, parents
+    before children (without recursion), and memoized per currency.
+    Cached prices of changed txs and their descendants are invalidated
+    incrementally when txs are added/removed/verified or fiat value set.
+
+    Lock order is wallet.lock -> self.lock, as invalidate is called
+    with wallet.lock held and prices computation uses wallet methods.'''
+
+    def __init__(self, wallet: 'Abstract_Wallet'):
+        self.wallet = wallet
+        self.db = wallet.db
+        self.lock = threading.RLock()
+        self._prices = {}  # ccy -> txid -> average price per coin
+        self._price_funcs = {}  # ccy -> price_func used for _prices[ccy]
+
+    def clear(self):
+        with self.lock:
+            self._prices.clear()
+            self._price_funcs.clear()
+
+    def invalidate(self, txids: Iterable[str]):
+        '''Drop cached prices of txids and of txs depending on them'''
+        with self.lock:
+            if not self._prices:
+                return
+            txids = set(txids)
+            to_check = list(txids)
+            while to_check:
+                txid = to_check.pop()
+                found = False
+                for prices in self._prices.values():
+                    if prices.pop(txid, None) is not None:
+                        found = True
+                if not found and txid not in txids:
+                    continue  # descendants of not cached tx are not cached
+                for n in self.db.get_spent_outpoints(txid):
+                    child = self.db.get_spent_outpoint(txid, n)
+                    if child:
+                        to_check.append(child)
+
+    def _get_prices(self, price_func, ccy) -> Dict[str, Decimal]:
+        prices = self._prices.get(ccy)
+        if prices is None or self._price_funcs.get(ccy) != price_func:
+            prices = self._prices[ccy] = {}
+            self._price_funcs[ccy] = price_func
+        return prices
+
+    def _get_inputs(self, txid):
+        '''List of (prevout txid, value) of wallet inputs of txid'''
+        res = []
+        for addr in self.db.get_txi_addresses(txid):
+            for ser, v in self.db.get_txi_addr(txid, addr):
+                res.append((ser.split(':')[0], v))
+        return res
+
+    def _external_coin_price(self, txid, price_func, ccy,
+                             txin_value) -> Decimal:
+        '''Price of coin created by tx without wallet inputs'''
+        fiat_value = self.wallet.get_fiat_value(txid, ccy)
+        if fiat_value is not None:
+            return fiat_value
+        p = self.wallet.price_at_timestamp(txid, price_func)
+        return p * txin_value / DEC_COIN
+
+    def average_price(self, txid: str, price_func: Callable,
+                      ccy: str) -> Decimal:
+        '''Average acquisition price of the inputs of a transaction'''
+        with self.wallet.lock, self.lock:
+            prices = self._get_prices(price_func, ccy)
+            res = prices.get(txid)
+            if res is not None:
+                return res
+            if not self.db.get_txi_addresses(txid):
+                return NaN
+            # depth first walk of parents with wallet inputs, computing
+            # prices after all parents prices are known
+            stack = [(txid, None)]
+            visiting = set()
+            while stack:
+                cur, inputs = stack.pop()
+                if cur in prices:
+                    continue
+                if inputs is None:
+                    inputs = self._get_inputs(cur)
+                    visiting.add(cur)
+                    stack.append((cur, inputs))
+                    for prev_txid, v in inputs:
+                        if (prev_txid not in prices
+                                and prev_txid not in visiting
+                                and self.db.get_txi_addresses(prev_txid)):
+                            stack.append((prev_txid, None))
+                    continue
+                visiting.discard(cur)
+                input_value = 0
+                total_price = []
+                for prev_txid, v in inputs:
+                    input_value += v
+                    prev_price = prices.get(prev_txid)
+                    if prev_price is not None:
+                        total_price.append(prev_price * v / DEC_COIN)
+                    elif prev_txid in visiting:  # broken db with cycle
+                        total_price.append(NaN)
+                    else:
+                        total_price.append(self._external_coin_price(
+                            prev_txid, price_func, ccy, v))
+                if not input_value:
+                    prices[cur] = NaN
+                else:
+                    total = sum(total_price, Decimal(0))
+                    prices[cur] = total / (input_value / DEC_COIN)
+            return prices[txid]
+
+    def coin_price(self, txid: str, price_func: Callable, ccy: str,
+                   txin_value: Optional[int]) -> Decimal:
+        '''Acquisition price of a coin.
+        This assumes that either all inputs are mine, or no input is mine.'''
+        if txin_value is None:
+            return NaN
+        if self.db.get_txi_addresses(txid):
+            avg_price = self.average_price(txid, price_func, ccy)
+            return avg_price * txin_value / DEC_COIN
+        return self._external_coin_price(txid, price_func, ccy, txin_value)
@@ -74,6 +74,15 @@ class TxWalletDelta(NamedTuple):
     fee: Optional[int]
 
 
+class TxCalcCache(dict):
+    '''Results of per tx calculations by txid, with hit/miss counters'''
+
+    def __init__(self):
+        super().__init__()
+        self.hits = 0
+        self.misses = 0
+
+
 class AddressSynchronizer(Logger):
     """
     inherited by wallet
@@ -106,6 +115,8 @@ class AddressSynchronizer(Logger):
         self._tx_deltas_cache = defaultdict(int)        # txid -> delta
         self._tx_deltas_related_txs = defaultdict(set)  # addr -> set(txids)
         self._get_addr_balance_cache = {}
+        self._tx_fee_cache = TxCalcCache()          # txid -> (confirmed, fee)
+        self._wallet_delta_cache = TxCalcCache()    # txid -> TxWalletDelta
 
         self.load_and_cleanup()
 
@@ -201,6 +212,7 @@ class AddressSynchronizer(Logger):
         if self.network is not None:
             self.synchronizer = Synchronizer(self)
             self.verifier = SPV(self.network, self)
+            self.network.shared_cache.register_db(self.db)
             util.register_callback(self.on_blockchain_updated, ['blockchain_updated'])
             self.protx_manager.on_network_start(self.network)
             self.psman.on_network_start(self.network)
@@ -248,6 +260,7 @@ class AddressSynchronizer(Logger):
             finally:  # even if we get cancelled
                 self.synchronizer = None
                 self.verifier = None
+                self.network.shared_cache.unregister_db(self.db)
                 util.unregister_callback(self.on_blockchain_updated)
                 self.psman.on_stop_threads()
                 util.unregister_callback(self.on_dash_islock)
@@ -391,6 +404,7 @@ class AddressSynchronizer(Logger):
             self.db.add_num_inputs_to_tx(tx_hash, len(tx.inputs()))
             self.update_tx_deltas_cache_on_tx(tx_hash, tx, is_added=True)
             self.update_addrs_with_coins_cache_on_tx(tx)
+            self.invalidate_tx_calc_cache(tx_hash)
             if is_new_tx and self.psman.enabled:
                 self.psman._add_tx_ps_data(tx_hash, tx)
             if is_new_tx and not self.is_local_tx(tx_hash):
@@ -430,6 +444,7 @@ class AddressSynchronizer(Logger):
 
         with self.lock, self.transaction_lock:
             self.logger.info(f"removing tx from history {tx_hash}")
+            self.invalidate_tx_calc_cache(tx_hash)
             if self.psman.enabled:
                 self.psman._rm_tx_ps_data(tx_hash)
             tx = self.db.remove_transaction(tx_hash)
@@ -496,6 +511,7 @@ class AddressSynchronizer(Logger):
         # Store fees
         for tx_hash, fee_sat in tx_fees.items():
             self.db.add_tx_fee_from_server(tx_hash, fee_sat)
+            self._tx_fee_cache.pop(tx_hash, None)
         # unsubscribe from spent ps coins addresses
         if self.psman.enabled:
             self.psman.unsubscribe_spent_addr(addr, hist)
@@ -573,6 +589,28 @@ class AddressSynchronizer(Logger):
         for rtxid in related:
             self.update_tx_deltas_cache_on_tx(rtxid, None, is_added=True)
 
+    def invalidate_tx_calc_cache(self, txid):
+        '''Drop cached fee/wallet delta of tx and of txs spending its
+        outputs, as values of their inputs can be resolved now'''
+        txids = {txid}
+        for n in self.db.get_spent_outpoints(txid):
+            spending_txid = self.db.get_spent_outpoint(txid, n)
+            if spending_txid:
+                txids.add(spending_txid)
+        for txid in txids:
+            self._tx_fee_cache.pop(txid, None)
+            self._wallet_delta_cache.pop(txid, None)
+
+    def get_tx_calc_cache_stats(self) -> dict:
+        return {
+            'tx_fee': {'size': len(self._tx_fee_cache),
+                       'hits': self._tx_fee_cache.hits,
+                       'misses': self._tx_fee_cache.misses},
+            'wallet_delta': {'size': len(self._wallet_delta_cache),
+                             'hits': self._wallet_delta_cache.hits,
+                             'misses': self._wallet_delta_cache.misses},
+        }
+
     def is_addr_with_coins(self, addr, local_height):
         addr_outputs = self.get_addr_outputs(addr)
         for k, v in list(addr_outputs.items()):
@@ -618,6 +656,8 @@ class AddressSynchronizer(Logger):
                 self._tx_deltas_cache = defaultdict(int)
                 self._tx_deltas_related_txs = defaultdict(set)
                 self._addrs_with_coins_cache = set()
+                self._tx_fee_cache.clear()
+                self._wallet_delta_cache.clear()
 
     def get_txpos(self, tx_hash, islock):
         """Returns (height, txpos) tuple, even if the tx is unverified."""
@@ -919,6 +959,22 @@ class AddressSynchronizer(Logger):
 
     def get_wallet_delta(self, tx: Transaction) -> TxWalletDelta:
         """effect of tx on wallet"""
+        if isinstance(tx, PartialTransaction):
+            return self._get_wallet_delta(tx)
+        txid = tx.txid()
+        cache = self._wallet_delta_cache
+        res = cache.get(txid)
+        if res is not None:
+            cache.hits += 1
+            return res
+        cache.misses += 1
+        with self.lock, self.transaction_lock:
+            res = self._get_wallet_delta(tx)
+            if self.db.get_transaction(txid) is not None:
+                cache[txid] = res
+        return res
+
+    def _get_wallet_delta(self, tx: Transaction) -> TxWalletDelta:
         is_relevant = False  # "related to wallet?"
         num_input_ismine = 0
         v_in = v_in_mine = v_out = v_out_mine = 0
@@ -957,12 +1013,24 @@ class AddressSynchronizer(Logger):
 
     def get_tx_fee(self, txid: str) -> Optional[int]:
         """ Returns tx_fee or None. Use server fee only if tx is unconfirmed and not mine"""
+        # cached value is used if tx confirmation status is not changed
+        confirmed = self.get_tx_height(txid).conf > 0
+        cache = self._tx_fee_cache
+        cached = cache.get(txid)
+        if cached is not None and cached[0] == confirmed:
+            cache.hits += 1
+            return cached[1]
+        cache.misses += 1
+        fee = self._get_tx_fee(txid, confirmed)
+        cache[txid] = (confirmed, fee)
+        return fee
+
+    def _get_tx_fee(self, txid: str, confirmed: bool) -> Optional[int]:
         # check if stored fee is available
         fee = self.db.get_tx_fee(txid, trust_server=False)
         if fee is not None:
             return fee
         # delete server-sent fee for confirmed txns
-        confirmed = self.get_tx_height(txid).conf > 0
         if confirmed:
             self.db.add_tx_fee_from_server(txid, None)
         # if all inputs are ismine, try to calc fee now;
@@ -739,7 +739,9 @@ class BaseWizard(Logger):
         if self.unfinished_multisig and storage.is_encrypted_with_user_pw():
             storage.decrypt(pw_args.password)
         if pw_args.encrypt_storage:
-            storage.set_password(pw_args.password, enc_version=pw_args.storage_enc_version)
+            chunked = bool(self.config.get('wallet_chunked_encryption'))
+            storage.set_password(pw_args.password, enc_version=pw_args.storage_enc_version,
+                                 chunked=chunked)
         db = WalletDB('', manual_upgrades=False)
         db.set_keystore_encryption(bool(pw_args.password) and pw_args.encrypt_keystore)
         for key, value in self.data.items():
@@ -200,8 +200,8 @@ def rev_hex(s: str) -> str:
     return bh2u(bfh(s)[::-1])
 
 
-def int_to_hex(i: int, length: int=1) -> str:
-    """Converts int to little-endian hex string.
+def int_to_bytes(i: int, length: int=1) -> bytes:
+    """Converts int to little-endian bytes.
     `length` is the number of bytes available
     """
     if not isinstance(i, int):
@@ -212,9 +212,14 @@ def int_to_hex(i: int, length: int=1) -> str:
     if i < 0:
         # two's complement
         i = range_size + i
-    s = hex(i)[2:].rstrip('L')
-    s = "0"*(2*length - len(s)) + s
-    return rev_hex(s)
+    return i.to_bytes(length, 'little')
+
+
+def int_to_hex(i: int, length: int=1) -> str:
+    """Converts int to little-endian hex string.
+    `length` is the number of bytes available
+    """
+    return int_to_bytes(i, length).hex()
 
 def script_num_to_hex(i: int) -> str:
     """See CScriptNum in Bitcoin Core.
@@ -240,19 +245,23 @@ def script_num_to_hex(i: int) -> str:
     return bh2u(result)
 
 
-def var_int(i: int) -> str:
+def var_int_bytes(i: int) -> bytes:
     # https://en.bitcoin.it/wiki/Protocol_specification#Variable_length_integer
     # https://github.com/bitcoin/bitcoin/blob/efe1ee0d8d7f82150789f1f6840f139289628a2b/src/serialize.h#L247
     # "CompactSize"
     assert i >= 0, i
     if i<0xfd:
-        return int_to_hex(i)
+        return int_to_bytes(i)
     elif i<=0xffff:
-        return "fd"+int_to_hex(i,2)
+        return b'\xfd'+int_to_bytes(i,2)
     elif i<=0xffffffff:
-        return "fe"+int_to_hex(i,4)
+        return b'\xfe'+int_to_bytes(i,4)
     else:
-        return "ff"+int_to_hex(i,8)
+        return b'\xff'+int_to_bytes(i,8)
+
+
+def var_int(i: int) -> str:
+    return var_int_bytes(i).hex()
 
 
 def _op_push(i: int) -> str:
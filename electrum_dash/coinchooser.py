@@ -23,16 +23,18 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 import attr
+import time
 
+from array import array
 from collections import defaultdict
 from math import floor, log10
-from typing import NamedTuple, List, Callable, Optional, Sequence, Union, Dict, Tuple
+from typing import NamedTuple, List, Callable, Optional, Sequence, Union, Dict
 from decimal import Decimal
 
-from .bitcoin import sha256, COIN, is_address
+from .bitcoin import sha256, COIN, is_address, var_int_bytes
 from .dash_ps_util import PS_DENOMS_VALS, PSFeeTooHigh
 from .transaction import Transaction, TxOutput, PartialTransaction, PartialTxInput, PartialTxOutput
-from .util import NotEnoughFunds
+from .util import NotEnoughFunds, profiler
 from .logging import Logger
 
 
@@ -86,8 +88,37 @@ class Bucket(NamedTuple):
 
 class ScoredCandidate(NamedTuple):
     penalty: float
-    tx: PartialTransaction
     buckets: List[Bucket]
+    change_amounts: List[int]     # values of change outputs to add
+
+
+class BucketArrays:
+    '''Values, weights, min heights and max rounds of buckets stored
+    in arrays, computed once per make_tx to score candidates'''
+
+    def __init__(self, buckets: Sequence[Bucket]):
+        self.indexes = {b.desc: i for i, b in enumerate(buckets)}
+        self.values = array('q', [b.value for b in buckets])
+        self.weights = array('q', [b.weight for b in buckets])
+        self.min_heights = array('q', [b.min_height for b in buckets])
+        self.max_rounds = array('d', [-1 if b.max_rounds is None
+                                      else b.max_rounds for b in buckets])
+
+    def get_indexes(self, buckets: Sequence[Bucket]) -> List[int]:
+        indexes = self.indexes
+        return [indexes[b.desc] for b in buckets]
+
+    def value(self, idxs: Sequence[int]) -> int:
+        values = self.values
+        return sum([values[i] for i in idxs])
+
+    def weight(self, idxs: Sequence[int]) -> int:
+        weights = self.weights
+        return sum([weights[i] for i in idxs])
+
+    def max_max_rounds(self, idxs: Sequence[int]) -> float:
+        max_rounds = self.max_rounds
+        return max([max_rounds[i] for i in idxs], default=-1)
 
 
 def strip_unneeded(bkts: List[Bucket], sufficient_funds) -> List[Bucket]:
@@ -166,20 +197,20 @@ class CoinChooserBase(Logger):
         return list(map(make_Bucket, buckets.keys(), buckets.values()))
 
     def penalty_func(self, base_tx, *,
-                     tx_from_buckets: Callable[[List[Bucket]], Tuple[PartialTransaction, List[PartialTxOutput]]]) \
+                     change_from_buckets: Callable[[List[Bucket]], List[int]]) \
             -> Callable[[List[Bucket]], ScoredCandidate]:
         raise NotImplementedError
 
-    def _change_amounts(self, tx: PartialTransaction, count: int, fee_estimator_numchange) -> List[int]:
+    def _change_amounts(self, output_amounts: List[int], tx_fee: int, count: int,
+                        fee_estimator_numchange) -> List[int]:
         # Break change up if bigger than max_change
-        output_amounts = [o.value for o in tx.outputs()]
         # Don't split change of less than 0.02 BTC
         max_change = max(max(output_amounts) * 1.25, 0.02 * COIN)
 
         # Use N change outputs
         for n in range(1, count + 1):
             # How much is left if we add this many change outputs?
-            change_amount = max(0, tx.get_fee() - fee_estimator_numchange(n))
+            change_amount = max(0, tx_fee - fee_estimator_numchange(n))
             if change_amount // n <= max_change:
                 break
 
@@ -224,44 +255,31 @@ class CoinChooserBase(Logger):
 
         return amounts
 
-    def _change_outputs(self, tx: PartialTransaction, change_addrs, fee_estimator_numchange,
-                        dust_threshold) -> List[PartialTxOutput]:
-        amounts = self._change_amounts(tx, len(change_addrs), fee_estimator_numchange)
+    def _change_outputs_amounts(self, output_amounts: List[int], tx_fee: int,
+                                change_addrs, fee_estimator_numchange,
+                                dust_threshold) -> List[int]:
+        amounts = self._change_amounts(output_amounts, tx_fee, len(change_addrs),
+                                       fee_estimator_numchange)
         assert min(amounts) >= 0
         assert len(change_addrs) >= len(amounts)
         assert all([isinstance(amt, int) for amt in amounts])
         # If change is above dust threshold after accounting for the
         # size of the change output, add it to the transaction.
-        amounts = [amount for amount in amounts if amount >= dust_threshold]
-        change = [PartialTxOutput.from_address_and_value(addr, amount)
-                  for addr, amount in zip(change_addrs, amounts)]
-        return change
+        return [amount for amount in amounts if amount >= dust_threshold]
 
     def _construct_tx_from_selected_buckets(self, *, buckets: Sequence[Bucket],
                                             base_tx: PartialTransaction, change_addrs,
-                                            fee_estimator_w, dust_threshold, base_weight,
-                                            tx_type=0, extra_payload=b'') -> Tuple[PartialTransaction, List[PartialTxOutput]]:
+                                            change_amounts: List[int],
+                                            tx_type=0, extra_payload=b'') -> PartialTransaction:
         # make a copy of base_tx so it won't get mutated
         tx = PartialTransaction.from_io(base_tx.inputs()[:], base_tx.outputs()[:],
                                         tx_type=tx_type, extra_payload=extra_payload)
 
         tx.add_inputs([coin for b in buckets for coin in b.coins])
-        tx_weight = self._get_tx_weight(buckets, base_weight=base_weight)
-
-        # change is sent back to sending address unless specified
-        if not change_addrs:
-            change_addrs = [tx.inputs()[0].address]
-            # note: this is not necessarily the final "first input address"
-            # because the inputs had not been sorted at this point
-            assert is_address(change_addrs[0])
-
-        # This takes a count of change outputs and returns a tx fee
-        output_weight = 4 * Transaction.estimated_output_size_for_address(change_addrs[0])
-        fee_estimator_numchange = lambda count: fee_estimator_w(tx_weight + count * output_weight)
-        change = self._change_outputs(tx, change_addrs, fee_estimator_numchange, dust_threshold)
+        change = [PartialTxOutput.from_address_and_value(addr, amount)
+                  for addr, amount in zip(change_addrs, change_amounts)]
         tx.add_outputs(change)
-
-        return tx, change
+        return tx
 
     def _get_tx_weight(self, buckets: Sequence[Bucket], *, base_weight: int) -> int:
         """Given a collection of buckets, return the total weight of the
@@ -327,15 +345,44 @@ class CoinChooserBase(Logger):
             total_weight = self._get_tx_weight(buckets, base_weight=base_weight)
             return total_input >= spent_amount + fee_estimator_w(total_weight)
 
-        def tx_from_buckets(buckets):
-            return self._construct_tx_from_selected_buckets(buckets=buckets,
-                                                            base_tx=base_tx,
-                                                            change_addrs=change_addrs,
-                                                            fee_estimator_w=fee_estimator_w,
-                                                            dust_threshold=dust_threshold,
-                                                            base_weight=base_weight,
-                                                            tx_type=tx_type,
-                                                            extra_payload=extra_payload)
+        output_amounts = [o.value for o in base_tx.outputs()]
+
+        def get_change_addrs(buckets):
+            # change is sent back to sending address unless specified
+            if change_addrs:
+                return change_addrs
+            first_input = inputs[0] if inputs else buckets[0].coins[0]
+            # note: this is not necessarily the final "first input address"
+            # because the inputs had not been sorted at this point
+            assert is_address(first_input.address)
+            return [first_input.address]
+
+        def change_from_buckets(buckets):
+            '''Values of change outputs for buckets, calculated
+            from bucket arrays without constructing tx'''
+            idxs = bucket_arrays.get_indexes(buckets)
+            tx_fee = input_value + bucket_arrays.value(idxs) - spent_amount
+            tx_weight = base_weight + bucket_arrays.weight(idxs)
+            addrs = get_change_addrs(buckets)
+            # This takes a count of change outputs and returns a tx fee
+            output_weight = 4 * Transaction.estimated_output_size_for_address(addrs[0])
+            fee_estimator_numchange = lambda count: fee_estimator_w(tx_weight + count * output_weight)
+            return self._change_outputs_amounts(output_amounts, tx_fee, addrs,
+                                                fee_estimator_numchange,
+                                                dust_threshold)
+
+        # Params used by choose_buckets of changeless selection
+        self.fee_estimator_w = fee_estimator_w
+        self.base_weight = base_weight
+        self.target_value = spent_amount - input_value
+        self.dust_threshold = dust_threshold
+        if change_addrs:
+            change_size = Transaction.estimated_output_size_for_address(change_addrs[0])
+        elif coins:
+            change_size = Transaction.estimated_output_size_for_address(coins[0].address)
+        else:
+            change_size = 0
+        self.change_weight = 4 * change_size
 
         # Collect the coins into buckets
         all_buckets = self.bucketize_coins(coins, fee_estimator_vb=fee_estimator_vb)
@@ -344,10 +391,17 @@ class CoinChooserBase(Logger):
         # instead of per-coin, as each bucket should be either fully spent or not at all.
         # (e.g. CoinChooserPrivacy ensures that same-address coins go into one bucket)
         all_buckets = list(filter(lambda b: b.effective_value > 0, all_buckets))
+        bucket_arrays = self.bucket_arrays = BucketArrays(all_buckets)
         # Choose a subset of the buckets
-        scored_candidate = self.choose_buckets(all_buckets, sufficient_funds,
-                                               self.penalty_func(base_tx, tx_from_buckets=tx_from_buckets))
-        tx = scored_candidate.tx
+        penalty_func = self.penalty_func(base_tx, change_from_buckets=change_from_buckets)
+        scored_candidate = self.choose_buckets(all_buckets, sufficient_funds, penalty_func)
+        buckets = scored_candidate.buckets
+        tx = self._construct_tx_from_selected_buckets(buckets=buckets,
+                                                      base_tx=base_tx,
+                                                      change_addrs=get_change_addrs(buckets),
+                                                      change_amounts=scored_candidate.change_amounts,
+                                                      tx_type=tx_type,
+                                                      extra_payload=extra_payload)
 
         self.logger.info(f"using {len(tx.inputs())} inputs")
         self.logger.info(f"using buckets: {[bucket.desc for bucket in scored_candidate.buckets]}")
@@ -480,15 +534,15 @@ class CoinChooserPrivacy(CoinChooserRandom):
     def keys(self, coins):
         return [coin.scriptpubkey.hex() for coin in coins]
 
-    def penalty_func(self, base_tx, *, tx_from_buckets):
+    def penalty_func(self, base_tx, *, change_from_buckets):
         min_change = min(o.value for o in base_tx.outputs()) * 0.75
         max_change = max(o.value for o in base_tx.outputs()) * 1.33
 
         def penalty(buckets: List[Bucket]) -> ScoredCandidate:
             # Penalize using many buckets (~inputs)
             badness = len(buckets) - 1
-            tx, change_outputs = tx_from_buckets(buckets)
-            change = sum(o.value for o in change_outputs)
+            change_amounts = change_from_buckets(buckets)
+            change = sum(change_amounts)
             # Penalize change not roughly in output range
             if change == 0:
                 pass  # no change is great!
@@ -502,32 +556,191 @@ class CoinChooserPrivacy(CoinChooserRandom):
                 # Penalize large change; 5 BTC excess ~= using 1 more input
                 badness += change / (COIN * 5)
             # Penalize using high max_rounds buckets
-            max_rounds_badness = 0
-            for b in buckets:
-                max_rounds = b.max_rounds
-                if max_rounds is not None and max_rounds > 0:
-                    max_rounds_badness = max(max_rounds_badness,
-                                             max_rounds*1000)
-            badness += max_rounds_badness
-            return ScoredCandidate(badness, tx, buckets)
+            idxs = self.bucket_arrays.get_indexes(buckets)
+            max_rounds = self.bucket_arrays.max_max_rounds(idxs)
+            if max_rounds > 0:
+                badness += max_rounds*1000
+            return ScoredCandidate(badness, buckets, change_amounts)
 
         return penalty
 
 
+class CoinChooserBnB(CoinChooserPrivacy):
+    """Searches for a set of coins which pays exact amount with fee,
+    so that no change output is needed (branch and bound search).
+    If there is no such set, falls back to Privacy coin chooser.
+    Coins are grouped by address as in Privacy coin chooser.
+    """
+
+    BNB_MAX_TRIES = 100000
+    BNB_TIME_BUDGET = 0.25  # seconds
+
+    def bnb_search(self, buckets: List[Bucket],
+                   deadline: float) -> Optional[List[Bucket]]:
+        '''Find changeless subset of buckets with minimal excess fee'''
+        fee_estimator_w = self.fee_estimator_w
+        base_weight = self.base_weight
+        base_fee = fee_estimator_w(base_weight)
+        target = self.target_value + base_fee
+        cost_of_change = (fee_estimator_w(base_weight + self.change_weight)
+                          - base_fee + self.dust_threshold)
+        buckets = sorted(buckets, key=lambda b: b.value, reverse=True)
+        values = [b.value for b in buckets]
+        weights = [b.weight for b in buckets]
+        # effective values of buckets with marginal fee of bucket weight
+        effs = [v - (fee_estimator_w(base_weight + w) - base_fee)
+                for v, w in zip(values, weights)]
+
+        def excess_if_changeless(sel_value, sel_weight):
+            total_weight = base_weight + sel_weight
+            fee = fee_estimator_w(total_weight)
+            excess = sel_value - self.target_value - fee
+            if excess < 0:
+                return None
+            change_fee = fee_estimator_w(total_weight + self.change_weight) - fee
+            if excess - change_fee >= self.dust_threshold:
+                return None
+            return excess
+
+        best = None
+        best_excess = None
+        selected = []  # indexes of included buckets
+        sel_eff = sel_value = sel_weight = 0
+        lookahead = sum(effs)
+        i = 0
+        tries = 0
+        while tries < self.BNB_MAX_TRIES:
+            tries += 1
+            if tries % 1000 == 0 and time.monotonic() > deadline:
+                break
+            backtrack = False
+            if (sel_eff + lookahead < target
+                    or sel_eff > target + cost_of_change):
+                backtrack = True
+            elif sel_eff >= target:
+                excess = excess_if_changeless(sel_value, sel_weight)
+                if excess is not None:
+                    if best_excess is None or excess < best_excess:
+                        best = selected[:]
+                        best_excess = excess
+                    if excess == 0:
+                        break
+                backtrack = True
+
+            if backtrack:
+                if not selected:
+                    break  # search is exhausted
+                # add omitted buckets back to lookahead
+                i -= 1
+                while i > selected[-1]:
+                    lookahead += effs[i]
+                    i -= 1
+                # last included bucket is omitted now
+                sel_eff -= effs[i]
+                sel_value -= values[i]
+                sel_weight -= weights[i]
+                selected.pop()
+            else:
+                lookahead -= effs[i]
+                # skip branch equal to just omitted same value bucket
+                if (not selected or i - 1 == selected[-1]
+                        or effs[i] != effs[i-1]):
+                    selected.append(i)
+                    sel_eff += effs[i]
+                    sel_value += values[i]
+                    sel_weight += weights[i]
+            i += 1
+        self.logger.info(f'bnb search: {tries} tries, '
+                         f'found: {best is not None}')
+        if best is None:
+            return None
+        return [buckets[n] for n in best]
+
+    def choose_buckets(self, buckets, sufficient_funds, penalty_func):
+        if buckets and not sufficient_funds([], bucket_value_sum=0):
+            deadline = time.monotonic() + self.BNB_TIME_BUDGET
+            # try to use lesser mixed/unconfirmed buckets first
+            pools = [
+                [b for b in buckets
+                 if b.max_rounds is None and b.min_height > 0],
+                [b for b in buckets if b.max_rounds is None],
+                buckets,
+            ]
+            prev_pool_len = None
+            for pool in pools:
+                if not pool or len(pool) == prev_pool_len:
+                    continue
+                prev_pool_len = len(pool)
+                selected = self.bnb_search(pool, deadline)
+                if selected is not None:
+                    return penalty_func(selected)
+                if time.monotonic() > deadline:
+                    break
+        return super().choose_buckets(buckets, sufficient_funds, penalty_func)
+
+
 @attr.s
 class PSTxCandidate:
-    tx = attr.ib(type=PartialTransaction)
+    coins = attr.ib(type=List[PartialTxInput])
     fee = attr.ib(type=int)
     estimated_fee = attr.ib(type=int)
     use_ps_rounds = attr.ib(type=int)
     use_repeated_txids = attr.ib(type=bool)
 
 
+class PSCoinsIndex:
+    '''Mixed denoms indexed by value (descending), with ps_rounds and
+    txid of each coin, to select coins for spending without resorting'''
+
+    def __init__(self, coins: Sequence[PartialTxInput]):
+        by_value = defaultdict(list)  # value => [(idx, ps_rounds, coin), ...]
+        self.by_txid = defaultdict(list)  # txid => [(idx, ps_rounds), ...]
+        for idx, c in enumerate(coins):
+            ps_rounds = c.ps_rounds
+            by_value[c.value_sats()].append((idx, ps_rounds, c))
+            self.by_txid[c.prevout.txid].append((idx, ps_rounds))
+        self.by_value = [(v, by_value[v])
+                         for v in sorted(by_value.keys(), reverse=True)]
+
+    def select(self, max_rounds: int,
+               use_repeated_txids: bool) -> List[PartialTxInput]:
+        '''Coins with ps_rounds <= max_rounds sorted by value descending,
+        if not use_repeated_txids only first coin from each txid is used'''
+        allowed = None
+        if not use_repeated_txids:
+            allowed = set()
+            for txid_coins in self.by_txid.values():
+                for idx, ps_rounds in txid_coins:
+                    if ps_rounds <= max_rounds:
+                        allowed.add(idx)
+                        break
+        return [c for v, value_coins in self.by_value
+                for idx, ps_rounds, c in value_coins
+                if ps_rounds <= max_rounds
+                and (allowed is None or idx in allowed)]
+
+
 class CoinChooserPrivateSend:
 
     def __init__(self, psman):
         self.psman = psman
-
+        self.input_sizes = {}  # estimated input size cache
+
+    def estimated_input_size(self, coin: PartialTxInput) -> int:
+        script_type = coin.script_type
+        if (script_type not in ('p2pkh', 'p2sh', 'p2pk')
+                or coin.script_sig is not None):
+            return Transaction.estimated_input_weight(coin) // 4
+        pubkeys = coin.pubkeys
+        key = (script_type, len(pubkeys[0]) if pubkeys else 33,
+               len(pubkeys), coin.num_sig)
+        size = self.input_sizes.get(key)
+        if size is None:
+            size = Transaction.estimated_input_weight(coin) // 4
+            self.input_sizes[key] = size
+        return size
+
+    @profiler
     def make_tx(self, *, coins, outputs, fee_estimator_vb,
                 min_rounds, tx_type=0, extra_payload=b''):
         base_tx = PartialTransaction.from_io([], outputs[:], tx_type=tx_type,
@@ -538,12 +751,12 @@ class CoinChooserPrivateSend:
         if not all_coins:
             raise NotEnoughFunds()
         max_rounds = max([c.ps_rounds for c in all_coins])
+        coins_index = PSCoinsIndex(all_coins)
         txs = []
         use_repeated_txids = False
         use_ps_rounds = min_rounds
         while not (use_repeated_txids and use_ps_rounds > max_rounds):
-            coins = self.select_coins(all_coins, use_ps_rounds,
-                                      use_repeated_txids)
+            coins = coins_index.select(use_ps_rounds, use_repeated_txids)
             txs += self.select_candidate_txs(coins, base_tx, fee_estimator_vb,
                                              use_ps_rounds, use_repeated_txids)
             if use_ps_rounds <= max_rounds:
@@ -565,66 +778,62 @@ class CoinChooserPrivateSend:
                           x.fee - x.estimated_fee <= max_fee_overhead, txs))
         if not txs:
             raise PSFeeTooHigh(self.psman, fee)
-        return txs[0].tx
-
-    def select_coins(self, coins, max_rounds, use_repeated_txids):
-        coins = list(filter(lambda x: x.ps_rounds <= max_rounds, coins))
-        if use_repeated_txids:
-            return coins
-        selected = []
-        used_txids = []
-        for c in coins:
-            txid = c.prevout.txid.hex()
-            if txid in used_txids:
-                continue
-            selected.append(c)
-            used_txids.append(txid)
-        return selected
+        tx = PartialTransaction.from_io(base_tx.inputs()[:],
+                                        base_tx.outputs()[:],
+                                        tx_type=base_tx.tx_type,
+                                        extra_payload=base_tx.extra_payload)
+        tx.add_inputs(txs[0].coins)
+        return tx
 
     def select_candidate_txs(self, coins, base_tx, fee_estimator_vb,
                              use_ps_rounds, use_repeated_txids):
+        '''Greedy search over coins sorted by value descending, tx size
+        is calculated from estimated inputs sizes without building tx'''
         spent_amount = base_tx.output_value()
         selected = []
         if sum([c.value_sats() for c in coins]) < spent_amount:
             return []
-        coins = sorted(coins, key=lambda x: x.value_sats(), reverse=True)
+        # base tx has no inputs, its size includes 1 byte var_int(0)
+        base_size = base_tx.estimated_size() - 1
         skip_value = 0
         inputs_val = 0
+        inputs_size = 0
         txs = []
         for c in coins:
             val = c.value_sats()
             if val == skip_value:
                 continue
+            input_size = self.estimated_input_size(c)
             if inputs_val + val <= spent_amount:
                 inputs_val += val
+                inputs_size += input_size
                 selected.append(c)
                 continue
-            tx = PartialTransaction.from_io(base_tx.inputs()[:],
-                                            base_tx.outputs()[:],
-                                            tx_type=base_tx.tx_type,
-                                            extra_payload=base_tx.extra_payload)
-            tx.add_inputs(selected + [c])
-            input_value = tx.input_value()
-            estimated_fee = fee_estimator_vb(tx.estimated_size())
-            fee = input_value - spent_amount
+            tx_coins = selected + [c]
+            tx_size = (base_size + len(var_int_bytes(len(tx_coins)))
+                       + inputs_size + input_size)
+            estimated_fee = fee_estimator_vb(tx_size)
+            fee = inputs_val + val - spent_amount
             if fee < estimated_fee:
                 inputs_val += val
+                inputs_size += input_size
                 selected.append(c)
                 continue
             elif fee - estimated_fee >= PS_DENOMS_VALS[0]:
-                txs.append(PSTxCandidate(tx, fee, estimated_fee, use_ps_rounds,
-                                         use_repeated_txids))
+                txs.append(PSTxCandidate(tx_coins, fee, estimated_fee,
+                                         use_ps_rounds, use_repeated_txids))
                 skip_value = val
                 continue
             else:
-                txs.append(PSTxCandidate(tx, fee, estimated_fee, use_ps_rounds,
-                                         use_repeated_txids))
+                txs.append(PSTxCandidate(tx_coins, fee, estimated_fee,
+                                         use_ps_rounds, use_repeated_txids))
                 break
         return txs
 
 
 COIN_CHOOSERS = {
     'Privacy': CoinChooserPrivacy,
+    'BranchAndBound': CoinChooserBnB,
 }
 
 def get_name(config):
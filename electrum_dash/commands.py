@@ -49,11 +49,6 @@ from .i18n import _
 from .transaction import (Transaction, multisig_script, TxOutput, PartialTransaction, PartialTxOutput,
                           tx_from_any, PartialTxInput, TxOutpoint)
 from .invoices import PR_PAID, PR_UNPAID, PR_UNKNOWN, PR_EXPIRED
-from .synchronizer import Notifier
-from .wallet import Abstract_Wallet, create_new_wallet, restore_wallet_from_text, Deterministic_Wallet
-from .address_synchronizer import TX_HEIGHT_LOCAL
-from .mnemonic import Mnemonic
-from .plugin import run_hook
 from .version import ELECTRUM_VERSION, is_release
 from .simple_config import SimpleConfig
 
@@ -61,6 +56,7 @@ from .simple_config import SimpleConfig
 if TYPE_CHECKING:
     from .network import Network
     from .daemon import Daemon
+    from .wallet import Abstract_Wallet
 
 
 known_commands = {}  # type: Dict[str, Command]
@@ -215,6 +211,19 @@ class Commands:
         await self.daemon.stop()
         return "Daemon stopped"
 
+    @command('n')
+    async def getrpcstats(self):
+        """Per method JSON-RPC calls count and latency histogram"""
+        if not self.daemon.commands_server:
+            return {}
+        return self.daemon.commands_server.rpc_stats.to_json()
+
+    @command('n')
+    async def getcachestats(self):
+        """Hits and size of txs, proofs and histories cache shared by
+        wallets loaded in daemon"""
+        return self.network.shared_cache.get_stats()
+
     @command('n')
     async def list_wallets(self):
         """List wallets open in daemon"""
@@ -229,6 +238,7 @@ class Commands:
                                          manual_upgrades=False,
                                          set_current=set_current)
         if wallet is not None:
+            from .plugin import run_hook
             run_hook('load_wallet', wallet, None)
         response = wallet is not None
         return response
@@ -243,6 +253,7 @@ class Commands:
         """Create a new wallet.
         If you want to be prompted for an argument, type '?' or ':' (concealed)
         """
+        from .wallet import create_new_wallet
         d = create_new_wallet(path=wallet_path,
                               passphrase=passphrase,
                               password=password,
@@ -263,6 +274,7 @@ class Commands:
         If you want to be prompted for an argument, type '?' or ':' (concealed)
         """
         # TODO create a separate command that blocks until wallet is synced
+        from .wallet import restore_wallet_from_text
         d = restore_wallet_from_text(text,
                                      path=wallet_path,
                                      passphrase=passphrase,
@@ -275,7 +287,7 @@ class Commands:
         }
 
     @command('wp')
-    async def password(self, password=None, new_password=None, wallet: Abstract_Wallet = None):
+    async def password(self, password=None, new_password=None, wallet: 'Abstract_Wallet' = None):
         """Change wallet password. """
         if wallet.storage.is_encrypted_with_hw_device() and new_password:
             raise Exception("Can't change the password of a wallet encrypted with a hw device.")
@@ -285,10 +297,15 @@ class Commands:
         return {'password':wallet.has_password()}
 
     @command('w')
-    async def get(self, key, wallet: Abstract_Wallet = None):
+    async def get(self, key, wallet: 'Abstract_Wallet' = None):
         """Return item from wallet storage"""
         return wallet.db.get(key)
 
+    @command('w')
+    async def getsavestats(self, wallet: 'Abstract_Wallet' = None):
+        """Wallet file saves requested vs performed by background saver"""
+        return wallet.saver.get_stats()
+
     @command('')
     async def getconfig(self, key):
         """Return a configuration variable. """
@@ -338,7 +355,7 @@ class Commands:
         return await self.network.get_history_for_scripthash(sh)
 
     @command('w')
-    async def listunspent(self, wallet: Abstract_Wallet = None):
+    async def listunspent(self, wallet: 'Abstract_Wallet' = None):
         """List unspent outputs. Returns the list of unspent transaction
         outputs in your wallet."""
         coins = []
@@ -422,7 +439,7 @@ class Commands:
         return tx.serialize()
 
     @command('wp')
-    async def signtransaction(self, tx, password=None, wallet: Abstract_Wallet = None):
+    async def signtransaction(self, tx, password=None, wallet: 'Abstract_Wallet' = None):
         """Sign a transaction. The wallet keys will be used to sign the transaction."""
         tx = tx_from_any(tx)
         wallet.sign_transaction(tx, password)
@@ -450,29 +467,29 @@ class Commands:
         return {'address':address, 'redeemScript':redeem_script}
 
     @command('w')
-    async def freeze(self, address: str, wallet: Abstract_Wallet = None):
+    async def freeze(self, address: str, wallet: 'Abstract_Wallet' = None):
         """Freeze address. Freeze the funds at one of your wallet\'s addresses"""
         return wallet.set_frozen_state_of_addresses([address], True)
 
     @command('w')
-    async def unfreeze(self, address: str, wallet: Abstract_Wallet = None):
+    async def unfreeze(self, address: str, wallet: 'Abstract_Wallet' = None):
         """Unfreeze address. Unfreeze the funds at one of your wallet\'s address"""
         return wallet.set_frozen_state_of_addresses([address], False)
 
     @command('w')
-    async def freeze_utxo(self, coin: str, wallet: Abstract_Wallet = None):
+    async def freeze_utxo(self, coin: str, wallet: 'Abstract_Wallet' = None):
         """Freeze a UTXO so that the wallet will not spend it."""
         wallet.set_frozen_state_of_coins([coin], True)
         return True
 
     @command('w')
-    async def unfreeze_utxo(self, coin: str, wallet: Abstract_Wallet = None):
+    async def unfreeze_utxo(self, coin: str, wallet: 'Abstract_Wallet' = None):
         """Unfreeze a UTXO so that the wallet might spend it."""
         wallet.set_frozen_state_of_coins([coin], False)
         return True
 
     @command('wp')
-    async def getprivatekeys(self, address, password=None, wallet: Abstract_Wallet = None):
+    async def getprivatekeys(self, address, password=None, wallet: 'Abstract_Wallet' = None):
         """Get private keys of addresses. You may pass a single wallet address, or a list of wallet addresses."""
         if isinstance(address, str):
             address = address.strip()
@@ -482,14 +499,14 @@ class Commands:
         return [wallet.export_private_key(address, password) for address in domain]
 
     @command('wp')
-    async def getprivatekeyforpath(self, path, password=None, wallet: Abstract_Wallet = None):
+    async def getprivatekeyforpath(self, path, password=None, wallet: 'Abstract_Wallet' = None):
         """Get private key corresponding to derivation path (address index).
         'path' can be either a str such as "m/0/50", or a list of ints such as [0, 50].
         """
         return wallet.export_private_key_for_path(path, password)
 
     @command('w')
-    async def ismine(self, address, wallet: Abstract_Wallet = None):
+    async def ismine(self, address, wallet: 'Abstract_Wallet' = None):
         """Check if address is in wallet. Return true if and only address is in wallet"""
         return wallet.is_mine(address)
 
@@ -504,7 +521,7 @@ class Commands:
         return is_address(address)
 
     @command('w')
-    async def getpubkeys(self, address, wallet: Abstract_Wallet = None):
+    async def getpubkeys(self, address, wallet: 'Abstract_Wallet' = None):
         """Return the public keys for a wallet address. """
         if wallet.psman.is_ps_ks(address):
             return wallet.psman.get_public_keys(address)
@@ -512,7 +529,7 @@ class Commands:
             return wallet.get_public_keys(address)
 
     @command('w')
-    async def getbalance(self, wallet: Abstract_Wallet = None):
+    async def getbalance(self, wallet: 'Abstract_Wallet' = None):
         """Return the balance of your wallet. """
         c, u, x = wallet.get_balance()
         out = {"confirmed": str(Decimal(c)/COIN)}
@@ -551,12 +568,12 @@ class Commands:
         return ELECTRUM_VERSION
 
     @command('w')
-    async def getmpk(self, wallet: Abstract_Wallet = None):
+    async def getmpk(self, wallet: 'Abstract_Wallet' = None):
         """Get master public key. Return your wallet\'s master public key"""
         return wallet.get_master_public_key()
 
     @command('wp')
-    async def getmasterprivate(self, password=None, wallet: Abstract_Wallet = None):
+    async def getmasterprivate(self, password=None, wallet: 'Abstract_Wallet' = None):
         """Get master private key. Return your wallet\'s master private key"""
         return str(wallet.keystore.get_master_private_key(password))
 
@@ -570,13 +587,13 @@ class Commands:
         return node._replace(xtype=xtype).to_xkey()
 
     @command('wp')
-    async def getseed(self, password=None, wallet: Abstract_Wallet = None):
+    async def getseed(self, password=None, wallet: 'Abstract_Wallet' = None):
         """Get seed phrase. Print the generation seed of your wallet."""
         s = wallet.get_seed(password)
         return s
 
     @command('wp')
-    async def importprivkey(self, privkey, password=None, wallet: Abstract_Wallet = None):
+    async def importprivkey(self, privkey, password=None, wallet: 'Abstract_Wallet' = None):
         """Import a private key."""
         if not wallet.can_import_privkey():
             return "Error: This type of wallet cannot import private keys. Try to create a new wallet with that key."
@@ -616,7 +633,7 @@ class Commands:
         return tx.serialize() if tx else None
 
     @command('wp')
-    async def signmessage(self, address, message, password=None, wallet: Abstract_Wallet = None):
+    async def signmessage(self, address, message, password=None, wallet: 'Abstract_Wallet' = None):
         """Sign a message with a key. Use quotes if your message contains
         whitespaces"""
         sig = wallet.sign_message(address, message, password)
@@ -631,7 +648,7 @@ class Commands:
 
     @command('wp')
     async def payto(self, destination, amount, fee=None, feerate=None, from_addr=None, from_coins=None, change_addr=None,
-                    nocheck=False, unsigned=False, password=None, locktime=None, addtransaction=False, wallet: Abstract_Wallet = None):
+                    nocheck=False, unsigned=False, password=None, locktime=None, addtransaction=False, wallet: 'Abstract_Wallet' = None):
         """Create a transaction. """
         self.nocheck = nocheck
         tx_fee = satoshis(fee)
@@ -658,7 +675,7 @@ class Commands:
 
     @command('wp')
     async def paytomany(self, outputs, fee=None, feerate=None, from_addr=None, from_coins=None, change_addr=None,
-                        nocheck=False, unsigned=False, password=None, locktime=None, addtransaction=False, wallet: Abstract_Wallet = None):
+                        nocheck=False, unsigned=False, password=None, locktime=None, addtransaction=False, wallet: 'Abstract_Wallet' = None):
         """Create a multi-output transaction. """
         self.nocheck = nocheck
         tx_fee = satoshis(fee)
@@ -687,7 +704,7 @@ class Commands:
         return result
 
     @command('w')
-    async def history(self, year=None, show_addresses=False, show_fiat=False, wallet: Abstract_Wallet = None,
+    async def history(self, year=None, show_addresses=False, show_fiat=False, wallet: 'Abstract_Wallet' = None,
                       from_height=None, to_height=None):
         """Wallet history. Returns the transaction history of your wallet."""
         kwargs = {
@@ -706,26 +723,35 @@ class Commands:
             fx = FxThread(self.config, None)
             kwargs['fx'] = fx
 
-        return json_normalize(wallet.get_detailed_history(**kwargs))
+        # normalize items one by one to not hold whole history twice
+        stats = {}
+        txs = [json_normalize(item)
+               for item in wallet.iter_detailed_history(stats=stats, **kwargs)]
+        kwargs.pop('show_addresses')
+        summary = wallet.get_detailed_history_summary(stats, **kwargs)
+        return {
+            'transactions': txs,
+            'summary': json_normalize(summary),
+        }
 
     @command('w')
-    async def setlabel(self, key, label, wallet: Abstract_Wallet = None):
+    async def setlabel(self, key, label, wallet: 'Abstract_Wallet' = None):
         """Assign a label to an item. Item may be a Dash address or a
         transaction ID"""
         wallet.set_label(key, label)
 
     @command('w')
-    async def listcontacts(self, wallet: Abstract_Wallet = None):
+    async def listcontacts(self, wallet: 'Abstract_Wallet' = None):
         """Show your list of contacts"""
         return wallet.contacts
 
     @command('w')
-    async def getalias(self, key, wallet: Abstract_Wallet = None):
+    async def getalias(self, key, wallet: 'Abstract_Wallet' = None):
         """Retrieve alias. Lookup in your list of contacts, and for an OpenAlias DNS record."""
         return wallet.contacts.resolve(key)
 
     @command('w')
-    async def searchcontacts(self, query, wallet: Abstract_Wallet = None):
+    async def searchcontacts(self, query, wallet: 'Abstract_Wallet' = None):
         """Search through contacts, return matching entries. """
         results = {}
         for key, value in wallet.contacts.items():
@@ -734,7 +760,7 @@ class Commands:
         return results
 
     @command('w')
-    async def listaddresses(self, receiving=False, change=False, labels=False, frozen=False, unused=False, funded=False, balance=False, wallet: Abstract_Wallet = None):
+    async def listaddresses(self, receiving=False, change=False, labels=False, frozen=False, unused=False, funded=False, balance=False, wallet: 'Abstract_Wallet' = None):
         """List wallet addresses. Returns the list of all addresses in your wallet. Use optional arguments to filter the results."""
         out = []
         addrs = wallet.get_addresses() + wallet.psman.get_addresses()
@@ -760,7 +786,7 @@ class Commands:
         return out
 
     @command('n')
-    async def gettransaction(self, txid, wallet: Abstract_Wallet = None):
+    async def gettransaction(self, txid, wallet: 'Abstract_Wallet' = None):
         """Retrieve a transaction. """
         tx = None
         if wallet:
@@ -789,7 +815,7 @@ class Commands:
         return encrypted.decode('utf-8')
 
     @command('wp')
-    async def decrypt(self, pubkey, encrypted, password=None, wallet: Abstract_Wallet = None) -> str:
+    async def decrypt(self, pubkey, encrypted, password=None, wallet: 'Abstract_Wallet' = None) -> str:
         """Decrypt a message encrypted with a public key."""
         if not is_hex_str(pubkey):
             raise Exception(f"pubkey must be a hex string instead of {repr(pubkey)}")
@@ -799,7 +825,7 @@ class Commands:
         return decrypted.decode('utf-8')
 
     @command('w')
-    async def getrequest(self, key, wallet: Abstract_Wallet = None):
+    async def getrequest(self, key, wallet: 'Abstract_Wallet' = None):
         """Return a payment request"""
         r = wallet.get_request(key)
         if not r:
@@ -812,7 +838,7 @@ class Commands:
     #    pass
 
     @command('w')
-    async def list_requests(self, pending=False, expired=False, paid=False, wallet: Abstract_Wallet = None):
+    async def list_requests(self, pending=False, expired=False, paid=False, wallet: 'Abstract_Wallet' = None):
         """List the payment requests you made."""
         if pending:
             f = PR_UNPAID
@@ -829,12 +855,12 @@ class Commands:
         return [wallet.export_request(x) for x in out]
 
     @command('w')
-    async def createnewaddress(self, wallet: Abstract_Wallet = None):
+    async def createnewaddress(self, wallet: 'Abstract_Wallet' = None):
         """Create a new receiving address, beyond the gap limit of the wallet"""
         return wallet.create_new_address(False)
 
     @command('w')
-    async def changegaplimit(self, new_limit, iknowwhatimdoing=False, wallet: Abstract_Wallet = None):
+    async def changegaplimit(self, new_limit, iknowwhatimdoing=False, wallet: 'Abstract_Wallet' = None):
         """Change the gap limit of the wallet."""
         if not iknowwhatimdoing:
             raise Exception("WARNING: Are you SURE you want to change the gap limit?\n"
@@ -842,15 +868,17 @@ class Commands:
                             "Please do your research and make sure you understand the implications.\n"
                             "Typically only merchants and power users might want to do this.\n"
                             "To proceed, try again, with the --iknowwhatimdoing option.")
+        from .wallet import Deterministic_Wallet
         if not isinstance(wallet, Deterministic_Wallet):
             raise Exception("This wallet is not deterministic.")
         return wallet.change_gap_limit(new_limit)
 
     @command('wn')
-    async def getminacceptablegap(self, wallet: Abstract_Wallet = None):
+    async def getminacceptablegap(self, wallet: 'Abstract_Wallet' = None):
         """Returns the minimum value for gap limit that would be sufficient to discover all
         known addresses in the wallet.
         """
+        from .wallet import Deterministic_Wallet
         if not isinstance(wallet, Deterministic_Wallet):
             raise Exception("This wallet is not deterministic.")
         if not wallet.is_up_to_date():
@@ -858,13 +886,13 @@ class Commands:
         return wallet.min_acceptable_gap()
 
     @command('w')
-    async def getunusedaddress(self, wallet: Abstract_Wallet = None):
+    async def getunusedaddress(self, wallet: 'Abstract_Wallet' = None):
         """Returns the first unused address of the wallet, or None if all addresses are used.
         An address is considered as used if it has received a transaction, or if it is used in a payment request."""
         return wallet.get_unused_address()
 
     @command('w')
-    async def add_request(self, amount, memo='', expiration=3600, force=False, wallet: Abstract_Wallet = None):
+    async def add_request(self, amount, memo='', expiration=3600, force=False, wallet: 'Abstract_Wallet' = None):
         """Create a payment request, using the first unused address of the wallet.
         The address will be considered as used after this operation.
         If no payment is received, the address will be considered as unused if the payment request is deleted from the wallet."""
@@ -881,7 +909,7 @@ class Commands:
         return wallet.export_request(req)
 
     @command('w')
-    async def addtransaction(self, tx, wallet: Abstract_Wallet = None):
+    async def addtransaction(self, tx, wallet: 'Abstract_Wallet' = None):
         """ Add a transaction to the wallet history """
         tx = Transaction(tx)
         if not wallet.add_transaction(tx):
@@ -890,7 +918,7 @@ class Commands:
         return tx.txid()
 
     @command('wp')
-    async def signrequest(self, address, password=None, wallet: Abstract_Wallet = None):
+    async def signrequest(self, address, password=None, wallet: 'Abstract_Wallet' = None):
         "Sign payment request with an OpenAlias"
         alias = self.config.get('alias')
         if not alias:
@@ -899,18 +927,18 @@ class Commands:
         wallet.sign_payment_request(address, alias, alias_addr, password)
 
     @command('w')
-    async def rmrequest(self, address, wallet: Abstract_Wallet = None):
+    async def rmrequest(self, address, wallet: 'Abstract_Wallet' = None):
         """Remove a payment request"""
         return wallet.remove_payment_request(address)
 
     @command('w')
-    async def clear_requests(self, wallet: Abstract_Wallet = None):
+    async def clear_requests(self, wallet: 'Abstract_Wallet' = None):
         """Remove all payment requests"""
         wallet.clear_requests()
         return True
 
     @command('w')
-    async def clear_invoices(self, wallet: Abstract_Wallet = None):
+    async def clear_invoices(self, wallet: 'Abstract_Wallet' = None):
         """Remove all invoices"""
         wallet.clear_invoices()
         return True
@@ -921,6 +949,7 @@ class Commands:
         Call with an empty URL to stop watching an address.
         """
         if not hasattr(self, "_notifier"):
+            from .synchronizer import Notifier
             self._notifier = Notifier(self.network)
         if URL:
             await self._notifier.start_watching_addr(address, URL)
@@ -929,7 +958,7 @@ class Commands:
         return True
 
     @command('wn')
-    async def is_synchronized(self, wallet: Abstract_Wallet = None):
+    async def is_synchronized(self, wallet: 'Abstract_Wallet' = None):
         """ return wallet synchronization status """
         return wallet.is_up_to_date()
 
@@ -951,12 +980,13 @@ class Commands:
         return self.config.fee_per_kb(dyn=dyn, mempool=mempool, fee_level=fee_level)
 
     @command('w')
-    async def removelocaltx(self, txid, wallet: Abstract_Wallet = None):
+    async def removelocaltx(self, txid, wallet: 'Abstract_Wallet' = None):
         """Remove a 'local' transaction from the wallet, and its dependent
         transactions.
         """
         if not is_hash256_str(txid):
             raise Exception(f"{repr(txid)} is not a txid")
+        from .address_synchronizer import TX_HEIGHT_LOCAL
         height = wallet.get_tx_height(txid).height
         if height != TX_HEIGHT_LOCAL:
             raise Exception(f'Only local transactions can be removed. '
@@ -965,7 +995,7 @@ class Commands:
         wallet.save_db()
 
     @command('wn')
-    async def get_tx_status(self, txid, wallet: Abstract_Wallet = None):
+    async def get_tx_status(self, txid, wallet: 'Abstract_Wallet' = None):
         """Returns some information regarding the tx. For now, only confirmations.
         The transaction must be related to the wallet.
         """
@@ -995,7 +1025,7 @@ class Commands:
         return sorted(known_commands.keys())
 
     @command('w')
-    async def list_invoices(self, wallet: Abstract_Wallet = None):
+    async def list_invoices(self, wallet: 'Abstract_Wallet' = None):
         l = wallet.get_invoices()
         return [wallet.export_invoice(x) for x in l]
 
@@ -1216,6 +1246,14 @@ def get_parser():
     parser_daemon.add_argument("-d", "--detached", action="store_true", dest="detach", default=False, help="run daemon in detached mode")
     add_network_options(parser_daemon)
     add_global_options(parser_daemon)
+    # stdin
+    parser_stdin = subparsers.add_parser('stdin', help="Run commands read from stdin on daemon",
+                                         description="Run commands read from stdin, one command line per line, "
+                                                     "on running daemon over one persistent connection. "
+                                                     "Results are printed as JSON, one per line. "
+                                                     "Passwords should be passed with the -W option.")
+    add_wallet_option(parser_stdin)
+    add_global_options(parser_stdin)
     # commands
     for cmdname in sorted(known_commands.keys()):
         cmd = known_commands[cmdname]
@@ -57,6 +57,22 @@ def read_json_gz(filename, default):
     return r
 
 
+class LazyJsonGz:
+    '''Class attribute read from json.gz file on first access'''
+
+    def __init__(self, filename, default):
+        self.filename = filename
+        self.default = default
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner):
+        value = read_json_gz(self.filename, self.default)
+        setattr(owner, self.name, value)
+        return value
+
+
 GIT_REPO_URL = "https://github.com/Bertrand256/electrum-dash"
 GIT_REPO_ISSUES_URL = f"{GIT_REPO_URL}/issues"
 BIP39_WALLET_FORMATS = read_json('bip39_wallet_formats.json', [])
@@ -94,7 +110,7 @@ class BitcoinMainnet(AbstractNet):
     GENESIS = "00000ffd590b1485b3caadc19b22e6379c733355108f107a430458cdf3407ab6"
     DEFAULT_PORTS = {'t': '50001', 's': '50002'}
     DEFAULT_SERVERS = read_json('servers.json', {})
-    CHECKPOINTS = read_json_gz('checkpoints.json.gz', [])
+    CHECKPOINTS = LazyJsonGz('checkpoints.json.gz', [])
 
     XPRV_HEADERS = {
         'standard':    0x0488ade4,  # xprv
@@ -120,7 +136,7 @@ class BitcoinTestnet(AbstractNet):
     GENESIS = "00000bafbc94add76cb75e2ec92894837288a481e5c005f6563d91623bf8bc2c"
     DEFAULT_PORTS = {'t': '51001', 's': '51002'}
     DEFAULT_SERVERS = read_json('servers_testnet.json', {})
-    CHECKPOINTS = read_json_gz('checkpoints_testnet.json.gz', [])
+    CHECKPOINTS = LazyJsonGz('checkpoints_testnet.json.gz', [])
 
     XPRV_HEADERS = {
         'standard':    0x04358394,  # tprv
@@ -33,26 +33,24 @@ from typing import Dict, Optional, Tuple, Iterable, Callable, Union, Sequence, M
 from base64 import b64decode, b64encode
 from collections import defaultdict
 import json
+from bisect import bisect_left
 
 import aiohttp
 from aiohttp import web, client_exceptions
 from aiorpcx import TaskGroup, timeout_after, TaskTimeout, ignore_after
 
 from . import util
-from .network import Network
 from .util import (json_decode, to_bytes, to_string, profiler, standardize_path, constant_time_compare)
 from .invoices import PR_PAID, PR_EXPIRED
 from .util import log_exceptions, ignore_exceptions, randrange
-from .wallet import Wallet, Abstract_Wallet
-from .storage import WalletStorage
-from .wallet_db import WalletDB
 from .commands import known_commands, Commands
 from .simple_config import SimpleConfig
-from .exchange_rate import FxThread
 from .logging import get_logger, Logger
 
 if TYPE_CHECKING:
     from electrum_dash import gui
+    from .network import Network
+    from .wallet import Abstract_Wallet
 
 
 _logger = get_logger(__name__)
@@ -91,31 +89,86 @@ def get_file_descriptor(config: SimpleConfig):
 
 
 def request(config: SimpleConfig, endpoint, args=(), timeout=60):
-    lockfile = get_lockfile(config)
-    while True:
-        create_time = None
+    client = DaemonClient(config)
+    try:
+        return client.request(endpoint, args, timeout)
+    finally:
+        client.close()
+
+
+class DaemonClient:
+    '''JSON-RPC client of running daemon. Server address and credentials
+    are read once, and one keep-alive HTTP connection is reused for all
+    requests, to make series of commands cheap'''
+
+    def __init__(self, config: SimpleConfig, loop=None):
+        self.config = config
+        self.loop = loop or asyncio.get_event_loop()
+        self.server_url = None
+        self.create_time = None
+        self.session = None  # type: Optional[aiohttp.ClientSession]
+        self.rpc_client = None  # type: Optional[util.JsonRPCClient]
+
+    def _read_lockfile(self):
+        lockfile = get_lockfile(self.config)
         try:
             with open(lockfile) as f:
-                (host, port), create_time = ast.literal_eval(f.read())
+                (host, port), self.create_time = ast.literal_eval(f.read())
         except Exception:
             raise DaemonNotRunning()
-        rpc_user, rpc_password = get_rpc_credentials(config)
         server_url = 'http://%s:%d' % (host, port)
-        auth = aiohttp.BasicAuth(login=rpc_user, password=rpc_password)
-        loop = asyncio.get_event_loop()
-        async def request_coroutine():
-            async with aiohttp.ClientSession(auth=auth) as session:
-                c = util.JsonRPCClient(session, server_url)
-                return await c.request(endpoint, *args)
+        if server_url != self.server_url:
+            self._close_session()
+            self.server_url = server_url
+
+    async def _request(self, endpoint, args):
+        if self.session is None:
+            rpc_user, rpc_password = get_rpc_credentials(self.config)
+            auth = aiohttp.BasicAuth(login=rpc_user, password=rpc_password)
+            self.session = aiohttp.ClientSession(auth=auth)
+            self.rpc_client = util.JsonRPCClient(self.session, self.server_url)
+        return await self.rpc_client.request(endpoint, *args)
+
+    def request(self, endpoint, args=(), timeout=60):
+        reconnected = False
+        while True:
+            if self.session is None:
+                self._read_lockfile()
+            try:
+                fut = asyncio.run_coroutine_threadsafe(
+                    self._request(endpoint, args), self.loop)
+                return fut.result(timeout=timeout)
+            except aiohttp.client_exceptions.ClientConnectorError as e:
+                _logger.info(f"failed to connect to JSON-RPC server {e}")
+                self._close_session()
+                self._read_lockfile()  # daemon may have been restarted
+                create_time = self.create_time
+                if not create_time or create_time < time.time() - 1.0:
+                    raise DaemonNotRunning()
+            except (aiohttp.client_exceptions.ServerDisconnectedError,
+                    aiohttp.client_exceptions.ClientOSError) as e:
+                # keep-alive connection closed by stopped/restarted daemon
+                if reconnected:
+                    raise
+                _logger.info(f"JSON-RPC server connection lost {e!r}")
+                self._close_session()
+                reconnected = True
+                continue
+            # Sleep a bit and try again; it might have just been started
+            time.sleep(1.0)
+
+    def _close_session(self):
+        if self.session is None:
+            return
+        session, self.session, self.rpc_client = self.session, None, None
+        fut = asyncio.run_coroutine_threadsafe(session.close(), self.loop)
         try:
-            fut = asyncio.run_coroutine_threadsafe(request_coroutine(), loop)
-            return fut.result(timeout=timeout)
-        except aiohttp.client_exceptions.ClientConnectorError as e:
-            _logger.info(f"failed to connect to JSON-RPC server {e}")
-            if not create_time or create_time < time.time() - 1.0:
-                raise DaemonNotRunning()
-        # Sleep a bit and try again; it might have just been started
-        time.sleep(1.0)
+            fut.result(timeout=5)
+        except Exception as e:
+            _logger.info(f'failed to close JSON-RPC client session: {e!r}')
+
+    def close(self):
+        self._close_session()
 
 
 def get_rpc_credentials(config: SimpleConfig) -> Tuple[str, str]:
@@ -147,14 +200,62 @@ class AuthenticationInvalidOrMissing(AuthenticationError):
 class AuthenticationCredentialsInvalid(AuthenticationError):
     pass
 
+class RPCStats:
+    '''Per method calls count and latency histogram'''
+
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self):
+        self.methods = {}  # type: Dict[str, dict]
+
+    def record(self, method, secs, error=False):
+        stat = self.methods.get(method)
+        if stat is None:
+            stat = self.methods[method] = {
+                'count': 0,
+                'errors': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'hist': [0] * (len(self.BUCKETS_MS) + 1),
+            }
+        ms = secs * 1000
+        stat['count'] += 1
+        if error:
+            stat['errors'] += 1
+        stat['total_ms'] += ms
+        stat['max_ms'] = max(stat['max_ms'], ms)
+        stat['hist'][bisect_left(self.BUCKETS_MS, ms)] += 1
+
+    def to_json(self):
+        res = {}
+        bounds = [f'<={b}ms' for b in self.BUCKETS_MS]
+        bounds.append(f'>{self.BUCKETS_MS[-1]}ms')
+        for method, stat in sorted(self.methods.items()):
+            count = stat['count']
+            res[method] = {
+                'count': count,
+                'errors': stat['errors'],
+                'avg_ms': round(stat['total_ms'] / count, 3),
+                'max_ms': round(stat['max_ms'], 3),
+                'histogram': {b: n for b, n in zip(bounds, stat['hist'])
+                              if n},
+            }
+        return res
+
+
 class AuthenticatedServer(Logger):
 
+    MAX_BATCH_SIZE = 100  # calls in one JSON-RPC batch
+    MAX_BATCH_CONCURRENCY = 8  # batch calls executed at once (all batches)
+
     def __init__(self, rpc_user, rpc_password):
         Logger.__init__(self)
         self.rpc_user = rpc_user
         self.rpc_password = rpc_password
-        self.auth_lock = asyncio.Lock()
+        self.auth_lock = asyncio.Lock()  # serializes failed attempts only
+        self.batch_calls_sem = asyncio.Semaphore(self.MAX_BATCH_CONCURRENCY)
         self._methods = {}  # type: Dict[str, Callable]
+        self.rpc_stats = RPCStats()
 
     def register_method(self, f):
         assert f.__name__ not in self._methods, f"name collision for {f.__name__}"
@@ -175,34 +276,88 @@ class AuthenticatedServer(Logger):
         username, _, password = credentials.partition(':')
         if not (constant_time_compare(username, self.rpc_user)
                 and constant_time_compare(password, self.rpc_password)):
-            await asyncio.sleep(0.050)
+            # only failed attempts are serialized and delayed
+            async with self.auth_lock:
+                await asyncio.sleep(0.050)
             raise AuthenticationCredentialsInvalid('Invalid Credentials')
 
     async def handle(self, request):
-        async with self.auth_lock:
-            try:
-                await self.authenticate(request.headers)
-            except AuthenticationInvalidOrMissing:
-                return web.Response(headers={"WWW-Authenticate": "Basic realm=Dash-Electrum"},
-                                    text='Unauthorized', status=401)
-            except AuthenticationCredentialsInvalid:
-                return web.Response(text='Forbidden', status=403)
+        try:
+            await self.authenticate(request.headers)
+        except AuthenticationInvalidOrMissing:
+            return web.Response(headers={"WWW-Authenticate": "Basic realm=Dash-Electrum"},
+                                text='Unauthorized', status=401)
+        except AuthenticationCredentialsInvalid:
+            return web.Response(text='Forbidden', status=403)
         try:
             request = await request.text()
             request = json.loads(request)
-            method = request['method']
-            _id = request['id']
-            params = request.get('params', [])  # type: Union[Sequence, Mapping]
-            if method not in self._methods:
-                raise Exception(f"attempting to use unregistered method: {method}")
-            f = self._methods[method]
+            if isinstance(request, list):
+                if not request:
+                    raise Exception('empty batch')
+                if len(request) > self.MAX_BATCH_SIZE:
+                    raise Exception(f'batch size exceeds'
+                                    f' {self.MAX_BATCH_SIZE}')
         except Exception as e:
             self.logger.exception("invalid request")
             return web.Response(text='Invalid Request', status=500)
+        if isinstance(request, list):
+            # JSON-RPC 2.0 batch, calls are executed concurrently
+            # up to MAX_BATCH_CONCURRENCY
+            async def handle_batch_call(call):
+                async with self.batch_calls_sem:
+                    return await self.handle_call(call, in_batch=True)
+            responses = await asyncio.gather(*[handle_batch_call(call)
+                                               for call in request])
+            # notifications (calls without id) get no response
+            responses = [r for r in responses if r is not None]
+            if not responses:
+                return web.Response(status=204)
+            return web.json_response(responses)
+        response = await self.handle_call(request)
+        if response is None:
+            return web.Response(text='Invalid Request', status=500)
+        return web.json_response(response)
+
+    async def handle_call(self, call, *, in_batch=False) -> Optional[dict]:
+        '''Execute call and return its response. Invalid single call
+        returns None, in batch JSON-RPC 2.0 error responses are returned
+        for invalid calls and None for notifications (calls without id)'''
+        try:
+            method = call['method']
+            if not isinstance(method, str):
+                raise Exception(f'invalid method: {method}')
+            if in_batch:
+                is_notification = 'id' not in call
+                _id = call.get('id')
+            else:
+                is_notification = False
+                _id = call['id']
+            params = call.get('params', [])  # type: Union[Sequence, Mapping]
+        except Exception as e:
+            self.logger.exception("invalid request")
+            if in_batch:
+                return {
+                    'id': None,
+                    'jsonrpc': '2.0',
+                    'error': {'code': -32600, 'message': 'Invalid Request'},
+                }
+            return None
         response = {
             'id': _id,
             'jsonrpc': '2.0',
         }
+        f = self._methods.get(method)
+        if f is None:
+            self.logger.info(f"attempting to use unregistered method: {method}")
+            if not in_batch:
+                return None
+            response['error'] = {
+                'code': -32601,
+                'message': 'Method not found',
+            }
+            return None if is_notification else response
+        start = time.monotonic()
         try:
             if isinstance(params, dict):
                 response['result'] = await f(**params)
@@ -214,7 +369,9 @@ class AuthenticatedServer(Logger):
                 'code': 1,
                 'message': str(e),
             }
-        return web.json_response(response)
+        self.rpc_stats.record(method, time.monotonic() - start,
+                              error='error' in response)
+        return None if is_notification else response
 
 
 class CommandsServer(AuthenticatedServer):
@@ -379,7 +536,7 @@ class PayServer(Logger):
 
 class Daemon(Logger):
 
-    network: Optional[Network]
+    network: Optional['Network']
     gui_object: Optional[Union['gui.qt.ElectrumGui', 'gui.kivy.ElectrumGui']]
 
     @profiler
@@ -401,6 +558,9 @@ class Daemon(Logger):
                 raise Exception('event loop not running for 30 seconds')
             time.sleep(0.1)
             asyncio_wait_time += 0.1
+        # network, wallet and fx are not needed by the command line client
+        from .network import Network
+        from .exchange_rate import FxThread
         self.network = None
         if not config.get('offline'):
             self.network = Network(config, daemon=self)
@@ -447,7 +607,7 @@ class Daemon(Logger):
             self.stopping_soon.set()
 
     def load_wallet(self, path, password, *, manual_upgrades=True,
-                    set_current=False) -> Optional[Abstract_Wallet]:
+                    set_current=False) -> Optional['Abstract_Wallet']:
         path = standardize_path(path)
         # wizard will be launched if we return
         if path in self._wallets:
@@ -455,6 +615,9 @@ class Daemon(Logger):
             if set_current:
                 self.current_wallet_path = path
             return wallet
+        from .storage import WalletStorage
+        from .wallet_db import WalletDB
+        from .wallet import Wallet
         storage = WalletStorage(path)
         storage.write_attempts = self.config.get('storage_write_attempts', 1)
         if not storage.file_exists():
@@ -487,16 +650,16 @@ class Daemon(Logger):
             self.current_wallet_path = path
         return wallet
 
-    def add_wallet(self, wallet: Abstract_Wallet) -> None:
+    def add_wallet(self, wallet: 'Abstract_Wallet') -> None:
         path = wallet.storage.path
         path = standardize_path(path)
         self._wallets[path] = wallet
 
-    def get_wallet(self, path: str) -> Optional[Abstract_Wallet]:
+    def get_wallet(self, path: str) -> Optional['Abstract_Wallet']:
         path = standardize_path(path)
         return self._wallets.get(path)
 
-    def get_wallets(self) -> Dict[str, Abstract_Wallet]:
+    def get_wallets(self) -> Dict[str, 'Abstract_Wallet']:
         return dict(self._wallets)  # copy
 
     def delete_wallet(self, path: str) -> bool:
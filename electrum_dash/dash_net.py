@@ -40,11 +40,10 @@ from collections import defaultdict, deque
 from typing import Optional, Dict
 
 from . import constants, util
-from .constants import CHUNK_SIZE
 from .blockchain import MissingHeader
 from .dash_peer import DashPeer
 from .dash_msg import SporkID, LLMQType
-from .dash_ps_net import PSDenoms, PRIVATESEND_QUEUE_TIMEOUT
+from .dash_ps_net import PSDsqStore, PRIVATESEND_QUEUE_TIMEOUT
 from .dash_tx import str_ip
 from .i18n import _
 from .logging import Logger
@@ -57,6 +56,7 @@ Y2099 = 4070908800  # Thursday, January 1, 2099 12:00:00 AM
 MIN_PEERS_LIMIT = 2
 MAX_PEERS_LIMIT = 8
 MAX_PEERS_DEFAULT = 2
+MNLISTD_MAX_PARALLEL = 4  # max parallel getmnlistd requests to distinct peers
 NUM_RECENT_PEERS = 20
 NET_THREAD_MSG = 'must not be called from network thread'
 DNS_OVER_HTTPS_ENDPOINTS = [
@@ -222,9 +222,8 @@ class DashNet(Logger):
         self.recent_islocks_clear = time.time()
         self.recent_islocks = list()
 
-        # Recent broadcasted dsq data
-        self.recent_dsq = deque([], 100)
-        self.recent_dsq_hashes = deque([], 50)  # added from network broadcasts
+        # Recent broadcasted dsq data sharded by nDenom
+        self.recent_dsq = PSDsqStore()  # added from network broadcasts
 
         # Activity data
         self.read_bytes = 0
@@ -375,16 +374,9 @@ class DashNet(Logger):
             self.recent_islocks_clear = now
 
     def add_recent_dsq(self, dsq):
-        nDenom = dsq.nDenom
-        if nDenom not in list(PSDenoms):
-            return
-        dsq_hash = f'{nDenom}:{dsq.protxHash}:{dsq.nTime}'
-        if dsq_hash in self.recent_dsq_hashes:
-            return
-        self.recent_dsq_hashes.append(dsq_hash)
-        self.recent_dsq.appendleft(dsq)
-        self.logger.info(f'added recent dsq, queue length:'
-                         f' {len(self.recent_dsq)}')
+        if self.recent_dsq.add(dsq):
+            self.logger.info(f'added recent dsq, queue length:'
+                             f' {len(self.recent_dsq)}')
 
     def is_suitable_dsq(self, dsq, recent_mixes_mns):
         protxHash = bh2u(dsq.protxHash)
@@ -406,11 +398,13 @@ class DashNet(Logger):
             return False
         return True
 
-    def get_recent_dsq(self, recent_mixes_mns):
-        while len(self.recent_dsq) > 0:
-            dsq = self.recent_dsq.popleft()
-            if self.is_suitable_dsq(dsq, recent_mixes_mns):
-                return dsq
+    async def wait_recent_dsq(self, recent_mixes_mns, denoms=None,
+                              timeout=None):
+        '''Wait for next suitable dsq with nDenom in denoms (all if None),
+        return None on timeout'''
+        def is_suitable(dsq):
+            return self.is_suitable_dsq(dsq, recent_mixes_mns)
+        return await self.recent_dsq.wait(denoms, is_suitable, timeout)
 
     @log_exceptions
     async def set_parameters(self):
@@ -553,6 +547,12 @@ class DashNet(Logger):
         randi = random.randint(0, peers_cnt-1)
         return peers[randi]
 
+    async def get_random_peers(self, cnt):
+        '''Get up to cnt distinct random peers'''
+        await self.get_random_peer()  # wait for at least one connected peer
+        peers = list(self.peers.values())
+        return random.sample(peers, min(cnt, len(peers)))
+
     async def _gather_sporks(self):
         while True:
             peers_cnt = len(self.peers)
@@ -673,51 +673,61 @@ class DashNet(Logger):
 
     async def getmnlistd(self, get_mns=False):
         mn_list = self.network.mn_list
-        llmq_offset = mn_list.LLMQ_OFFSET
         base_height = mn_list.protx_height if get_mns else mn_list.llmq_height
 
         height = self.network.get_local_height()
         self.logger.debug(f'getmnlistd base_height={base_height}'
                           f' height={height}')
-        if get_mns:
-            if not height or height <= base_height:
-                return
-        else:
-            if not height or height <= base_height + llmq_offset:
-                return
-
-        activation_height = constants.net.DIP3_ACTIVATION_HEIGHT
-        if base_height <= 1:
-            if height > activation_height:
-                height = activation_height + 1
-        elif height - (base_height + llmq_offset) > CHUNK_SIZE:
-            height = mn_list.calc_max_height(base_height, height)
-        elif height - base_height > llmq_offset:
-            height = height - llmq_offset
+        # request non overlapping diffs from several peers in parallel
+        max_ranges = min(max(len(self.peers), 1), MNLISTD_MAX_PARALLEL)
+        ranges = mn_list.calc_getmnlistd_ranges(base_height, height,
+                                                get_mns, max_ranges)
+        if not ranges:
+            return
 
         try:
-            params = (base_height, height)
+            params = (base_height, ranges[-1][1])
             mn_list.sent_getmnlistd.put_nowait(params)
         except asyncio.QueueFull:
             self.logger.info('ignore excess getmnlistd request')
             return
+
+        def format_err(e, r):
+            if isinstance(e, asyncio.TimeoutError):
+                e_str = 'timeout'
+            elif isinstance(e, asyncio.CancelledError):
+                e_str = 'cancelled'
+            else:
+                e_str = repr(e)
+            return f'getmnlistd(get_mns={get_mns} params={r}): {e_str}'
+
+        res = []
+        err = None
         try:
-            res = None
+            peers = await self.get_random_peers(len(ranges))
+            ranges = ranges[:len(peers)]
+            for p, (r_base_height, r_height) in zip(peers, ranges):
+                self.logger.debug(f'{p.diagnostic_name()}.getmnlistd'
+                                  f' base_height={r_base_height}'
+                                  f' height={r_height}')
+            diffs = await asyncio.gather(*[p.getmnlistd(*r)
+                                           for p, r in zip(peers, ranges)],
+                                         return_exceptions=True)
+            for r, diff in zip(ranges, diffs):
+                if isinstance(diff, BaseException):
+                    err = format_err(diff, r)
+                    break
+                res.append(diff)
+        except (asyncio.CancelledError, Exception) as e:
+            err = format_err(e, params)
+        if res and err:
+            # apply successfully received diffs, next request will continue
+            self.logger.info(err)
             err = None
-            p = await self.get_random_peer()
-            self.logger.debug(f'{p.diagnostic_name()}.getmnlistd'
-                              f' base_height={base_height}'
-                              f' height={height}')
-            res = await p.getmnlistd(*params)
-        except asyncio.TimeoutError:
-            err = f'getmnlistd(get_mns={get_mns} params={params}): timeout'
-        except asyncio.CancelledError:
-            err = f'getmnlistd(get_mns={get_mns} params={params}): cancelled'
-        except Exception as e:
-            err = f'getmnlistd(get_mns={get_mns} params={params}): {repr(e)}'
         util.trigger_callback('mnlistdiff', {'error': err,
                                              'result': res,
-                                             'params': params})
+                                             'params': params,
+                                             'ranges': ranges[:len(res)]})
 
     async def resolve_dns_over_https(self, hostname, record_type='A'):
         params = {'ct': 'application/dns-json',
@@ -5,7 +5,7 @@ import copy
 import random
 import time
 import threading
-from collections import deque
+from collections import deque, Counter
 from uuid import uuid4
 
 from . import util
@@ -151,7 +151,12 @@ class PSManager(Logger, PSKeystoreMixin, PSDataMixin, PSOptsMixin,
 
         self.mix_sessions_lock = asyncio.Lock()
         self.mix_sessions = {}  # dict peer -> PSMixSession
-        self.recent_mixes_mns = deque([], 10)  # added from mixing sessions
+        # added from mixing sessions, keep MNs of all running sessions
+        # and 10 recently used
+        self.recent_mixes_mns = deque([], self.MAX_PRIVATESEND_SESSIONS + 10)
+        # running start_denominate_wfl tasks count by denom value,
+        # None key for tasks which has not yet selected denom value
+        self.running_mixes = Counter()
 
         self.denoms_lock = threading.Lock()
         self.collateral_lock = threading.Lock()
@@ -385,6 +390,7 @@ class PSManager(Logger, PSKeystoreMixin, PSDataMixin, PSOptsMixin,
         with self.state_lock:
             self.state = PSStates.Mixing
         self.last_mix_start_time = time.time()
+        self.mix_rates.reset()
         self.logger.info('Started PrivateSend Mixing')
         w = self.wallet
         util.trigger_callback('ps-state-changes', w, None, None)
@@ -585,7 +591,7 @@ class PSManager(Logger, PSKeystoreMixin, PSDataMixin, PSOptsMixin,
         while not main_taskgroup.closed():
             if (self._denoms_to_mix_cache
                     and self.pay_collateral_wfl
-                    and self.active_denominate_wfl_cnt < self.max_sessions):
+                    and self.running_mixes_cnt < self.max_sessions):
                 if not self.check_llmq_ready():
                     self.logger.info('LLMQ height {0}, LLMQ tip {1}'
                                      .format(self.network.mn_list.llmq_height, self.network.mn_list.llmq_tip))
@@ -600,7 +606,8 @@ class PSManager(Logger, PSKeystoreMixin, PSDataMixin, PSOptsMixin,
                                      .format(self.MNS_DATA_NOT_READY))
                     await asyncio.sleep(5)
                     continue
-                elif kp_wait_state and self.keypairs_state != kp_wait_state:
+                elif (kp_wait_state
+                        and not self.keypairs_ready_to_denominate):
                     self.logger.info('Denominate workflow waiting'
                                      ' for keypairs generation')
                     await asyncio.sleep(5)
@@ -609,6 +616,30 @@ class PSManager(Logger, PSKeystoreMixin, PSDataMixin, PSOptsMixin,
                     await main_taskgroup.spawn(self.start_denominate_wfl())
             await asyncio.sleep(0.25)
 
+    @property
+    def running_mixes_cnt(self):
+        '''Count of running start_denominate_wfl tasks'''
+        return sum(self.running_mixes.values())
+
+    def _denom_values_to_schedule(self):
+        '''Get Counter of denoms to mix by denom value for values on which
+        new mixing session can be started (max_sessions_per_denom)'''
+        limit = self.max_sessions_per_denom
+        res = Counter(self._denoms_to_mix_cache.cnt_by_values)
+        for denom_value in list(res.keys()):
+            if self.running_mixes[denom_value] >= limit:
+                del res[denom_value]
+        return res
+
+    def _reserve_mix_denom_value(self, denom_value):
+        '''Count running start_denominate_wfl task on selected denom value,
+        return False if max_sessions_per_denom is reached'''
+        if self.running_mixes[denom_value] >= self.max_sessions_per_denom:
+            return False
+        self.running_mixes[None] -= 1
+        self.running_mixes[denom_value] += 1
+        return True
+
     async def start_mix_session(self, denom_value, dsq, wfl_lid):
         '''Start mixing session on MN from dsq in wfl identified by wfl_lid'''
         n_denom = PS_DENOMS_DICT[denom_value]
@@ -1655,6 +1686,8 @@ class PSManager(Logger, PSKeystoreMixin, PSDataMixin, PSOptsMixin,
     async def start_denominate_wfl(self):
         '''Select suitable masternode and start single denominate workflow '''
         wfl = None
+        dval = None
+        self.running_mixes[None] += 1
         try:
             _start = self._start_denominate_wfl
             dsq = None
@@ -1662,20 +1695,40 @@ class PSManager(Logger, PSKeystoreMixin, PSDataMixin, PSOptsMixin,
             if random.random() > 0.33:
                 self.logger.debug('try to get masternode from recent dsq')
                 recent_mns = self.recent_mixes_mns
+                deadline = time.monotonic() + self.RECENT_DSQ_WAIT_TIME
                 while self.state == PSStates.Mixing:
-                    dsq = self.dash_net.get_recent_dsq(recent_mns)
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        # waiters must not hold sessions slots forever
+                        self.logger.debug('no suitable recent dsq')
+                        break
+                    denoms = [PS_DENOMS_DICT[v]
+                              for v in self._denom_values_to_schedule()]
+                    # wake up on new dsq or recheck mixing state on timeout
+                    dsq = await self.dash_net.wait_recent_dsq(
+                        recent_mns, denoms, timeout=min(5, timeout))
                     if dsq is not None:
                         self.logger.debug(f'get dsq from recent dsq queue'
                                           f' {bh2u(dsq.protxHash)}')
-                        dval = PS_DENOM_REVERSE_DICT[dsq.nDenom]
+                        dsq_dval = PS_DENOM_REVERSE_DICT[dsq.nDenom]
+                        if not self._reserve_mix_denom_value(dsq_dval):
+                            dsq = None
+                            continue  # other session has taken last slot
+                        dval = dsq_dval
                         wfl = await self.loop.run_in_executor(None,
                                                               _start, dval)
                         break
-                    await asyncio.sleep(0.5)
-            else:
+            if dval is None and self.state == PSStates.Mixing:
                 self.logger.debug('try to create new queue'
                                   ' on random masternode')
-                wfl = await self.loop.run_in_executor(None, _start)
+                denom_values = self._denom_values_to_schedule()
+                if denom_values:
+                    dvals, weights = zip(*denom_values.items())
+                    rand_dval = random.choices(dvals, weights)[0]
+                    if self._reserve_mix_denom_value(rand_dval):
+                        dval = rand_dval
+                        wfl = await self.loop.run_in_executor(None,
+                                                              _start, dval)
             if not wfl:
                 return
 
@@ -1759,6 +1812,7 @@ class PSManager(Logger, PSKeystoreMixin, PSDataMixin, PSOptsMixin,
                 else:
                     raise Exception(f'Unsolisited cmd: {cmd} after dss sent')
             self.logger.wfl_ok(f'Completed denominate workflow: {wfl.lid}')
+            self.mix_rates.on_session_completed(len(wfl.inputs))
         except Exception as e:
             type_e = type(e)
             if self.gather_mix_stat:
@@ -1791,10 +1845,13 @@ class PSManager(Logger, PSKeystoreMixin, PSDataMixin, PSOptsMixin,
                 if msg:
                     await self.stop_mixing_from_async_thread(msg)
         finally:
-            if session:
-                await self.stop_mix_session(session.peer_str)
-            if wfl:
-                await self.cleanup_denominate_wfl(wfl)
+            self.running_mixes[dval] -= 1
+            try:
+                if session:
+                    await self.stop_mix_session(session.peer_str)
+            finally:
+                if wfl:
+                    await self.cleanup_denominate_wfl(wfl)
 
     def _select_denoms_to_mix(self, denom_value=None):
         '''Select denoms to mix based on denom value'''
@@ -1803,51 +1860,45 @@ class PSManager(Logger, PSKeystoreMixin, PSDataMixin, PSOptsMixin,
                               ' _denoms_to_mix_cache is empty')
             return None, None
 
-        if denom_value is not None:
-            denoms = self.denoms_to_mix(denom_value=denom_value)
-        else:
-            denoms = self.denoms_to_mix()
-        outpoints = list(denoms.keys())
-
         w = self.wallet
-        icnt = 0
-        txids = []
-        inputs = []
-        while icnt < random.randint(1, PRIVATESEND_ENTRY_MAX_SIZE):
-            if not outpoints:
-                break
-
-            outpoint = outpoints.pop(random.randint(0, len(outpoints)-1))
-            if not w.db.get_ps_denom(outpoint):  # already spent
-                continue
-
-            if w.db.get_ps_spending_denom(outpoint):  # reserved to spend
-                continue
+        checked_txids = {}
+        kp_caching = (self.keypairs_state == KPStates.Caching)
+        kp_caches = list(self._keypairs_cache.values())
 
+        def is_suitable(outpoint, denom):
             txid = outpoint.split(':')[0]
-            if txid in txids:  # skip outputs from same tx
-                continue
-
-            height = w.get_tx_height(txid).height
-            islock = w.db.get_islock(txid)
-            if not islock and height <= 0:  # skip not islocked/confirmed
-                continue
-
-            denom = denoms.pop(outpoint)
-            if denom[2] >= self.mix_rounds:
-                continue
-
+            if txid not in checked_txids:
+                height = w.get_tx_height(txid).height
+                islock = w.db.get_islock(txid)
+                # skip not islocked/confirmed
+                checked_txids[txid] = bool(islock or height > 0)
+            if not checked_txids[txid]:
+                return False
             if not self.is_ps_ks(denom[0]) and self.is_hw_ks:
-                continue  # skip denoms on hw keystore
-
-            if denom_value is None:
-                denom_value = denom[1]
-            elif denom[1] != denom_value:  # skip other denom values
-                continue
+                return False  # skip denoms on hw keystore
+            if kp_caching and not any(denom[0] in c for c in kp_caches):
+                return False  # skip denoms with keypairs not cached yet
+            return True
 
-            inputs.append(outpoint)
-            txids.append(txid)
-            icnt += 1
+        max_cnt = random.randint(1, PRIVATESEND_ENTRY_MAX_SIZE)
+        inputs = []
+        tried_txids = set()
+        while len(inputs) < max_cnt:
+            with self.denoms_lock:
+                denoms_to_mix = self._denoms_to_mix_cache
+                if denom_value is None:
+                    denom_value = denoms_to_mix.random_value()
+                candidates = denoms_to_mix.candidates(denom_value,
+                                                      max_cnt - len(inputs),
+                                                      tried_txids)
+            if not candidates:
+                break
+            # is_suitable takes wallet.lock, so it is called after
+            # denoms_lock is released to keep lock order of add_transaction
+            for outpoint, denom in candidates:
+                tried_txids.add(outpoint.split(':')[0])
+                if is_suitable(outpoint, denom):
+                    inputs.append(outpoint)
 
         if not inputs:
             self.logger.debug(f'No suitable denoms to mix:'
@@ -2,6 +2,7 @@
 
 import asyncio
 import time
+from collections import OrderedDict
 from enum import IntEnum
 from .blspy_wrapper import BasicSchemeMPL, G1Element, G2Element
 
@@ -13,6 +14,8 @@ from .util import bfh, bh2u
 
 PRIVATESEND_QUEUE_TIMEOUT = 30
 PRIVATESEND_SESSION_MSG_TIMEOUT = 40
+PRIVATESEND_DSQ_SHARD_MAX_SIZE = 100
+PRIVATESEND_DSQ_SEEN_MAX_SIZE = 1000
 
 
 class PSDenoms(IntEnum):
@@ -24,6 +27,116 @@ class PSDenoms(IntEnum):
     D0_001 = 16
 
 
+class PSDsqStore:
+    '''Recent broadcasted dsq messages sharded by nDenom.
+    Must be used from the network asyncio loop thread only.'''
+
+    def __init__(self, shard_max_size=PRIVATESEND_DSQ_SHARD_MAX_SIZE,
+                 seen_max_size=PRIVATESEND_DSQ_SEEN_MAX_SIZE):
+        self.shard_max_size = shard_max_size
+        self.seen_max_size = seen_max_size
+        # nDenom => OrderedDict dsq key => dsq, oldest dsq first
+        self.shards = {int(d): OrderedDict() for d in PSDenoms}
+        # already seen dsq keys, oldest first
+        self.seen = OrderedDict()
+        # nDenom => set of futures waiting for new dsq
+        self.waiters = {int(d): set() for d in PSDenoms}
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards.values())
+
+    @staticmethod
+    def dsq_key(dsq):
+        return (dsq.nDenom, dsq.protxHash, dsq.nTime)
+
+    @staticmethod
+    def is_expired(dsq, now=None):
+        if now is None:
+            now = time.time()
+        return now - dsq.nTime > PRIVATESEND_QUEUE_TIMEOUT
+
+    def add(self, dsq):
+        '''Add dsq to shard of its nDenom, return True if dsq is added'''
+        shard = self.shards.get(dsq.nDenom)
+        if shard is None:
+            return False
+        key = self.dsq_key(dsq)
+        if key in self.seen:
+            return False
+        self.seen[key] = None
+        if len(self.seen) > self.seen_max_size:
+            self.seen.popitem(last=False)
+        self.expire()
+        if self.is_expired(dsq):
+            return False
+        shard[key] = dsq
+        if len(shard) > self.shard_max_size:
+            shard.popitem(last=False)
+        for fut in self.waiters[dsq.nDenom]:
+            if not fut.done():
+                fut.set_result(None)
+        return True
+
+    def expire(self, now=None):
+        '''Remove expired dsq from the beginning of shards'''
+        if now is None:
+            now = time.time()
+        for shard in self.shards.values():
+            while shard:
+                key, dsq = next(iter(shard.items()))
+                if not self.is_expired(dsq, now):
+                    break
+                del shard[key]
+
+    def pop(self, denoms=None, is_suitable=None):
+        '''Pop newest not expired dsq with nDenom from denoms
+        (all denoms if None) for which is_suitable(dsq) is True'''
+        if denoms is None:
+            denoms = self.shards.keys()
+        shards = [self.shards[d] for d in denoms if d in self.shards]
+        now = time.time()
+        while True:
+            shards = [shard for shard in shards if shard]
+            if not shards:
+                return None
+            # select shard with newest dsq
+            shard = max(shards, key=lambda s: next(reversed(s.values())).nTime)
+            key, dsq = shard.popitem(last=True)
+            if self.is_expired(dsq, now):
+                shard.clear()  # other dsq in shard is older
+                continue
+            if is_suitable is None or is_suitable(dsq):
+                return dsq
+
+    async def wait(self, denoms=None, is_suitable=None, timeout=None):
+        '''Wait for next suitable dsq with nDenom from denoms,
+        return None on timeout'''
+        if denoms is None:
+            denoms = list(self.shards.keys())
+        else:
+            denoms = [d for d in denoms if d in self.shards]
+        loop = asyncio.get_event_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            dsq = self.pop(denoms, is_suitable)
+            if dsq is not None:
+                return dsq
+            if deadline is not None:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    return None
+            fut = loop.create_future()
+            for d in denoms:
+                self.waiters[d].add(fut)
+            try:
+                await asyncio.wait_for(fut, timeout)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                for d in denoms:
+                    self.waiters[d].discard(fut)
+
+
 class MixSessionTimeout(Exception):
     """Thrown when waiting for next message from MN is timed out"""
 
@@ -2,9 +2,11 @@
 
 import asyncio
 import copy
+import random
 import re
 import time
 import logging
+from collections import deque, Counter
 from decimal import Decimal
 from enum import IntEnum
 
@@ -586,6 +588,163 @@ class MixingStats():
             last_sent_msg.on_error()
 
 
+class MixingRates():
+    '''Completed mixing sessions and rounds per hour'''
+
+    WINDOW_SEC = 3600
+
+    def __init__(self):
+        self.reset()
+
+    def __str__(self):
+        return (f'Mixing rates:'
+                f' sessions/hour={round(self.sessions_per_hour, 1)},'
+                f' rounds/hour={round(self.rounds_per_hour, 1)}')
+
+    def reset(self):
+        '''Called on mixing start'''
+        self.start_time = time.time()
+        self.completed = deque()  # (time, rounds count) of sessions
+
+    def on_session_completed(self, rounds_cnt):
+        '''Called on completed mixing session, rounds_cnt is count of
+        inputs mixed in session (each got one more round)'''
+        now = time.time()
+        self.completed.append((now, rounds_cnt))
+        self._expire(now)
+
+    def _expire(self, now):
+        while self.completed and now - self.completed[0][0] > self.WINDOW_SEC:
+            self.completed.popleft()
+
+    def _per_hour(self, cnt, now):
+        elapsed = min(now - self.start_time, self.WINDOW_SEC)
+        if elapsed <= 0:
+            return 0.0
+        return cnt * 3600 / elapsed
+
+    @property
+    def sessions_per_hour(self):
+        now = time.time()
+        self._expire(now)
+        return self._per_hour(len(self.completed), now)
+
+    @property
+    def rounds_per_hour(self):
+        now = time.time()
+        self._expire(now)
+        return self._per_hour(sum(r for t, r in self.completed), now)
+
+
+class _TxidsDict(dict):
+    '''Dict txid => outpoints with random sample of k txids in O(k)'''
+
+    def __init__(self):
+        super(_TxidsDict, self).__init__()
+        self._txids = []
+        self._pos = {}  # txid => position in self._txids
+
+    def __setitem__(self, txid, outpoints):
+        if txid not in self:
+            self._pos[txid] = len(self._txids)
+            self._txids.append(txid)
+        super(_TxidsDict, self).__setitem__(txid, outpoints)
+
+    def __delitem__(self, txid):
+        super(_TxidsDict, self).__delitem__(txid)
+        i = self._pos.pop(txid)
+        last = self._txids.pop()
+        if last != txid:
+            self._txids[i] = last
+            self._pos[last] = i
+
+    def sample(self, k):
+        return random.sample(self._txids, min(k, len(self._txids)))
+
+
+class PSDenomsToMix(dict):
+    '''Dict outpoint => denom of denoms to mix, with index of outpoints
+    grouped by denom value, rounds and txid'''
+
+    def __init__(self, denoms=None):
+        super(PSDenomsToMix, self).__init__()
+        self.index = {}  # denom value => rounds => txid => {outpoint: denom}
+        self.cnt_by_values = Counter()
+        if denoms:
+            for outpoint, denom in denoms.items():
+                self[outpoint] = denom
+
+    def __setitem__(self, outpoint, denom):
+        if outpoint in self:
+            self.pop(outpoint)
+        super(PSDenomsToMix, self).__setitem__(outpoint, denom)
+        addr, value, rounds = denom
+        txid = outpoint.split(':')[0]
+        by_rounds = self.index.setdefault(value, {})
+        by_txid = by_rounds.get(rounds)
+        if by_txid is None:
+            by_txid = by_rounds[rounds] = _TxidsDict()
+        outpoints = by_txid.get(txid)
+        if outpoints is None:
+            outpoints = by_txid[txid] = {}
+        outpoints[outpoint] = denom
+        self.cnt_by_values[value] += 1
+
+    def __delitem__(self, outpoint):
+        self.pop(outpoint)
+
+    def pop(self, outpoint, *args):
+        if outpoint not in self:
+            if args:
+                return args[0]
+            raise KeyError(outpoint)
+        denom = super(PSDenomsToMix, self).pop(outpoint)
+        addr, value, rounds = denom
+        txid = outpoint.split(':')[0]
+        by_rounds = self.index[value]
+        by_txid = by_rounds[rounds]
+        outpoints = by_txid[txid]
+        del outpoints[outpoint]
+        if not outpoints:
+            del by_txid[txid]
+            if not by_txid:
+                del by_rounds[rounds]
+                if not by_rounds:
+                    del self.index[value]
+        self.cnt_by_values[value] -= 1
+        if not self.cnt_by_values[value]:
+            del self.cnt_by_values[value]
+        return denom
+
+    def random_value(self):
+        '''Random denom value weighted by count of denoms with the value'''
+        if not self.cnt_by_values:
+            return None
+        values = list(self.cnt_by_values.keys())
+        weights = [self.cnt_by_values[v] for v in values]
+        return random.choices(values, weights=weights)[0]
+
+    def candidates(self, denom_value, cnt, exclude_txids=()):
+        '''Up to cnt random (outpoint, denom) with denom_value from distinct
+        txids not in exclude_txids, denoms with lesser rounds first'''
+        res = []
+        txids = set()
+        by_rounds = self.index.get(denom_value, {})
+        for rounds in sorted(by_rounds):
+            by_txid = by_rounds[rounds]
+            k = cnt - len(res) + len(txids) + len(exclude_txids)
+            for txid in by_txid.sample(k):
+                if txid in txids or txid in exclude_txids:
+                    continue
+                outpoints = by_txid[txid]
+                outpoint = random.choice(list(outpoints))
+                res.append((outpoint, outpoints[outpoint]))
+                txids.add(txid)
+                if len(res) >= cnt:
+                    return res
+        return res
+
+
 class PSOptsMixin:
     '''PrivateSend user options functionality'''
 
@@ -601,6 +760,8 @@ class PSOptsMixin:
     DEFAULT_PRIVATESEND_SESSIONS = 4    # Number of concurrent mixing sessions
     MIN_PRIVATESEND_SESSIONS = 1
     MAX_PRIVATESEND_SESSIONS = 10
+    DEFAULT_SESSIONS_PER_DENOM = 4      # Concurrent sessions on same denom
+    RECENT_DSQ_WAIT_TIME = 30   # Wait for recent dsq before new queue
 
     DEFAULT_GROUP_HISTORY = True        # Group txs in history views
     DEFAULT_LIMIT_SPEND_FEE = True      # Limit PrivateSend transactions fee
@@ -635,6 +796,7 @@ class PSOptsMixin:
     def __init__(self, wallet):
         self._allow_others = self.DEFAULT_ALLOW_OTHERS
         self.mix_stat = MixingStats()
+        self.mix_rates = MixingRates()
 
     @property
     def keep_amount(self):
@@ -692,7 +854,7 @@ class PSOptsMixin:
         rounds = min(self.max_mix_rounds, int(rounds))
         self.wallet.db.set_ps_data('mix_rounds', rounds)
         with self.denoms_lock:
-            self._denoms_to_mix_cache = self.denoms_to_mix()
+            self._denoms_to_mix_cache = PSDenomsToMix(self.denoms_to_mix())
 
     @property
     def min_mix_rounds(self):
@@ -855,6 +1017,29 @@ class PSOptsMixin:
         else:
             return _('PrivateSend sessions')
 
+    @property
+    def max_sessions_per_denom(self):
+        '''Get maximal concurrent mixing sessions on same denom value'''
+        return self.wallet.db.get_ps_data('max_sessions_per_denom',
+                                          self.DEFAULT_SESSIONS_PER_DENOM)
+
+    @max_sessions_per_denom.setter
+    def max_sessions_per_denom(self, max_sessions):
+        '''Set maximal concurrent mixing sessions on same denom value'''
+        if self.max_sessions_per_denom == max_sessions:
+            return
+        max_sessions = min(int(max_sessions), self.MAX_PRIVATESEND_SESSIONS)
+        max_sessions = max(max_sessions, self.MIN_PRIVATESEND_SESSIONS)
+        self.wallet.db.set_ps_data('max_sessions_per_denom', max_sessions)
+
+    def max_sessions_per_denom_data(self, full_txt=False):
+        '''Str data for UI max_sessions_per_denom preference'''
+        if full_txt:
+            return _('Count of PrivateSend mixing sessions'
+                     ' on the same denomination')
+        else:
+            return _('Sessions per denomination')
+
     @property
     def kp_timeout(self):
         '''Get timeout for keypairs cleaning after mixing stopped'''
@@ -9,7 +9,7 @@ from collections import Counter
 from enum import IntEnum
 from math import floor, ceil
 
-from .bip32 import convert_bip32_intpath_to_strpath
+from .bip32 import convert_bip32_intpath_to_strpath, BIP32Node, CKD_priv
 from .bitcoin import pubkey_to_address
 from .dash_tx import STANDARD_TX, PSTxTypes, SPEC_TX_NAMES
 from .dash_msg import PRIVATESEND_ENTRY_MAX_SIZE
@@ -17,10 +17,11 @@ from .dash_ps_util import (PSTxWorkflow, PSDenominateWorkflow, PSStates,
                            PS_DENOMS_VALS, COLLATERAL_VAL, MIN_DENOM_VAL,
                            CREATE_COLLATERAL_VAL, CREATE_COLLATERAL_VALS,
                            PSCoinRounds, to_duffs, PS_VALS, PS_SAVED_TX_TYPES,
-                           calc_tx_fee)
+                           calc_tx_fee, PSDenomsToMix)
 from .i18n import _
 from .invoices import PR_EXPIRED
-from .keystore import load_keystore, from_seed
+from .ecc import ECPrivkey
+from .keystore import load_keystore, from_seed, BIP32_KeyStore
 from .transaction import PartialTxOutput
 from .util import NotEnoughFunds, InvalidPassword, NoDynamicFeeEstimates
 
@@ -37,6 +38,7 @@ KP_ALL_TYPES = [KP_INCOMING, KP_SPENDABLE,
                 KP_PS_SPENDABLE, KP_PS_COINS, KP_PS_CHANGE]
 KP_MAX_INCOMING_TXS = 5             # max count of txs to split on denoms
                                     # need to calc keypairs count to cache
+KP_DERIVE_BATCH_SIZE = 100          # keypairs added to cache at once
 
 
 class KPStates(IntEnum):
@@ -48,6 +50,25 @@ class KPStates(IntEnum):
     Unused = 4
 
 
+def derive_keypairs(xprv, sequences):
+    '''Derive keypairs [(pubkey, (privkey, compressed)), ...] for sequences
+    from master xprv, reusing derived branch nodes'''
+    node = BIP32Node.from_xkey(xprv)
+    branches = {}
+    res = []
+    for sequence in sequences:
+        branch = tuple(sequence[:-1])
+        if branch not in branches:
+            branch_node = node.subkey_at_private_derivation(branch)
+            branches[branch] = (branch_node.eckey.get_secret_bytes(),
+                                branch_node.chaincode)
+        privkey, chaincode = branches[branch]
+        privkey, _ = CKD_priv(privkey, chaincode, sequence[-1])
+        pubkey = ECPrivkey(privkey).get_public_key_hex(compressed=True)
+        res.append((pubkey, (privkey, True)))
+    return res
+
+
 class NotFoundInKeypairs(Exception):
     """Thrown when output address not found in keypairs cache"""
 
@@ -85,6 +106,7 @@ class KeyPairsMixin:
         self.keypairs_state_lock = threading.Lock()
         self._keypairs_state = KPStates.Empty
         self._keypairs_cache = {}
+        self._kp_denoms_cached = False
 
     @property
     def keypairs_state(self):
@@ -273,20 +295,32 @@ class KeyPairsMixin:
             self.keypairs_state = KPStates.Ready
         return False, None
 
+    @property
+    def keypairs_ready_to_denominate(self):
+        '''Keypairs for denoms are cached, denominate workflow can be
+        started before caching of other keypairs is finished'''
+        kp_state = self.keypairs_state
+        if kp_state == KPStates.Ready:
+            return True
+        return kp_state == KPStates.Caching and self._kp_denoms_cached
+
     def _cache_keypairs(self, password):
         '''Cache keypairs on mixing start'''
         self.logger.info('Making Keypairs Cache')
         with self.keypairs_state_lock:
             self.keypairs_state = KPStates.Caching
+            self._kp_denoms_cached = False
 
         for cache_type in KP_ALL_TYPES:
             if cache_type not in self._keypairs_cache:
                 self._keypairs_cache[cache_type] = {}
 
-        if not self._cache_kp_spendable(password):
+        # denoms keys first, to start denominate workflows early
+        if not self._cache_kp_ps_spendable(password):
             return
+        self._kp_denoms_cached = True
 
-        if not self._cache_kp_ps_spendable(password):
+        if not self._cache_kp_spendable(password):
             return
 
         kp_left, kp_chg_left, small_mix_funds = \
@@ -321,15 +355,69 @@ class KeyPairsMixin:
             self.keypairs_state = KPStates.Ready
         self.logger.info('Keypairs Cache Done')
 
+    def _kp_derivation(self, addr):
+        '''Get (keystore, sequence) to derive keypair for address'''
+        w = self.wallet
+        sequence = None
+        if self.ps_keystore:
+            sequence = self.get_address_index(addr)
+        if sequence:
+            return self.ps_keystore, sequence
+        return w.keystore, w.get_address_index(addr)
+
+    def _derive_keypairs(self, password, derivations, cache,
+                         on_cached=None):
+        '''Derive keypairs for derivations dict addr => (keystore, sequence)
+        and fill cache by batches of KP_DERIVE_BATCH_SIZE. For BIP32 keystores
+        master xprv is decrypted once per call and branch nodes are reused.
+        on_cached(cached_cnt) is called after each batch.
+        Return count of cached keypairs or None if mixing is stopped'''
+        batches = []
+        xprvs = {}
+        for addr, (ks, sequence) in derivations.items():
+            if not isinstance(ks, BIP32_KeyStore):
+                batches.append((ks, [addr], [sequence]))
+                continue
+            ks_id = id(ks)
+            if ks_id not in xprvs:
+                xprvs[ks_id] = ks.get_master_private_key(password)
+            sequence = ks.get_private_key_derivation(sequence)
+            batch = batches[-1] if batches else None
+            if (not batch or batch[0] is not ks
+                    or len(batch[1]) >= KP_DERIVE_BATCH_SIZE):
+                batch = (ks, [], [])
+                batches.append(batch)
+            batch[1].append(addr)
+            batch[2].append(sequence)
+
+        cached = 0
+        for ks, addrs, sequences in batches:
+            if self.state != PSStates.Mixing:
+                self._cleanup_unfinished_keypairs_cache()
+                return None
+            if isinstance(ks, BIP32_KeyStore):
+                keypairs = derive_keypairs(xprvs[id(ks)], sequences)
+            else:
+                keypairs = [(ks.derive_pubkey(*sequence).hex(),
+                             ks.get_private_key(sequence, password))
+                            for sequence in sequences]
+            for addr, keypair in zip(addrs, keypairs):
+                cache[addr] = keypair
+            cached += len(addrs)
+            self.postpone_notification('ps-keypairs-changes', self.wallet)
+            if on_cached:
+                on_cached(cached)
+        return cached
+
     def _cache_kp_incoming(self, password):
         '''Cache keypairs for future incoming funds on main keystore'''
         w = self.wallet
         first_recv_index = self.first_unused_index(for_change=False,
                                                    force_main_ks=True)
         ps_incoming_cache = self._keypairs_cache[KP_INCOMING]
-        cached = 0
+        derivations = {}
         ri = first_recv_index
-        while cached < KP_MAX_INCOMING_TXS:
+        while len(derivations) < KP_MAX_INCOMING_TXS:
             if self.state != PSStates.Mixing:
                 self._cleanup_unfinished_keypairs_cache()
                 return
@@ -341,17 +429,18 @@ class KeyPairsMixin:
                 continue
             if addr in ps_incoming_cache:
                 continue
-            sec = w.keystore.get_private_key(sequence, password)
-            ps_incoming_cache[addr] = (pubkey, sec)
-            cached += 1
+            derivations[addr] = (w.keystore, sequence)
+        cached = self._derive_keypairs(password, derivations,
+                                       ps_incoming_cache)
+        if cached is None:
+            return
         self.logger.info(f'Cached {cached} keys'
                          f' of {KP_INCOMING} type')
-        self.postpone_notification('ps-keypairs-changes', self.wallet)
 
     def _cache_kp_spendable(self, password):
         '''Cache spendable regular coins keys'''
         w = self.wallet
-        cached = 0
+        spendable_cache = self._keypairs_cache[KP_SPENDABLE]
         with w._freeze_lock:
             frozen_addresses = w._frozen_addresses.copy()
         utxos = w.get_utxos(None,
@@ -359,34 +448,25 @@ class KeyPairsMixin:
                             mature_only=True)
         utxos = [utxo for utxo in utxos if not w.is_frozen_coin(utxo)]
         utxos = self.filter_out_hw_ks_coins(utxos)
+        derivations = {}
         for c in utxos:
             if self.state != PSStates.Mixing:
                 self._cleanup_unfinished_keypairs_cache()
                 return
             addr = c.address
-            if addr in self._keypairs_cache[KP_SPENDABLE]:
+            if addr in spendable_cache or addr in derivations:
                 continue
-            sequence = None
-            if self.ps_keystore:
-                sequence = self.get_address_index(addr)
-            if sequence:
-                pubkey = self.ps_keystore.derive_pubkey(*sequence).hex()
-                sec = self.ps_keystore.get_private_key(sequence, password)
-            else:
-                sequence = w.get_address_index(addr)
-                pubkey = w.keystore.derive_pubkey(*sequence).hex()
-                sec = w.keystore.get_private_key(sequence, password)
-            self._keypairs_cache[KP_SPENDABLE][addr] = (pubkey, sec)
-            cached += 1
+            derivations[addr] = self._kp_derivation(addr)
+        cached = self._derive_keypairs(password, derivations, spendable_cache)
+        if cached is None:
+            return
         if cached:
             self.logger.info(f'Cached {cached} keys of {KP_SPENDABLE} type')
-            self.postpone_notification('ps-keypairs-changes', self.wallet)
         return True
 
     def _cache_kp_ps_spendable(self, password):
         '''Cache spendable ps coins keys (existing denoms/collaterals)'''
         w = self.wallet
-        cached = 0
         ps_spendable_cache = self._keypairs_cache[KP_PS_SPENDABLE]
         with w._freeze_lock:
             frozen_addresses = w._frozen_addresses.copy()
@@ -394,6 +474,11 @@ class KeyPairsMixin:
                             excluded_addresses=frozen_addresses,
                             min_rounds=PSCoinRounds.COLLATERAL)
         utxos = [u for u in utxos if not w.is_frozen_coin(u)]
+        # collaterals first, denominate workflows need them with denoms
+        utxos.sort(key=lambda c: w.db.get_ps_denom(c.prevout.to_str())
+                   is not None)
+        collateral_cnt = 0
+        derivations = {}
         for c in self.filter_out_hw_ks_coins(utxos):
             if self.state != PSStates.Mixing:
                 self._cleanup_unfinished_keypairs_cache()
@@ -405,23 +490,23 @@ class KeyPairsMixin:
             addr = c.address
             if self.is_hw_ks and not self.is_ps_ks(addr):
                 continue  # skip denoms on hw keystore
-            if addr in ps_spendable_cache:
+            if addr in ps_spendable_cache or addr in derivations:
                 continue
-            sequence = None
-            if self.ps_keystore:
-                sequence = self.get_address_index(addr)
-            if sequence:
-                pubkey = self.ps_keystore.derive_pubkey(*sequence).hex()
-                sec = self.ps_keystore.get_private_key(sequence, password)
-            else:
-                sequence = w.get_address_index(addr)
-                pubkey = w.keystore.derive_pubkey(*sequence).hex()
-                sec = w.keystore.get_private_key(sequence, password)
-            ps_spendable_cache[addr] = (pubkey, sec)
-            cached += 1
+            derivations[addr] = self._kp_derivation(addr)
+            if not ps_denom:
+                collateral_cnt += 1
+
+        def on_cached(cached):
+            # start denominate workflows after collaterals and first denoms
+            if cached > collateral_cnt or cached == len(derivations):
+                self._kp_denoms_cached = True
+
+        cached = self._derive_keypairs(password, derivations,
+                                       ps_spendable_cache, on_cached)
+        if cached is None:
+            return
         if cached:
             self.logger.info(f'Cached {cached} keys of {KP_PS_SPENDABLE} type')
-            self.postpone_notification('ps-keypairs-changes', self.wallet)
         return True
 
     def _cache_kp_ps_reserved(self, password, sign_cnt, sign_change_cnt):
@@ -429,7 +514,8 @@ class KeyPairsMixin:
         w = self.wallet
         ps_change_cache = self._keypairs_cache[KP_PS_CHANGE]
         ps_coins_cache = self._keypairs_cache[KP_PS_COINS]
-        cached = 0
+        change_derivations = {}
+        coins_derivations = {}
         for addr, data in self.wallet.db.get_ps_reserved().items():
             if self.state != PSStates.Mixing:
                 self._cleanup_unfinished_keypairs_cache()
@@ -442,37 +528,23 @@ class KeyPairsMixin:
                 sign_change_cnt -= 1
                 if addr in ps_change_cache:
                     continue
-                sequence = None
-                if self.ps_keystore:
-                    sequence = self.get_address_index(addr)
-                if sequence:
-                    pubkey = self.ps_keystore.derive_pubkey(*sequence).hex()
-                    sec = self.ps_keystore.get_private_key(sequence, password)
-                else:
-                    sequence = w.get_address_index(addr)
-                    pubkey = w.keystore.derive_pubkey(*sequence).hex()
-                    sec = w.keystore.get_private_key(sequence, password)
-                ps_change_cache[addr] = (pubkey, sec)
-                cached += 1
+                change_derivations[addr] = self._kp_derivation(addr)
             else:
                 sign_cnt -= 1
                 if addr in ps_coins_cache:
                     continue
-                sequence = None
-                if self.ps_keystore:
-                    sequence = self.get_address_index(addr)
-                if sequence:
-                    pubkey = self.ps_keystore.derive_pubkey(*sequence).hex()
-                    sec = self.ps_keystore.get_private_key(sequence, password)
-                else:
-                    sequence = w.get_address_index(addr)
-                    pubkey = w.keystore.derive_pubkey(*sequence).hex()
-                    sec = w.keystore.get_private_key(sequence, password)
-                ps_coins_cache[addr] = (pubkey, sec)
-                cached += 1
+                coins_derivations[addr] = self._kp_derivation(addr)
+        cached = self._derive_keypairs(password, change_derivations,
+                                       ps_change_cache)
+        if cached is None:
+            return None, None
+        coins_cached = self._derive_keypairs(password, coins_derivations,
+                                             ps_coins_cache)
+        if coins_cached is None:
+            return None, None
+        cached += coins_cached
         if cached:
             self.logger.info(f'Cached {cached} keys for ps_reserved addresses')
-            self.postpone_notification('ps-keypairs-changes', self.wallet)
         return sign_cnt, sign_change_cnt
 
     def _cache_kp_ps_change(self, password, sign_cnt, sign_change_cnt):
@@ -481,7 +553,8 @@ class KeyPairsMixin:
             w = self.wallet
             first_change_index = self.first_unused_index(for_change=True)
             ps_change_cache = self._keypairs_cache[KP_PS_CHANGE]
-            cached = 0
+            ks = self.ps_keystore if self.ps_keystore else w.keystore
+            derivations = {}
             ci = first_change_index
             while sign_change_cnt > 0:
                 if self.state != PSStates.Mixing:
@@ -500,19 +573,14 @@ class KeyPairsMixin:
                 sign_change_cnt -= 1
                 if addr in ps_change_cache:
                     continue
-                if self.ps_keystore:
-                    sec = self.ps_keystore.get_private_key(sequence, password)
-                else:
-                    sec = w.keystore.get_private_key(sequence, password)
-                ps_change_cache[addr] = (pubkey, sec)
-                cached += 1
-                if not cached % 100:
-                    self.logger.info(f'Cached {cached} keys'
-                                     f' of {KP_PS_CHANGE} type')
+                derivations[addr] = (ks, sequence)
+            cached = self._derive_keypairs(password, derivations,
+                                           ps_change_cache)
+            if cached is None:
+                return None, None
             if cached:
                 self.logger.info(f'Cached {cached} keys'
                                  f' of {KP_PS_CHANGE} type')
-                self.postpone_notification('ps-keypairs-changes', self.wallet)
         return sign_cnt, sign_change_cnt
 
     def _cache_kp_ps_coins(self, password, sign_cnt, sign_change_cnt):
@@ -521,7 +589,8 @@ class KeyPairsMixin:
             w = self.wallet
             first_recv_index = self.first_unused_index(for_change=False)
             ps_coins_cache = self._keypairs_cache[KP_PS_COINS]
-            cached = 0
+            ks = self.ps_keystore if self.ps_keystore else w.keystore
+            derivations = {}
             ri = first_recv_index
             while sign_cnt > 0:
                 if self.state != PSStates.Mixing:
@@ -540,19 +609,14 @@ class KeyPairsMixin:
                 sign_cnt -= 1
                 if addr in ps_coins_cache:
                     continue
-                if self.ps_keystore:
-                    sec = self.ps_keystore.get_private_key(sequence, password)
-                else:
-                    sec = w.keystore.get_private_key(sequence, password)
-                ps_coins_cache[addr] = (pubkey, sec)
-                cached += 1
-                if not cached % 100:
-                    self.logger.info(f'Cached {cached} keys'
-                                     f' of {KP_PS_COINS} type')
+                derivations[addr] = (ks, sequence)
+            cached = self._derive_keypairs(password, derivations,
+                                           ps_coins_cache)
+            if cached is None:
+                return None, None
             if cached:
                 self.logger.info(f'Cached {cached} keys'
                                  f' of {KP_PS_COINS} type')
-                self.postpone_notification('ps-keypairs-changes', self.wallet)
         return sign_cnt, sign_change_cnt
 
     def _cache_kp_tmp_reserved(self, password):
@@ -726,7 +790,7 @@ class KeyPairsMixin:
                 keypairs = self.get_keypairs()
             else:
                 keypairs = self.get_keypairs_for_denominate_tx(tx, password)
-            signed_txins_cnt = tx.sign(keypairs)
+            signed_txins_cnt = tx.sign(keypairs, parallel=True)
             tx.finalize_psbt()
             keypairs.clear()
             if mine_txins_cnt is None:
@@ -752,8 +816,9 @@ class PSDataMixin:
             self._ps_denoms_amount_cache += value
 
         # _denoms_to_mix_cache recalculated on mix_rounds change and
-        # in add[_mixing]_denom/pop[_mixing]_denom methods
-        self._denoms_to_mix_cache = self.denoms_to_mix()
+        # in add[_mixing]_denom/pop[_mixing]_denom methods, indexed by
+        # denom value, rounds and txid to select denoms for mixing
+        self._denoms_to_mix_cache = PSDenomsToMix(self.denoms_to_mix())
 
         # sycnhronizer unsubsribed addresses
         self.spent_addrs = set()
@@ -1017,6 +1082,7 @@ class PSDataMixin:
                                f' cached keys: {cnt}')
         if self.gather_mix_stat:
             res.append(str(self.mix_stat))
+        res.append(str(self.mix_rates))
         return res
 
     def first_unused_index(self, for_change=False, force_main_ks=False):
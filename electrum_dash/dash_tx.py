@@ -94,9 +94,12 @@ def read_outpoint(vds):
     return TxOutPoint.read_vds(vds)
 
 
+struct_be_H = struct.Struct('>H')
+
+
 def read_uint16_nbo(vds):
-    (i,) = struct.unpack_from('>H', vds.input, vds.read_cursor)
-    vds.read_cursor += struct.calcsize('>H')
+    (i,) = struct_be_H.unpack_from(vds.input, vds.read_cursor)
+    vds.read_cursor += struct_be_H.size
     return i
 
 
@@ -26,9 +26,12 @@
 import base64
 import hashlib
 import functools
-from typing import Union, Tuple, Optional
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, Tuple, Optional, Sequence, List
 from ctypes import (
-    byref, c_byte, c_int, c_uint, c_char_p, c_size_t, c_void_p, create_string_buffer,
+    byref, c_byte, c_char, c_int, c_uint, c_char_p, c_size_t, c_void_p, create_string_buffer,
     CFUNCTYPE, POINTER, cast
 )
 
@@ -40,6 +43,21 @@ from .ecc_fast import _libsecp256k1, SECP256K1_EC_UNCOMPRESSED
 
 _logger = get_logger(__name__)
 
+ECC_MAX_WORKERS = os.cpu_count() or 1
+VERIFY_PARALLEL_MIN_ITEMS = 64  # lesser count of items is verified serially
+_ecc_executor = None
+_ecc_executor_lock = threading.Lock()
+
+
+def get_ecc_executor() -> ThreadPoolExecutor:
+    '''Shared thread pool for libsecp256k1 calls (ctypes releases GIL)'''
+    global _ecc_executor
+    with _ecc_executor_lock:
+        if _ecc_executor is None:
+            _ecc_executor = ThreadPoolExecutor(max_workers=ECC_MAX_WORKERS,
+                                               thread_name_prefix='ECC')
+        return _ecc_executor
+
 
 def string_to_number(b: bytes) -> int:
     return int.from_bytes(b, byteorder='big', signed=False)
@@ -374,6 +392,58 @@ def verify_signature(pubkey: bytes, sig: bytes, h: bytes) -> bool:
         return False
     return True
 
+def verify_many(items: Sequence[Tuple[bytes, bytes, bytes]]) -> List[bool]:
+    '''Verify (pubkey, sig_string, msg_hash) items, return list of results
+    in the same order, as verify_signature would for each item'''
+    items_cnt = len(items)
+    res = [False] * items_cnt
+    if not items_cnt:
+        return res
+    pubkeys_buf = create_string_buffer(64 * items_cnt)
+    sigs_buf = create_string_buffer(64 * items_cnt)
+    parsed_pubkeys = {}  # pubkey bytes -> pubkey struct or None if invalid
+    ctx = _libsecp256k1.ctx
+    jobs = []
+    for i, (pubkey, sig_string, msg_hash) in enumerate(items):
+        if not (isinstance(pubkey, bytes)
+                and isinstance(sig_string, bytes) and len(sig_string) == 64
+                and isinstance(msg_hash, bytes) and len(msg_hash) == 32):
+            continue
+        if pubkey in parsed_pubkeys:
+            pubkey_ptr = parsed_pubkeys[pubkey]
+        else:
+            pubkey_ptr = (c_char * 64).from_buffer(pubkeys_buf, 64 * i)
+            if not _libsecp256k1.secp256k1_ec_pubkey_parse(
+                    ctx, pubkey_ptr, pubkey, len(pubkey)):
+                pubkey_ptr = None
+            parsed_pubkeys[pubkey] = pubkey_ptr
+        if pubkey_ptr is None:
+            continue
+        sig = (c_char * 64).from_buffer(sigs_buf, 64 * i)
+        if not _libsecp256k1.secp256k1_ecdsa_signature_parse_compact(
+                ctx, sig, sig_string):
+            continue
+        _libsecp256k1.secp256k1_ecdsa_signature_normalize(ctx, sig, sig)
+        jobs.append((i, sig, msg_hash, pubkey_ptr))
+
+    def verify_jobs(jobs_chunk):
+        verify = _libsecp256k1.secp256k1_ecdsa_verify
+        return [(i, verify(ctx, sig, msg_hash, pubkey_ptr) == 1)
+                for i, sig, msg_hash, pubkey_ptr in jobs_chunk]
+
+    if ECC_MAX_WORKERS > 1 and len(jobs) >= VERIFY_PARALLEL_MIN_ITEMS:
+        chunk_size = -(-len(jobs) // ECC_MAX_WORKERS)
+        jobs_chunks = [jobs[i:i+chunk_size]
+                       for i in range(0, len(jobs), chunk_size)]
+        verified = get_ecc_executor().map(verify_jobs, jobs_chunks)
+    else:
+        verified = [verify_jobs(jobs)]
+    for chunk_res in verified:
+        for i, ok in chunk_res:
+            res[i] = ok
+    return res
+
+
 def verify_message_with_address(address: str, sig65: bytes, message: bytes, *, net=None):
     from .bitcoin import pubkey_to_address
     assert_bytes(sig65, message)
@@ -1,14 +1,17 @@
 import asyncio
+from array import array
 from datetime import datetime
 import inspect
 import sys
 import os
 import json
+import mmap
+import struct
 import time
 import csv
 import decimal
 from decimal import Decimal
-from typing import Sequence, Optional
+from typing import Sequence, Optional, Dict
 
 from aiorpcx.curio import timeout_after, TaskTimeout, TaskGroup
 import aiohttp
@@ -39,11 +42,108 @@ CCY_PRECISIONS = {'BHD': 3, 'BIF': 0, 'BYR': 0, 'CLF': 4, 'CLP': 0,
                   'BTC': 8, 'ETH': 8}
 
 
+EPOCH_ORDINAL = datetime(1970, 1, 1).toordinal()
+
+
+class HistoricalRates:
+    '''Daily rates as fixed-point integers in array indexed by days since
+    epoch, memory-mapped from cache file when loaded from disk'''
+
+    MAGIC = b'DFXR'
+    HEADER = struct.Struct('<4sii')  # magic, first day, days count
+    DECIMALS = 8
+    SCALE = 10 ** DECIMALS
+    MISSING = -2 ** 63
+
+    def __init__(self, first_day: int, values: Sequence[int],
+                 timestamp: float, mm: Optional[mmap.mmap] = None):
+        self.first_day = first_day
+        self.values = values
+        self.timestamp = timestamp
+        self._mm = mm
+
+    def __len__(self):
+        return len(self.values)
+
+    @classmethod
+    def from_dict(cls, h: Dict[str, str], timestamp: float = None):
+        '''Create from dict of 'YYYY-mm-dd' => rate'''
+        rates = {}
+        for date_str, rate in h.items():
+            try:
+                day = (datetime.strptime(date_str, '%Y-%m-%d').toordinal()
+                       - EPOCH_ORDINAL)
+                rate = Decimal(str(rate)).scaleb(cls.DECIMALS)
+                rates[day] = int(rate.to_integral_value())
+            except (ValueError, decimal.InvalidOperation, OverflowError):
+                continue
+        if not rates:
+            return None
+        first_day = min(rates)
+        values = array('q', [cls.MISSING]) * (max(rates) - first_day + 1)
+        for day, rate in rates.items():
+            values[day - first_day] = rate
+        if timestamp is None:
+            timestamp = time.time()
+        return cls(first_day, values, timestamp)
+
+    @classmethod
+    def read(cls, filename: str):
+        with open(filename, 'rb') as f:
+            header = f.read(cls.HEADER.size)
+            if len(header) != cls.HEADER.size:
+                return None
+            magic, first_day, count = cls.HEADER.unpack(header)
+            if magic != cls.MAGIC or count <= 0:
+                return None
+            if os.fstat(f.fileno()).st_size != cls.HEADER.size + 8 * count:
+                return None
+            timestamp = os.fstat(f.fileno()).st_mtime
+            if sys.byteorder != 'little':
+                values = array('q', f.read())
+                values.byteswap()
+                return cls(first_day, values, timestamp)
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        values = memoryview(mm)[cls.HEADER.size:].cast('q')
+        return cls(first_day, values, timestamp, mm)
+
+    def write(self, filename: str):
+        values = array('q', self.values)
+        if sys.byteorder != 'little':
+            values.byteswap()
+        tmp = f'{filename}.tmp.{os.getpid()}'
+        with open(tmp, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.first_day, len(values)))
+            f.write(values.tobytes())
+        os.replace(tmp, filename)
+
+    def close(self):
+        if self._mm is not None:
+            self.values.release()
+            self._mm.close()
+            self._mm = None
+
+    def rate(self, d_t: datetime) -> Optional[Decimal]:
+        return self.rate_by_day(d_t.toordinal() - EPOCH_ORDINAL)
+
+    def rate_by_day(self, day: int) -> Optional[Decimal]:
+        i = day - self.first_day
+        if i < 0:
+            return None
+        try:
+            v = self.values[i]
+        except (IndexError, ValueError):  # ValueError if already closed
+            return None
+        if v == self.MISSING:
+            return None
+        return Decimal(v).scaleb(-self.DECIMALS)
+
+
 class ExchangeBase(Logger):
 
     def __init__(self, on_quotes, on_history):
         Logger.__init__(self)
-        self.history = {}
+        self.history = {}  # type: Dict[str, HistoricalRates]
         self.quotes = {}
         self.on_quotes = on_quotes
         self.on_history = on_history
@@ -101,21 +201,37 @@ class ExchangeBase(Logger):
             self.quotes = {}
         self.on_quotes()
 
-    def read_historical_rates(self, ccy, cache_dir) -> Optional[dict]:
-        filename = os.path.join(cache_dir, self.name() + '_'+ ccy)
-        if not os.path.exists(filename):
-            return None
-        timestamp = os.stat(filename).st_mtime
-        try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                h = json.loads(f.read())
-        except:
-            return None
-        if not h:  # e.g. empty dict
-            return None
-        h['timestamp'] = timestamp
+    def _set_historical_rates(self, ccy, h: HistoricalRates):
+        old_h = self.history.get(ccy)
         self.history[ccy] = h
+        if old_h is not None:
+            old_h.close()  # release mmap to allow cache file replace
         self.on_history()
+
+    def read_historical_rates(self, ccy, cache_dir) -> Optional[HistoricalRates]:
+        filename = os.path.join(cache_dir, self.name() + '_'+ ccy)
+        rates_filename = filename + '.rates'
+        h = None
+        if os.path.exists(rates_filename):
+            try:
+                h = HistoricalRates.read(rates_filename)
+            except Exception as e:
+                self.logger.info(f'failed to read fx history: {repr(e)}')
+        elif os.path.exists(filename):  # convert legacy json cache
+            timestamp = os.stat(filename).st_mtime
+            try:
+                with open(filename, 'r', encoding='utf-8') as f:
+                    h = HistoricalRates.from_dict(json.loads(f.read()),
+                                                  timestamp)
+                if h is not None:
+                    h.write(rates_filename)
+                    os.utime(rates_filename, (timestamp, timestamp))
+                    os.unlink(filename)
+            except Exception as e:
+                self.logger.info(f'failed to convert fx history: {repr(e)}')
+        if h is None:
+            return None
+        self._set_historical_rates(ccy, h)
         return h
 
     @log_exceptions
@@ -130,12 +246,12 @@ class ExchangeBase(Logger):
         except Exception as e:
             self.logger.exception(f"failed fx history: {repr(e)}")
             return
+        h = HistoricalRates.from_dict(h)
+        if h is None:
+            return
+        self._set_historical_rates(ccy, h)
         filename = os.path.join(cache_dir, self.name() + '_' + ccy)
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(json.dumps(h))
-        h['timestamp'] = time.time()
-        self.history[ccy] = h
-        self.on_history()
+        h.write(filename + '.rates')
 
     def get_historical_rates(self, ccy, cache_dir):
         if ccy not in self.history_ccys():
@@ -143,14 +259,16 @@ class ExchangeBase(Logger):
         h = self.history.get(ccy)
         if h is None:
             h = self.read_historical_rates(ccy, cache_dir)
-        if h is None or h['timestamp'] < time.time() - 24*3600:
+        if h is None or h.timestamp < time.time() - 24*3600:
             asyncio.get_event_loop().create_task(self.get_historical_rates_safe(ccy, cache_dir))
 
     def history_ccys(self):
         return []
 
     def historical_rate(self, ccy, d_t):
-        return self.history.get(ccy, {}).get(d_t.strftime('%Y-%m-%d'), 'NaN')
+        h = self.history.get(ccy)
+        rate = h.rate(d_t) if h is not None else None
+        return 'NaN' if rate is None else rate
 
     async def request_history(self, ccy):
         raise NotImplementedError()  # implemented by subclasses
@@ -1105,19 +1105,7 @@ class HistoryList(MyTreeView, AcceptFileDragDrop):
         self.parent.show_message(_("Your wallet history has been successfully exported."))
 
     def do_export_history(self, file_name, is_csv):
-        hist = self.wallet.get_detailed_history(fx=self.parent.fx)
-        txns = hist['transactions']
-        lines = []
-        if is_csv:
-            for item in txns:
-                lines.append([item['txid'],
-                              item.get('label', ''),
-                              item['confirmations'],
-                              item['bc_value'],
-                              item.get('fiat_value', ''),
-                              item.get('fee', ''),
-                              item.get('fiat_fee', ''),
-                              item['date']])
+        txns = self.wallet.iter_detailed_history(fx=self.parent.fx)
         with open(file_name, "w+", encoding='utf-8') as f:
             if is_csv:
                 import csv
@@ -1130,11 +1118,18 @@ class HistoryList(MyTreeView, AcceptFileDragDrop):
                                       "fee",
                                       "fiat_fee",
                                       "timestamp"])
-                for line in lines:
-                    transaction.writerow(line)
+                for item in txns:
+                    transaction.writerow([item['txid'],
+                                          item.get('label', ''),
+                                          item['confirmations'],
+                                          item['bc_value'],
+                                          item.get('fiat_value', ''),
+                                          item.get('fee', ''),
+                                          item.get('fiat_fee', ''),
+                                          item['date']])
             else:
-                from electrum_dash.util import json_encode
-                f.write(json_encode(txns))
+                from electrum_dash.util import json_encode_iter
+                json_encode_iter(txns, f)
         os.chmod(file_name, FILE_OWNER_MODE)
 
     def hide_rows(self):
@@ -524,6 +524,23 @@ class PSDialog(QDialog, MessageBoxMixin):
         grid.addWidget(max_sessions_label, i, 0)
         grid.addWidget(self.max_sessions_sb, i, 2)
 
+        # max_sessions_per_denom
+        per_denom_text = psman.max_sessions_per_denom_data()
+        per_denom_help = psman.max_sessions_per_denom_data(full_txt=True)
+        per_denom_label = HelpLabel(per_denom_text + ':', per_denom_help)
+        self.per_denom_sb = QSpinBox()
+        self.per_denom_sb.setMinimum(psman.min_max_sessions)
+        self.per_denom_sb.setMaximum(psman.max_max_sessions)
+        self.per_denom_sb.setValue(psman.max_sessions_per_denom)
+
+        def on_per_denom_change():
+            psman.max_sessions_per_denom = self.per_denom_sb.value()
+        self.per_denom_sb.valueChanged.connect(on_per_denom_change)
+
+        i = grid.rowCount()
+        grid.addWidget(per_denom_label, i, 0)
+        grid.addWidget(self.per_denom_sb, i, 2)
+
         # kp_timeout
         kp_timeout_text = psman.kp_timeout_data()
         kp_timeout_help = psman.kp_timeout_data(full_txt=True)
@@ -417,9 +417,14 @@ class Dip3TabBar(VTabBar):
         gl.addWidget(llmq_ready_l, 7, 0)
         gl.addWidget(self.llmq_ready, 7, 2)
 
+        diffs_rate_l = QLabel('Diffs/s:')
+        self.diffs_rate = QLabel('0')
+        gl.addWidget(diffs_rate_l, 8, 0)
+        gl.addWidget(self.diffs_rate, 8, 2)
+
         self.protx_llmq_reset_btn = QPushButton(_('ProTx/LLMQ Reset'))
         self.protx_llmq_reset_btn.clicked.connect(self.on_protx_llmq_reset)
-        gl.addWidget(self.protx_llmq_reset_btn, 8, 0, 1, -1)
+        gl.addWidget(self.protx_llmq_reset_btn, 9, 0, 1, -1)
 
         gl2 = QGridLayout()
         gl2.setColumnStretch(0, 1)
@@ -440,13 +445,15 @@ class Dip3TabBar(VTabBar):
 
     def update_stats(self, stats):
         (local_h, mns_h, llmq_h,
-         protx_ready, llmq_ready, protx_info_completeness) = stats
+         protx_ready, llmq_ready, protx_info_completeness,
+         diffs_rate) = stats
         self.local_h.setText(str(local_h))
         self.mns_h.setText(str(mns_h))
         self.llmq_h.setText(str(llmq_h))
         self.protx_ready.setText(protx_ready)
         self.llmq_ready.setText(llmq_ready)
         self.protx_info_completeness.setText(protx_info_completeness)
+        self.diffs_rate.setText(diffs_rate)
 
     @pyqtSlot()
     def on_protx_llmq_reset(self):
@@ -536,8 +543,10 @@ class Dip3TabWidget(QTabWidget):
         llmq_ready = 'Yes' if mn_list.llmq_ready else 'No'
         completeness = mn_list.protx_info_completeness
         protx_info_completeness = '%s%%' % round(completeness*100)
+        diffs_rate = '%.2f' % mn_list.mnlistdiff_rate
         return (local_height, protx_height, llmq_height,
-                protx_ready, llmq_ready, protx_info_completeness)
+                protx_ready, llmq_ready, protx_info_completeness,
+                diffs_rate)
 
     @pyqtSlot()
     def on_tabs_current_changed(self):
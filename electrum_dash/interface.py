@@ -182,6 +182,26 @@ class NotificationSession(RPCSession):
             self.maybe_log(f"--> {response} (id: {msg_id})")
             return response
 
+    async def send_batch_request(self, requests: Sequence[Tuple[str, List]],
+                                 *, timeout=None) -> list:
+        '''Send requests as one JSON-RPC batch. Results are ordered as
+        requests, failed requests results are exception instances'''
+        msg_id = next(self._msg_counter)
+        self.maybe_log(f"<-- batch of {len(requests)} (id: {msg_id})")
+
+        async def send():
+            async with self.send_batch() as batch:
+                for method, params in requests:
+                    batch.add_request(method, params)
+            return batch.results
+        try:
+            results = await asyncio.wait_for(send(), timeout)
+        except (TaskTimeout, asyncio.TimeoutError) as e:
+            raise RequestTimedOut(f'batch request timed out'
+                                  f' (id: {msg_id})') from e
+        self.maybe_log(f"--> batch results (id: {msg_id})")
+        return list(results)
+
     def set_default_timeout(self, timeout):
         self.sent_request_timeout = timeout
         self.max_send_delay = timeout
@@ -1021,6 +1041,26 @@ class Interface(Logger):
         assert_non_negative_integer(res['unconfirmed'])
         return res
 
+    async def get_balances_for_scripthashes(
+            self, shs: Sequence[str]) -> List[Union[dict, Exception]]:
+        '''Balances of scripthashes requested in one batch, per item
+        server errors are returned as exception instances'''
+        for sh in shs:
+            if not is_hash256_str(sh):
+                raise Exception(f"{repr(sh)} is not a scripthash")
+        requests = [('blockchain.scripthash.get_balance', [sh]) for sh in shs]
+        results = await self.session.send_batch_request(requests)
+        if len(results) != len(shs):
+            raise RequestCorrupted(f'unexpected batch results count')
+        for res in results:
+            if isinstance(res, Exception):
+                continue
+            assert_dict_contains_field(res, field_name='confirmed')
+            assert_dict_contains_field(res, field_name='unconfirmed')
+            assert_non_negative_integer(res['confirmed'])
+            assert_non_negative_integer(res['unconfirmed'])
+        return results
+
     async def get_txid_from_txpos(self, tx_height: int, tx_pos: int, merkle: bool):
         if not is_non_negative_integer(tx_height):
             raise Exception(f"{repr(tx_height)} is not a block height")
@@ -612,8 +612,13 @@ class BIP32_KeyStore(Xpub, Deterministic_KeyStore):
         self.add_xprv(node.to_xprv())
         self.add_key_origin_from_root_node(derivation_prefix=derivation, root_node=rootnode)
 
+    def get_private_key_derivation(self, sequence: Sequence[int]) -> Sequence[int]:
+        """Returns derivation from master xprv for address sequence"""
+        return sequence
+
     def get_private_key(self, sequence: Sequence[int], password):
         xprv = self.get_master_private_key(password)
+        sequence = self.get_private_key_derivation(sequence)
         node = BIP32Node.from_xkey(xprv).subkey_at_private_derivation(sequence)
         pk = node.eckey.get_secret_bytes()
         return pk, True
@@ -646,10 +651,9 @@ class PS_BIP32_KeyStore(BIP32_KeyStore):
         derivation = self.addr_deriv_offset*2 + int(for_change)
         return super().derive_pubkey(derivation, n)
 
-    def get_private_key(self, sequence, password):
+    def get_private_key_derivation(self, sequence):
         derivation = self.addr_deriv_offset*2 + int(sequence[0] % 2)
-        _sequence = [derivation, *sequence[1:]]
-        return super().get_private_key(_sequence, password)
+        return [derivation, *sequence[1:]]
 
 
 class Old_KeyStore(MasterPublicKeyMixin, Deterministic_KeyStore):
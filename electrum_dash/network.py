@@ -57,6 +57,7 @@ from .transaction import Transaction
 from .constants import CHUNK_SIZE
 from .blockchain import Blockchain, HEADER_SIZE
 from .dash_net import DashNet
+from .shared_cache import SharedCache
 from .interface import (Interface, PREFERRED_NETWORK_PROTOCOL,
                         RequestTimedOut, NetworkTimeout, BUCKET_NAME_OF_ONION_SERVERS,
                         NetworkException, RequestCorrupted, ServerAddr)
@@ -335,6 +336,8 @@ class Network(Logger, NetworkRetryManager[ServerAddr]):
         self.server_peers = {}  # returned by interface (servers that the main interface knows about)
         self._recent_servers = self._read_recent_servers()  # note: needs self.recent_servers_lock
         self._limits_info = {}  # save information on encountered server limits
+        # raw txs, SPV proofs and histories shared by all loaded wallets
+        self.shared_cache = SharedCache(config)
 
         self.banner = ''
         self.donation_address = ''
@@ -1213,7 +1216,12 @@ class Network(Logger, NetworkRetryManager[ServerAddr]):
     @best_effort_reliable
     @catch_server_exceptions
     async def get_transaction(self, tx_hash: str, *, timeout=None) -> str:
-        return await self.interface.get_transaction(tx_hash=tx_hash, timeout=timeout)
+        async def fetch():
+            raw_tx = await self.interface.get_transaction(tx_hash=tx_hash,
+                                                          timeout=timeout)
+            self.shared_cache.put(SharedCache.TXS, tx_hash, raw_tx)
+            return raw_tx
+        return await self.shared_cache.get_transaction(tx_hash, fetch)
 
     @best_effort_reliable
     @catch_server_exceptions
@@ -1230,6 +1238,11 @@ class Network(Logger, NetworkRetryManager[ServerAddr]):
     async def get_balance_for_scripthash(self, sh: str) -> dict:
         return await self.interface.get_balance_for_scripthash(sh)
 
+    @best_effort_reliable
+    @catch_server_exceptions
+    async def get_balances_for_scripthashes(self, shs: Sequence[str]) -> list:
+        return await self.interface.get_balances_for_scripthashes(shs)
+
     @best_effort_reliable
     @catch_server_exceptions
     async def get_txid_from_txpos(self, tx_height, tx_pos, merkle):
@@ -46,7 +46,6 @@ from .invoices import OnchainInvoice
 from .crypto import sha256
 from .bitcoin import address_to_script
 from .transaction import PartialTxOutput
-from .network import Network
 from .logging import get_logger, Logger
 
 if TYPE_CHECKING:
@@ -81,6 +80,7 @@ async def get_payment_request(url: str) -> 'PaymentRequest':
     if u.scheme in ('http', 'https'):
         resp_content = None
         try:
+            from .network import Network
             proxy = Network.get_instance().proxy
             async with make_aiohttp_session(proxy, headers=REQUEST_HEADERS) as session:
                 async with session.get(url) as response:
@@ -300,6 +300,7 @@ class PaymentRequest:
         payurl = urllib.parse.urlparse(pay_det.payment_url)
         resp_content = None
         try:
+            from .network import Network
             proxy = Network.get_instance().proxy
             async with make_aiohttp_session(proxy, headers=ACK_HEADERS) as session:
                 async with session.post(payurl.geturl(), data=pm) as response:
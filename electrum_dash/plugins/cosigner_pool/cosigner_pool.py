@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import xmlrpc.client
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import ClientResponseError
+
+from electrum_dash.logging import Logger
+from electrum_dash.network import Network
+from electrum_dash.util import make_aiohttp_session
+
+
+COSIGNER_POOL_URL = 'https://cosigner.electrum.org/'
+
+
+class CosignerPoolServer(Logger):
+    '''Async XML-RPC client of cosigner pool server'''
+
+    def __init__(self, url=COSIGNER_POOL_URL, *, timeout=30):
+        Logger.__init__(self)
+        self.url = url
+        self.timeout = timeout
+        self.multicall = True  # set to False if server does not support it
+
+    async def call(self, method, *params):
+        data = xmlrpc.client.dumps(params, method, allow_none=True)
+        network = Network.get_instance()
+        proxy = network.proxy if network else None
+        async with make_aiohttp_session(proxy, timeout=self.timeout) as session:
+            async with session.post(self.url, data=data.encode('utf-8'),
+                                    headers={'Content-Type': 'text/xml'}) as r:
+                r.raise_for_status()
+                body = await r.read()
+        result, _ = xmlrpc.client.loads(body)
+        return result[0]
+
+    async def get(self, keyhash: str) -> Optional[str]:
+        return await self.call('get', keyhash)
+
+    async def put(self, keyhash: str, message: str):
+        return await self.call('put', keyhash, message)
+
+    async def delete(self, keyhash: str):
+        return await self.call('delete', keyhash)
+
+    async def get_many(self, keyhashes: Iterable[str]) -> Dict[str, str]:
+        '''Messages found for keyhashes, fetched in one round-trip
+        with system.multicall if the server supports it'''
+        keyhashes = list(keyhashes)
+        if self.multicall:
+            calls = [{'methodName': 'get', 'params': [k]} for k in keyhashes]
+            try:
+                results = await self.call('system.multicall', calls)
+            except xmlrpc.client.Fault as e:
+                self.logger.info(f'system.multicall is not supported: {e}')
+                self.multicall = False
+            except ClientResponseError as e:
+                # server can reject multicall with HTTP error instead of
+                # fault, disable it only if single gets work
+                self.logger.info(f'system.multicall failed: {repr(e)}')
+                res = await self._get_each(keyhashes)
+                self.multicall = False
+                return res
+            else:
+                if len(results) != len(keyhashes):
+                    raise Exception('unexpected multicall results count')
+                res = {}
+                for keyhash, r in zip(keyhashes, results):
+                    if isinstance(r, dict):  # fault of single call
+                        raise xmlrpc.client.Fault(r.get('faultCode'),
+                                                  r.get('faultString'))
+                    if r and r[0]:
+                        res[keyhash] = r[0]
+                return res
+        return await self._get_each(keyhashes)
+
+    async def _get_each(self, keyhashes: List[str]) -> Dict[str, str]:
+        res = {}
+        for keyhash in keyhashes:
+            message = await self.get(keyhash)
+            if message:
+                res[keyhash] = message
+        return res
+
+    async def put_many(self, messages: List[Tuple[str, str]]):
+        for keyhash, message in messages:
+            await self.put(keyhash, message)
+
+
+class Listener(Logger):
+    '''Wait for messages to keyhashes on cosigner pool server, all keyhashes
+    are queried in one request. Retries after failures are delayed
+    exponentially up to MAX_BACKOFF seconds.'''
+
+    # all keyhashes are queried in one multicall request, so short
+    # interval gives lower server load than N gets every 30 seconds
+    POLL_INTERVAL = 5
+    MAX_BACKOFF = 300
+
+    def __init__(self, server: CosignerPoolServer,
+                 on_receive: Callable[[str, str], None], *,
+                 loop: asyncio.AbstractEventLoop, poll_interval=None):
+        Logger.__init__(self)
+        self.server = server
+        self.on_receive = on_receive
+        self.loop = loop
+        self.poll_interval = poll_interval or self.POLL_INTERVAL
+        self.received = set()
+        self.keyhashes = []
+        self.failures = 0
+        self.fut = None
+        self._wakeup = asyncio.Event()
+
+    def start(self):
+        self.fut = asyncio.run_coroutine_threadsafe(self.run(), self.loop)
+
+    def stop(self):
+        if self.fut:
+            self.fut.cancel()
+            self.fut = None
+
+    def is_running(self):
+        return self.fut is not None and not self.fut.done()
+
+    def wakeup(self):
+        '''Query server now instead of waiting for next round'''
+        self.loop.call_soon_threadsafe(self._wakeup.set)
+
+    def set_keyhashes(self, keyhashes):
+        self.keyhashes = keyhashes
+        self.wakeup()
+
+    def clear(self, keyhash):
+        '''Delete received message from server (nonblocking)'''
+        asyncio.run_coroutine_threadsafe(self.delete(keyhash), self.loop)
+
+    async def delete(self, keyhash):
+        '''Delete message from server, if deletion fails message
+        can be received again on next poll'''
+        try:
+            await self.server.delete(keyhash)
+        except Exception as e:
+            self.logger.info(f'cannot delete message for {keyhash}:'
+                             f' {repr(e)}')
+        finally:
+            self.received.discard(keyhash)
+
+    def next_delay(self):
+        if not self.failures:
+            return self.poll_interval
+        return min(self.poll_interval * 2 ** self.failures, self.MAX_BACKOFF)
+
+    async def poll(self):
+        keyhashes = [k for k in self.keyhashes if k not in self.received]
+        if not keyhashes:
+            return
+        try:
+            messages = await self.server.get_many(keyhashes)
+        except Exception as e:
+            self.failures += 1
+            self.logger.info(f'cannot contact cosigner pool: {repr(e)},'
+                             f' retry in {self.next_delay()} s')
+            return
+        self.failures = 0
+        for keyhash, message in messages.items():
+            self.received.add(keyhash)
+            self.logger.info(f'received message for {keyhash}')
+            self.on_receive(keyhash, message)
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            await self.poll()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.next_delay())
+            except asyncio.TimeoutError:
+                pass
@@ -23,16 +23,13 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import time
-from xmlrpc.client import ServerProxy
+import asyncio
 from typing import TYPE_CHECKING, Union, List, Tuple
-import ssl
 
 from PyQt5.QtCore import QObject, pyqtSignal
 from PyQt5.QtWidgets import QPushButton
-import certifi
 
-from electrum_dash import util, keystore, ecc, crypto
+from electrum_dash import keystore, ecc, crypto
 from electrum_dash import transaction
 from electrum_dash.transaction import Transaction, PartialTransaction, tx_from_any, SerializationError
 from electrum_dash.bip32 import BIP32Node
@@ -44,55 +41,13 @@ from electrum_dash.util import bh2u, bfh
 from electrum_dash.gui.qt.transaction_dialog import show_transaction, TxDialog
 from electrum_dash.gui.qt.util import WaitingDialog
 
+from .cosigner_pool import CosignerPoolServer, Listener
+
 if TYPE_CHECKING:
     from electrum_dash.gui.qt import ElectrumGui
     from electrum_dash.gui.qt.main_window import ElectrumWindow
 
 
-ca_path = certifi.where()
-ssl_context = ssl.create_default_context(purpose=ssl.Purpose.SERVER_AUTH, cafile=ca_path)
-server = ServerProxy('https://cosigner.electrum.org/', allow_none=True, context=ssl_context)
-
-
-class Listener(util.DaemonThread):
-
-    def __init__(self, parent):
-        util.DaemonThread.__init__(self)
-        self.daemon = True
-        self.parent = parent
-        self.received = set()
-        self.keyhashes = []
-
-    def set_keyhashes(self, keyhashes):
-        self.keyhashes = keyhashes
-
-    def clear(self, keyhash):
-        server.delete(keyhash)
-        self.received.remove(keyhash)
-
-    def run(self):
-        while self.is_running():
-            if not self.keyhashes:
-                time.sleep(2)
-                continue
-            for keyhash in self.keyhashes:
-                if keyhash in self.received:
-                    continue
-                try:
-                    message = server.get(keyhash)
-                except Exception as e:
-                    self.logger.info("cannot contact cosigner pool")
-                    time.sleep(30)
-                    continue
-                if message:
-                    self.received.add(keyhash)
-                    self.logger.info(f"received message for {keyhash}")
-                    self.parent.obj.cosigner_receive_signal.emit(
-                        keyhash, message)
-            # poll every 30 seconds
-            time.sleep(30)
-
-
 class QReceiveSignalObject(QObject):
     cosigner_receive_signal = pyqtSignal(object, object)
 
@@ -102,6 +57,8 @@ class Plugin(BasePlugin):
     def __init__(self, parent, config, name):
         BasePlugin.__init__(self, parent, config, name)
         self.listener = None
+        self.loop = asyncio.get_event_loop()
+        self.server = CosignerPoolServer()
         self.obj = QReceiveSignalObject()
         self.obj.cosigner_receive_signal.connect(self.on_receive)
         self.keys = []  # type: List[Tuple[str, str, ElectrumWindow]]
@@ -134,7 +91,10 @@ class Plugin(BasePlugin):
         assert isinstance(wallet, Multisig_Wallet)  # only here for type-hints in IDE
         if self.listener is None:
             self.logger.info("starting listener")
-            self.listener = Listener(self)
+            poll_interval = self.config.get('cosigner_pool_poll_interval')
+            self.listener = Listener(self.server, self.emit_receive,
+                                     loop=self.loop,
+                                     poll_interval=poll_interval)
             self.listener.start()
         elif self.listener:
             self.logger.info("shutting down listener")
@@ -153,6 +113,9 @@ class Plugin(BasePlugin):
         if self.listener:
             self.listener.set_keyhashes([t[1] for t in self.keys])
 
+    def emit_receive(self, keyhash, message):
+        self.obj.cosigner_receive_signal.emit(keyhash, message)
+
     @hook
     def transaction_dialog(self, d: 'TxDialog'):
         d.cosigner_send_button = b = QPushButton(_("Send to cosigner"))
@@ -203,10 +166,9 @@ class Plugin(BasePlugin):
             return
 
         # send messages
-        # note: we send all messages sequentially on the same thread
         def send_messages_task():
-            for _hash, message in buffer:
-                server.put(_hash, message)
+            coro = self.server.put_many(buffer)
+            asyncio.run_coroutine_threadsafe(coro, self.loop).result()
         msg = _('Sending transaction to cosigning pool...')
         WaitingDialog(some_window, msg, send_messages_task, on_success, on_failure)
 
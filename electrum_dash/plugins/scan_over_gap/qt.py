@@ -175,6 +175,7 @@ class ScanOverGapDialog(WindowModalDialog):
         self.add_found_btn.setEnabled(False)
         self.scan_list.update(items_enabled=False)
         self.scan_progress_pb.setValue(0)
+        self.scan_progress_pb.setFormat('%p%')
         coro = self.plugin.do_scan(wallet, self.scan_cnt_sb.value())
         asyncio.run_coroutine_threadsafe(coro, self.network.asyncio_loop)
 
@@ -199,7 +200,11 @@ class ScanOverGapDialog(WindowModalDialog):
     def on_progress_qt(self, wallet, progress):
         if self.wallet != wallet:
             return
-        self.scan_progress_pb.setValue(progress)
+        self.scan_progress_pb.setValue(int(progress))
+        ws = self.plugin.wallet_scans.get(wallet)
+        if ws and ws.addrs_per_sec:
+            speed = self.plugin.MSG_SPEED.format(ws.addrs_per_sec)
+            self.scan_progress_pb.setFormat(f'%p% ({speed})')
 
     def on_completed_qt(self, wallet):
         if self.wallet != wallet:
@@ -3,6 +3,7 @@
 
 import asyncio
 import attr
+import time
 from functools import partial
 from collections import OrderedDict
 from enum import IntEnum
@@ -20,6 +21,39 @@ def balance_total(*, confirmed, unconfirmed):
     return confirmed + unconfirmed
 
 
+class AdaptiveLimiter:
+    '''Limit of concurrent batch requests to one server: increased by one
+    after each successful request, halved on failed request'''
+
+    def __init__(self, *, initial=2, minimum=1, maximum=8):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.active = 0
+        self._cond = None
+
+    @property
+    def cond(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def __aenter__(self):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        async with self.cond:
+            self.active -= 1
+            if exc_type is None:
+                self.limit = min(self.limit + 1, self.maximum)
+            elif not issubclass(exc_type, asyncio.CancelledError):
+                self.limit = max(self.limit // 2, self.minimum)
+            self.cond.notify_all()
+
+
 @attr.s
 class Scan:
     derive = attr.ib(kw_only=True)
@@ -41,6 +75,25 @@ class Scan:
             self.addrs[i] = self.derive(i)
         self.next_idx += cnt
 
+    def derive_scripthashes(self, idxs):
+        '''List of (index, addr, scripthash) for idxs, scan state is not
+        changed, so batches can be derived in parallel threads'''
+        res = []
+        for i in idxs:
+            addr = self.addrs.get(i)
+            if addr is None:
+                addr = self.derive(i)
+            script = bitcoin.address_to_script(addr)
+            res.append((i, addr, bitcoin.script_to_scripthash(script)))
+        return res
+
+    def add_derived(self, batch):
+        '''Add addrs derived by derive_scripthashes'''
+        for i, addr, sh in batch:
+            self.addrs.setdefault(i, addr)
+        if batch:
+            self.next_idx = max(self.next_idx, batch[-1][0] + 1)
+
     def create_new_addrs(self, wallet):
         for i, balance in self.balances.items():
             if balance > 0:
@@ -56,7 +109,25 @@ class Scan:
 
     @property
     def uncompleted(self):
-        return set(self.addrs) - set(self.balances)
+        return set(range(self.start_idx, self.next_idx)) - set(self.balances)
+
+    def get_checkpoint(self):
+        return {'start_idx': self.start_idx,
+                'next_idx': self.next_idx,
+                'found': {str(i): b for i, b in self.balances.items()
+                          if b > 0},
+                'unscanned': sorted(self.uncompleted)}
+
+    def restore_checkpoint(self, data):
+        '''Restore scan state saved before with current start_idx'''
+        if not data or data.get('start_idx') != self.start_idx:
+            return
+        self.next_idx = max(data.get('next_idx', 0), self.start_idx)
+        unscanned = set(data.get('unscanned', []))
+        found = data.get('found', {})
+        for i in range(self.start_idx, self.next_idx):
+            if i not in unscanned:
+                self.balances[i] = found.get(str(i), 0)
 
     @classmethod
     def get_key(cls, *, for_change, ps_ks):
@@ -81,6 +152,7 @@ class WalletScan:
     running = attr.ib(kw_only=True, default=False)
     scans = attr.ib(kw_only=True, default=attr.Factory(OrderedDict))
     error = attr.ib(kw_only=True, default=None)
+    addrs_per_sec = attr.ib(kw_only=True, default=0)
 
 
 class ScanOverGapPlugin(BasePlugin, Logger):
@@ -88,6 +160,12 @@ class ScanOverGapPlugin(BasePlugin, Logger):
     MIN_SCAN_CNT = 5
     DEF_SCAN_CNT = 20
     MAX_SCAN_CNT = 10_000
+    BATCH_SIZE = 100  # scripthashes in one batch request
+    DERIVE_WORKERS = 4  # batches derived concurrently in executor
+    QUEUED_BATCHES = 4  # derived batches waiting for workers
+    RETRY_CNT = 3
+    RETRY_DELAY = 1  # seconds, doubled on each retry
+    CHECKPOINT_KEY = 'scan_over_gap'
 
     MSG_TITLE = _('Scan Over Gap')
     MSG_SCAN_TITLE = _('Scan current wallet addresses beyond gap limits'
@@ -99,6 +177,7 @@ class ScanOverGapPlugin(BasePlugin, Logger):
     MSG_ADD_FOUND = _('Add found coins to wallet')
     MSG_SCAN_NEXT = _('Scan next {} addresses')
     MSG_SCAN = _('Scan')
+    MSG_SPEED = _('{} addr/s')
 
     class Columns(IntEnum):
         KEY = 0
@@ -113,6 +192,7 @@ class ScanOverGapPlugin(BasePlugin, Logger):
         super(ScanOverGapPlugin, self).__init__(parent, config, name)
         self.wallet_scans = {}
         self.wallet_scans_lock = asyncio.Lock()
+        self.server_limiters = {}  # str(server) -> AdaptiveLimiter
         self.format_amount = config.format_amount_and_units
 
     def is_available(self):
@@ -149,8 +229,31 @@ class ScanOverGapPlugin(BasePlugin, Logger):
             wallet_scan.running = False
             self.logger.debug(f'scan error for {wallet}: {str(e)}')
 
+    def get_limiter(self, network):
+        key = str(network.default_server)
+        limiter = self.server_limiters.get(key)
+        if limiter is None:
+            limiter = self.server_limiters[key] = AdaptiveLimiter()
+        return limiter
+
+    def save_checkpoint(self, wallet):
+        '''Save scans state to wallet db to resume interrupted scans'''
+        ws = self.wallet_scans.get(wallet)
+        if not ws:
+            return
+        data = {key: s.get_checkpoint() for key, s in ws.scans.items()}
+        wallet.db.put(self.CHECKPOINT_KEY, data)
+        wallet.save_db()
+
+    def clear_checkpoint(self, wallet):
+        wallet.db.put(self.CHECKPOINT_KEY, None)
+        wallet.save_db()
+
     async def init_scans(self, wallet, *, reset=False):
         w = wallet
+        if reset:
+            self.clear_checkpoint(w)
+        checkpoint = w.db.get(self.CHECKPOINT_KEY, {})
         psman = w.psman
         db_num_change = w.db.num_change_addresses
         db_num_receiving = w.db.num_receiving_addresses
@@ -187,10 +290,65 @@ class ScanOverGapPlugin(BasePlugin, Logger):
                                  num_addrs=num_addrs, gap=gap,
                                  start_idx=start_idx, next_idx=start_idx,
                                  for_change=for_change, ps_ks=ps_ks)
+                        s.restore_checkpoint(checkpoint.get(key))
                         new_scans_cnt +=1
                         ws.scans[key] = s
         return new_scans_cnt
 
+    async def get_balances(self, network, shs):
+        '''Balances for shs in one batch request, retried on failures'''
+        delay = self.RETRY_DELAY
+        for attempt in range(self.RETRY_CNT):
+            try:
+                async with self.get_limiter(network):
+                    return await network.get_balances_for_scripthashes(shs)
+            except Exception as e:
+                self.logger.info(f'Exception on get_balances {repr(e)}')
+                err = e
+            if attempt < self.RETRY_CNT - 1:
+                await asyncio.sleep(delay)
+                delay *= 2
+        return [err] * len(shs)
+
+    async def derive_batches(self, to_scan, queue, workers_cnt):
+        '''Derive batches in DERIVE_WORKERS executor threads, wallet_scans_lock
+        is taken only to add derived addrs to scans'''
+        loop = asyncio.get_event_loop()
+        batches = iter([(s, idxs[pos:pos+self.BATCH_SIZE])
+                        for s, idxs in to_scan
+                        for pos in range(0, len(idxs), self.BATCH_SIZE)])
+
+        async def derive_worker():
+            for s, batch_idxs in batches:
+                batch = await loop.run_in_executor(
+                    None, s.derive_scripthashes, batch_idxs)
+                async with self.wallet_scans_lock:
+                    s.add_derived(batch)
+                await queue.put((s, [(i, sh) for i, addr, sh in batch]))
+
+        async with TaskGroup() as group:
+            for i in range(self.DERIVE_WORKERS):
+                await group.spawn(derive_worker())
+        for i in range(workers_cnt):
+            await queue.put(None)
+
+    async def scan_batches(self, wallet, network, queue, progress):
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            s, batch = item
+            results = await self.get_balances(network,
+                                              [sh for i, sh in batch])
+            for (i, sh), res in zip(batch, results):
+                if isinstance(res, Exception):
+                    s.errors[i] = res
+                else:
+                    s.balances[i] = balance_total(**res)
+                    s.errors.pop(i, None)
+            self.save_checkpoint(wallet)
+            await progress(len(batch))
+
     async def do_scan(self, wallet, cnt):
         w = wallet
         try:
@@ -199,53 +357,44 @@ class ScanOverGapPlugin(BasePlugin, Logger):
                 if not ws or ws.running:
                     return
                 ws.running = True
-                scans = list(ws.scans.values())
+                scans = [s for s in ws.scans.values() if s.active]
             n = Network.get_instance()
-            loop = n.asyncio_loop
-            done_cnt = 0
-            to_scan_cnt = 0
-            for s in scans:
-                if not s.active:
-                    continue
-                to_scan_cnt += len(s.uncompleted)
+            to_scan = [(s, sorted(s.uncompleted)) for s in scans]
+            to_scan = [(s, idxs) for s, idxs in to_scan if idxs]
+            to_scan_cnt = sum(len(idxs) for s, idxs in to_scan)
             if to_scan_cnt:
                 self.logger.info(f'total count to rescan: {to_scan_cnt}')
             else:
-                for s in scans:
-                    if not s.active:
-                        continue
-                    async with self.wallet_scans_lock:
-                        await loop.run_in_executor(None, s.derive_addrs, cnt)
-                    to_scan_cnt += cnt
+                to_scan = [(s, list(range(s.next_idx, s.next_idx + cnt)))
+                           for s in scans]
+                to_scan_cnt = cnt * len(scans)
                 self.logger.info(f'total count to scan: {to_scan_cnt}')
             if not to_scan_cnt:
+                await self.on_completed(w)
                 return
+            done_cnt = 0
+            start_time = time.monotonic()
+
+            async def progress(batch_cnt):
+                nonlocal done_cnt
+                done_cnt += batch_cnt
+                elapsed = time.monotonic() - start_time
+                if elapsed > 0:
+                    ws.addrs_per_sec = round(done_cnt / elapsed)
+                await self.on_progress(w, 100*done_cnt/to_scan_cnt)
+
+            workers_cnt = self.get_limiter(n).maximum
+            queue = asyncio.Queue(maxsize=self.QUEUED_BATCHES)
             async with TaskGroup() as group:
-                for s in scans:
-                    for i, addr in s.addrs.items():
-                        if i in s.balances:
-                            continue
-                        script = bitcoin.address_to_script(addr)
-                        scripthash = bitcoin.script_to_scripthash(script)
-                        coro = n.get_balance_for_scripthash(scripthash)
-                        s.tasks[i] = await group.spawn(coro)
-                while True:
-                    task = await group.next_done()
-                    if task is None:
-                        break
-                    done_cnt += 1
-                    await self.on_progress(w, 100*done_cnt/to_scan_cnt)
-            for s in  scans:
-                for i, task in s.tasks.items():
-                    try:
-                        balance = task.result()
-                        s.balances[i] = balance_total(**balance)
-                        if i in s.errors:
-                            s.errors.pop(i)
-                    except BaseException as e:
-                        self.logger.info(f'Exception on get_balance {repr(e)}')
-                        s.errors[i] = e
-                s.tasks.clear()
+                await group.spawn(self.derive_batches(to_scan, queue,
+                                                      workers_cnt))
+                for i in range(workers_cnt):
+                    await group.spawn(self.scan_batches(w, n, queue,
+                                                        progress))
+            errors_cnt = sum(len(s.errors) for s in scans)
+            self.logger.info(f'scanned {done_cnt} addresses'
+                             f' ({ws.addrs_per_sec} addr/s),'
+                             f' errors: {errors_cnt}')
             await self.on_completed(w)
         except Exception as e:
             self.logger.info(f'Exception during wallet_scan: {repr(e)}')
@@ -264,6 +413,7 @@ class ScanOverGapPlugin(BasePlugin, Logger):
                 scans = list(ws.scans.values())
                 for s in scans:
                     await loop.run_in_executor(None, s.create_new_addrs, w)
+            self.save_checkpoint(w)
             await self.on_completed(w)
         except Exception as e:
             self.logger.info(f'Exception during add_found: {repr(e)}')
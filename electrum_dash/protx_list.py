@@ -30,7 +30,7 @@ import json
 import os
 import random
 import threading
-from collections import namedtuple, defaultdict
+from collections import namedtuple, defaultdict, deque
 from struct import pack
 
 from . import constants, util
@@ -51,6 +51,7 @@ DEFAULT_MN_LIST = {'protx_height': 0, 'llmq_height': 0,
                    'quorums': {}, 'llmq_hashes': {}}   # qfcommits and hashes
 RECENT_LIST_FNAME = 'recent_protx_list.gz'
 PROTX_INFO_FNAME = 'protx_info.gz'
+MNLISTD_RATE_WINDOW = 60  # secs to calculate applied mnlistdiffs rate
 
 
 class PartialMerkleTree(namedtuple('PartialMerkleTree', 'total hashes flags')):
@@ -64,7 +65,7 @@ class PartialMerkleTree(namedtuple('PartialMerkleTree', 'total hashes flags')):
         n_hashes = vds.read_compact_size()
         hashes = []
         for n in range(n_hashes):
-            hashes.append(bh2u(vds.read_bytes(32)[::-1]))
+            hashes.append(vds.read_view(32)[::-1].hex())
         n_flags = vds.read_compact_size()
         flags = []
         for n in range(n_flags):
@@ -137,6 +138,9 @@ class MNList(Logger):
         self.sent_getmnlistd = asyncio.Queue(1)
         self.sent_protx_diff = asyncio.Queue(1)
 
+        # Applied MNListDiffs stats: (time, diffs count)
+        self.applied_diffs_stats = deque([], 100)
+
         # Wait for wallet updated before request LLMQ/ProTx diffs
         self.blockchain_loaded = False
         self.wallets_updated = False
@@ -154,6 +158,33 @@ class MNList(Logger):
             height = next_chunk * CHUNK_SIZE - 1
         return height
 
+    @classmethod
+    def calc_getmnlistd_ranges(cls, base_height, height, get_mns=False,
+                               max_ranges=1):
+        '''Split (base_height, height) on consecutive getmnlistd ranges'''
+        ranges = []
+        llmq_offset = cls.LLMQ_OFFSET
+        activation_height = constants.net.DIP3_ACTIVATION_HEIGHT
+        while len(ranges) < max_ranges:
+            if get_mns:
+                if not height or height <= base_height:
+                    break
+            else:
+                if not height or height <= base_height + llmq_offset:
+                    break
+
+            next_height = height
+            if base_height <= 1:
+                if height > activation_height:
+                    next_height = activation_height + 1
+            elif height - (base_height + llmq_offset) > CHUNK_SIZE:
+                next_height = cls.calc_max_height(base_height, height)
+            elif height - base_height > llmq_offset:
+                next_height = height - llmq_offset
+            ranges.append((base_height, next_height))
+            base_height = next_height
+        return ranges
+
     @property
     def llmq_tip(self):
         return self.network.get_local_height() - self.LLMQ_OFFSET
@@ -216,6 +247,19 @@ class MNList(Logger):
         else:
             return True
 
+    @property
+    def mnlistdiff_rate(self):
+        '''Applied MNListDiffs per second in last MNLISTD_RATE_WINDOW secs'''
+        now = time.time()
+        recent = [(t, cnt) for t, cnt in self.applied_diffs_stats
+                  if now - t < MNLISTD_RATE_WINDOW]
+        if len(recent) < 2:
+            return 0.0
+        elapsed = recent[-1][0] - recent[0][0]
+        if elapsed <= 0:
+            return 0.0
+        return sum(cnt for t, cnt in recent[1:]) / elapsed
+
     @property
     def llmq_human_height(self):
         if self.llmq_height > 0:
@@ -449,12 +493,9 @@ class MNList(Logger):
             return random.choice(valid)
 
     def get_mn_by_protx_hash(self, protx_hash):
-        mn = [name for name, sml in self.protx_mns.items() if bh2u(sml.proRegTxHash) == protx_hash]
-
-        if len(mn) == 0:
-            return None
-
-        return self.protx_mns[mn[0]]
+        '''Get SML entry by hex of proRegTxHash bytes (as in dsq msg)'''
+        # protx_mns keys is reversed proRegTxHash hex
+        return self.protx_mns.get(bh2u(bfh(protx_hash)[::-1]))
 
     def calc_responsible_quorum(self, llmqType, request_id):
         res = []
@@ -545,8 +586,113 @@ class MNList(Logger):
             return False
         return True
 
+    def check_mnlistdiff_cbtx(self, diff):
+        '''Check MNListDiff CbTx on merkle hashes (independent of state)'''
+        cbtx = diff.cbTx
+        if not cbtx.tx_type:  # classical coinbase tx (disabled dip3)
+            return True
+        return self.check_cbtx_merkle_root(cbtx, hashes=diff.merkleHashes)
+
+    def process_mnlistdiff(self, base_height, height, diff):
+        '''Apply MNListDiff with already checked CbTx merkle root'''
+        self.logger.debug(f'process_mnlistdiff base_height={base_height}'
+                          f' height={height}')
+        if base_height not in [self.llmq_height, self.protx_height]:
+            return False
+
+        cbtx = diff.cbTx
+        if cbtx.tx_type:
+            if cbtx.tx_type != 5:
+                self.logger.info(f'on_mnlistdiff: unsupported CbTx'
+                                 f' version={cbtx.version},'
+                                 f' tx_type={cbtx.tx_type}')
+                return False
+            cbtx_extra = cbtx.extra_payload
+            if cbtx_extra.version > 3:
+                self.logger.info(f'on_mnlistdiff: unsupported CbTx'
+                                 f' cbtx_extra.version='
+                                 f'{cbtx_extra.version}')
+                return False
+        else:  # classical coinbase tx (disabled dip3)
+            if self.load_mns:
+                self.protx_height = height
+                self.recent_list['protx_height'] = height
+                self.protx_state = MNList.DIP3_DISABLED
+            self.llmq_height = height
+            self.recent_list['llmq_height'] = height
+            return True
+
+        if self.load_mns and base_height == self.protx_height:
+            protx_new = self.protx_mns.copy()
+            sml_hashes_new = self.sml_hashes.copy()
+            deleted_mns = [bh2u(h[::-1]) for h in diff.deletedMNs]
+            for del_hash in deleted_mns:
+                if del_hash in protx_new:
+                    del protx_new[del_hash]
+                if del_hash in sml_hashes_new:
+                    del sml_hashes_new[del_hash]
+
+            for sml_entry in diff.mnList:
+                protx_hash = bh2u(sml_entry.proRegTxHash[::-1])
+                sml_hash = sha256d(sml_entry.serialize())
+                protx_new[protx_hash] = sml_entry
+                sml_hashes_new[protx_hash] = sml_hash
+
+        if base_height == self.llmq_height and height <= self.llmq_tip:
+            quorums_new = self.quorums.copy()
+            llmq_hashes_new = self.llmq_hashes.copy()
+            for dq in diff.deletedQuorums:
+                del_key = f'{bh2u(dq.quorumHash[::-1])}:{dq.llmqType}'
+                if del_key in quorums_new:
+                    del quorums_new[del_key]
+                if del_key in llmq_hashes_new:
+                    del llmq_hashes_new[del_key]
+
+            for nq in diff.newQuorums:
+                new_key = f'{bh2u(nq.quorumHash[::-1])}:{nq.llmqType}'
+                qfcommit_hash = sha256d(nq.serialize())
+                quorums_new[new_key] = nq
+                llmq_hashes_new[new_key] = qfcommit_hash
+
+        if self.load_mns and base_height == self.protx_height:
+            if not self.check_sml_merkle_root(sml_hashes_new,
+                                              cbtx_extra):
+                return False
+
+        if (base_height == self.llmq_height
+                and height <= self.llmq_tip
+                and cbtx_extra.version > 1):
+            if not self.check_llmq_merkle_root(llmq_hashes_new,
+                                               cbtx_extra):
+                return False
+
+        cbtx_height = cbtx_extra.height
+        if self.load_mns and base_height == self.protx_height:
+            self.protx_height = cbtx_height
+            self.recent_list['protx_height'] = cbtx_height
+            self.protx_mns = protx_new
+            self.recent_list['protx_mns'] = protx_new
+            self.sml_hashes = sml_hashes_new
+            self.recent_list['sml_hashes'] = sml_hashes_new
+            self.protx_state = MNList.DIP3_ENABLED
+
+            self.diff_deleted_mns.extend(deleted_mns)
+            dh = list(map(lambda x: bh2u(x.proRegTxHash[::-1]),
+                      diff.mnList))
+            self.diff_hashes.extend(dh)
+
+        if base_height == self.llmq_height and height <= self.llmq_tip:
+            self.llmq_height = cbtx_height
+            self.recent_list['llmq_height'] = cbtx_height
+            self.quorums = quorums_new
+            self.recent_list['quorums'] = quorums_new
+            self.llmq_hashes = llmq_hashes_new
+            self.recent_list['llmq_hashes'] = llmq_hashes_new
+
+        return True
+
     async def on_mnlistdiff(self, event, value):
-        '''Process and check MNListDiff payload'''
+        '''Process and check MNListDiff payloads from parallel requests'''
         base_height, height = value['params']
         self.logger.debug(f'on_mnlistdiff base_height={base_height}'
                           f' height={height}')
@@ -567,111 +713,36 @@ class MNList(Logger):
             self.logger.info(f'on_mnlistdiff: {error}')
             self.notify('network-error')
             return
-        diff = value['result']
-
-        def process_mnlistdiff():
-            self.logger.debug('process_mnlistdiff')
-            cbtx = diff.cbTx
-            if cbtx.tx_type:
-                if cbtx.tx_type != 5:
-                    self.logger.info(f'on_mnlistdiff: unsupported CbTx'
-                                     f' version={cbtx.version},'
-                                     f' tx_type={cbtx.tx_type}')
-                    return False
-                cbtx_extra = cbtx.extra_payload
-                if cbtx_extra.version > 3:
-                    self.logger.info(f'on_mnlistdiff: unsupported CbTx'
-                                     f' cbtx_extra.version='
-                                     f'{cbtx_extra.version}')
-                    return False
-            else:  # classical coinbase tx (disabled dip3)
-                if self.load_mns:
-                    self.protx_height = height
-                    self.recent_list['protx_height'] = height
-                    self.protx_state = MNList.DIP3_DISABLED
-                self.diff_deleted_mns = []
-                self.diff_hashes = []
-                self.llmq_height = height
-                self.recent_list['llmq_height'] = height
-                return True
+        diffs = value['result']
+        ranges = value['ranges']
 
-            if self.load_mns and base_height == self.protx_height:
-                protx_new = self.protx_mns.copy()
-                sml_hashes_new = self.sml_hashes.copy()
-                deleted_mns = [bh2u(h[::-1]) for h in diff.deletedMNs]
-                for del_hash in deleted_mns:
-                    if del_hash in protx_new:
-                        del protx_new[del_hash]
-                    if del_hash in sml_hashes_new:
-                        del sml_hashes_new[del_hash]
-
-                for sml_entry in diff.mnList:
-                    protx_hash = bh2u(sml_entry.proRegTxHash[::-1])
-                    sml_hash = sha256d(sml_entry.serialize())
-                    protx_new[protx_hash] = sml_entry
-                    sml_hashes_new[protx_hash] = sml_hash
-
-            if base_height == self.llmq_height and height <= self.llmq_tip:
-                quorums_new = self.quorums.copy()
-                llmq_hashes_new = self.llmq_hashes.copy()
-                for dq in diff.deletedQuorums:
-                    del_key = f'{bh2u(dq.quorumHash[::-1])}:{dq.llmqType}'
-                    if del_key in quorums_new:
-                        del quorums_new[del_key]
-                    if del_key in llmq_hashes_new:
-                        del llmq_hashes_new[del_key]
-
-                for nq in diff.newQuorums:
-                    new_key = f'{bh2u(nq.quorumHash[::-1])}:{nq.llmqType}'
-                    qfcommit_hash = sha256d(nq.serialize())
-                    quorums_new[new_key] = nq
-                    llmq_hashes_new[new_key] = qfcommit_hash
-
-            if self.load_mns and base_height == self.protx_height:
-                if not self.check_sml_merkle_root(sml_hashes_new,
-                                                  cbtx_extra):
-                    return False
-
-            if (base_height == self.llmq_height
-                    and height <= self.llmq_tip
-                    and cbtx_extra.version > 1):
-                if not self.check_llmq_merkle_root(llmq_hashes_new,
-                                                   cbtx_extra):
-                    return False
-
-            if not self.check_cbtx_merkle_root(cbtx,
-                                               hashes=diff.merkleHashes):
-                return False
+        # CbTx merkle root checks does not depend on MNList state
+        loop = self.dash_net.loop
+        checks = await asyncio.gather(*[
+            loop.run_in_executor(None, self.check_mnlistdiff_cbtx, diff)
+            for diff in diffs
+        ])
 
-            cbtx_height = cbtx_extra.height
-            if self.load_mns and base_height == self.protx_height:
-                self.protx_height = cbtx_height
-                self.recent_list['protx_height'] = cbtx_height
-                self.protx_mns = protx_new
-                self.recent_list['protx_mns'] = protx_new
-                self.sml_hashes = sml_hashes_new
-                self.recent_list['sml_hashes'] = sml_hashes_new
-                self.protx_state = MNList.DIP3_ENABLED
-
-                self.diff_deleted_mns = deleted_mns
-                dh = list(map(lambda x: bh2u(x.proRegTxHash[::-1]),
-                          diff.mnList))
-                self.diff_hashes = dh
-            else:
-                self.diff_deleted_mns = []
-                self.diff_hashes = []
-
-            if base_height == self.llmq_height and height <= self.llmq_tip:
-                self.llmq_height = cbtx_height
-                self.recent_list['llmq_height'] = cbtx_height
-                self.quorums = quorums_new
-                self.recent_list['quorums'] = quorums_new
-                self.llmq_hashes = llmq_hashes_new
-                self.recent_list['llmq_hashes'] = llmq_hashes_new
-
-            return True
-
-        if await self.dash_net.loop.run_in_executor(None, process_mnlistdiff):
+        def process_mnlistdiffs():
+            self.diff_deleted_mns = []
+            self.diff_hashes = []
+            applied_cnt = 0
+            for (d_base_height, d_height), diff, check_ok in zip(ranges,
+                                                                 diffs,
+                                                                 checks):
+                if not check_ok:
+                    break
+                if not self.process_mnlistdiff(d_base_height, d_height, diff):
+                    break
+                applied_cnt += 1
+            return applied_cnt
+
+        applied_cnt = await loop.run_in_executor(None, process_mnlistdiffs)
+        if applied_cnt:
+            self.applied_diffs_stats.append((time.time(), applied_cnt))
+            self.logger.debug(f'applied {applied_cnt} of {len(ranges)}'
+                              f' mnlistdiffs, rate:'
+                              f' {self.mnlistdiff_rate:.2f} diffs/s')
             if self.diff_deleted_mns:
                 for h in self.diff_deleted_mns:
                     self.protx_info.pop(h, None)
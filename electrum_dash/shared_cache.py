@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import weakref
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Hashable, Optional, TYPE_CHECKING
+
+from .logging import Logger
+from .transaction import PartialTransaction
+
+if TYPE_CHECKING:
+    from .simple_config import SimpleConfig
+    from .wallet_db import WalletDB
+
+
+SHARED_CACHE_TXS_SIZE = 16 * 1024 * 1024  # hex chars of cached raw txs
+SHARED_CACHE_MAX_PROOFS = 10000
+SHARED_CACHE_MAX_HISTORIES = 10000
+
+
+class LRUStore:
+    '''Mapping evicting least recently used items over max_size,
+    item sizes are counted by sizeof (1 per item by default)'''
+
+    def __init__(self, max_size: int, sizeof: Callable[[Any], int] = None):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0
+        self.items = OrderedDict()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def _item_size(self, value) -> int:
+        return self.sizeof(value) if self.sizeof else 1
+
+    def get(self, key, default=None):
+        value = self.items.get(key, default)
+        if key in self.items:
+            self.items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.pop(key)
+        size = self._item_size(value)
+        if size > self.max_size:
+            return
+        self.items[key] = value
+        self.size += size
+        while self.size > self.max_size:
+            _, old_value = self.items.popitem(last=False)
+            self.size -= self._item_size(old_value)
+
+    def pop(self, key, default=None):
+        if key not in self.items:
+            return default
+        value = self.items.pop(key)
+        self.size -= self._item_size(value)
+        return value
+
+    def clear(self):
+        self.items.clear()
+        self.size = 0
+
+
+class SharedCache(Logger):
+    '''Raw txs, SPV proofs and scripthash histories shared by all wallets
+    of the daemon. Concurrent requests for the same item are merged into
+    one server request. Data is stored by callers after they validate it.
+    Must be used from the network asyncio loop thread only.'''
+
+    TXS = 'txs'
+    PROOFS = 'proofs'
+    HISTORIES = 'histories'
+
+    def __init__(self, config: 'SimpleConfig'):
+        Logger.__init__(self)
+        self.stores = {
+            self.TXS: LRUStore(config.get('shared_cache_txs_size',
+                                          SHARED_CACHE_TXS_SIZE), len),
+            self.PROOFS: LRUStore(config.get('shared_cache_max_proofs',
+                                             SHARED_CACHE_MAX_PROOFS)),
+            self.HISTORIES: LRUStore(config.get('shared_cache_max_histories',
+                                                SHARED_CACHE_MAX_HISTORIES)),
+        }
+        self._pending = {}  # (kind, key) -> asyncio.Future
+        # wallet dbs of loaded wallets, consulted for raw txs
+        self._dbs = weakref.WeakSet()  # type: weakref.WeakSet[WalletDB]
+        self._dbs_lock = threading.Lock()
+        self.stats = {kind: defaultdict(int) for kind in self.stores}
+
+    def register_db(self, db: 'WalletDB'):
+        with self._dbs_lock:
+            self._dbs.add(db)
+
+    def unregister_db(self, db: 'WalletDB'):
+        with self._dbs_lock:
+            self._dbs.discard(db)
+
+    def put(self, kind: str, key: Hashable, value: Any):
+        self.stores[kind].put(key, value)
+
+    def remove(self, kind: str, key: Hashable):
+        self.stores[kind].pop(key)
+
+    def clear(self):
+        for store in self.stores.values():
+            store.clear()
+
+    async def get_or_fetch(self, kind: str, key: Hashable,
+                           fetch: Callable[[], Awaitable]) -> Any:
+        '''Return cached item or result of fetch(), if same item is being
+        fetched already wait for that request result instead'''
+        stats = self.stats[kind]
+        while True:
+            value = self.stores[kind].get(key)
+            if value is not None:
+                stats['hits'] += 1
+                return value
+            fut = self._pending.get((kind, key))
+            if fut is None:
+                break
+            stats['merged'] += 1
+            await asyncio.wait([fut])
+            if not fut.cancelled():
+                return fut.result()
+            # fetching task was cancelled, retry
+        stats['misses'] += 1
+        fut = asyncio.get_event_loop().create_future()
+        self._pending[(kind, key)] = fut
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # mark as retrieved if nobody waits
+            raise
+        else:
+            fut.set_result(value)
+            return value
+        finally:
+            self._pending.pop((kind, key), None)
+
+    async def get_transaction(self, tx_hash: str,
+                              fetch: Callable[[], Awaitable[str]]) -> str:
+        '''Return raw tx from cache, loaded wallets or fetch()'''
+        if tx_hash not in self.stores[self.TXS]:
+            with self._dbs_lock:
+                dbs = list(self._dbs)
+            for db in dbs:
+                tx = db.get_transaction(tx_hash)
+                if tx and not isinstance(tx, PartialTransaction):
+                    self.stats[self.TXS]['db_hits'] += 1
+                    return tx.serialize()
+        return await self.get_or_fetch(self.TXS, tx_hash, fetch)
+
+    async def get_merkle(self, tx_hash: str, tx_height: int,
+                         fetch: Callable[[], Awaitable[dict]]) -> dict:
+        return await self.get_or_fetch(self.PROOFS, (tx_hash, tx_height),
+                                       fetch)
+
+    def remove_merkle(self, tx_hash: str):
+        store = self.stores[self.PROOFS]
+        for key in [k for k in store.items if k[0] == tx_hash]:
+            store.pop(key)
+
+    async def get_history(self, scripthash: str, status: Optional[str],
+                          fetch: Callable[[], Awaitable[list]]) -> list:
+        return await self.get_or_fetch(self.HISTORIES, (scripthash, status),
+                                       fetch)
+
+    def get_stats(self) -> dict:
+        res = {}
+        for kind, store in self.stores.items():
+            res[kind] = dict(self.stats[kind])
+            res[kind]['count'] = len(store)
+            res[kind]['size'] = store.size
+        with self._dbs_lock:
+            res['wallets'] = len(self._dbs)
+        return res
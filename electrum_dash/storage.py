@@ -30,9 +30,11 @@ import base64
 import random
 import time
 import zlib
+import struct
 from enum import IntEnum
 
 from . import ecc
+from .crypto import chacha20_poly1305_encrypt, chacha20_poly1305_decrypt
 from .util import (profiler, InvalidPassword, WalletFileException, bfh, standardize_path,
                    test_read_write_permissions)
 
@@ -52,6 +54,30 @@ class StorageEncryptionVersion(IntEnum):
     XPUB_PASSWORD = 2
 
 
+# Chunked storage encryption format (binary file):
+#   magic (4 bytes) + ephemeral pubkey (33 bytes), followed by records:
+#   type (1 byte) + ciphertext length (4 bytes, LE) + nonce (12 bytes) +
+#   chacha20_poly1305 ciphertext of zlib compressed plaintext chunk.
+# Record type is authenticated with the file header as associated data,
+# last record contains sha256 of all data record tags, to detect
+# truncated or reordered files.
+CHUNKED_ENC_MAGICS = {
+    StorageEncryptionVersion.USER_PASSWORD: b'BIC1',
+    StorageEncryptionVersion.XPUB_PASSWORD: b'BIC2',
+}
+CHUNKED_ENC_HEADER_SIZE = 4 + 33
+CHUNKED_ENC_RECORD_HEAD = struct.Struct('<BI12s')
+CHUNKED_ENC_DATA = 0
+CHUNKED_ENC_LAST = 1
+# Plaintext is cut into chunks of CHUNKED_ENC_CHUNK_SIZE characters on
+# average, at content defined boundaries: after an item separator if hash
+# of preceding characters matches. Boundaries do not depend on absolute
+# offsets, so insertion or removal of data changes only nearby chunks.
+CHUNKED_ENC_CHUNK_SIZE = 1 << 20  # plaintext characters
+CHUNKED_ENC_SEPARATOR = ', '
+CHUNKED_ENC_WINDOW = 64
+
+
 class StorageReadWriteError(Exception): pass
 
 
@@ -66,14 +92,27 @@ class WalletStorage(Logger):
         self.logger.info(f"wallet path {self.path}")
         self.pubkey = None
         self.decrypted = ''
+        self._chunked = False  # chunked AEAD encryption format is used
+        self._chunked_key = None  # (file header, symmetric key)
+        self._chunks = {}  # chunk hash -> (offset, size) of record in file
         try:
             test_read_write_permissions(self.path)
         except IOError as e:
             raise StorageReadWriteError(e) from e
         if self.file_exists():
-            with open(self.path, "r", encoding='utf-8') as f:
-                self.raw = f.read()
-            self._encryption_version = self._init_encryption_version()
+            with open(self.path, "rb") as f:
+                magic = f.read(4)
+            for enc_version, enc_magic in CHUNKED_ENC_MAGICS.items():
+                if magic == enc_magic:
+                    # file is read by chunks on decryption
+                    self.raw = ''
+                    self._chunked = True
+                    self._encryption_version = enc_version
+                    break
+            else:
+                with open(self.path, "r", encoding='utf-8') as f:
+                    self.raw = f.read()
+                self._encryption_version = self._init_encryption_version()
         else:
             self.raw = ''
             self._encryption_version = StorageEncryptionVersion.PLAINTEXT
@@ -98,12 +137,18 @@ class WalletStorage(Logger):
         return self.decrypted if self.is_encrypted() else self.raw
 
     def write(self, data: str) -> None:
-        s = self.encrypt_before_writing(data)
+        if self.pubkey and self._chunked:
+            write_func = lambda f: self._write_chunked(f, data)
+            open_kwargs = {'mode': 'wb'}
+        else:
+            s = self.encrypt_before_writing(data)
+            write_func = lambda f: f.write(s)
+            open_kwargs = {'mode': 'w', 'encoding': 'utf-8'}
         temp_path = "%s.tmp.%s" % (self.path, os.getpid())
         write_attempts = self.write_attempts
         while write_attempts > 0:
-            with open(temp_path, "w", encoding='utf-8') as f:
-                f.write(s)
+            with open(temp_path, **open_kwargs) as f:
+                written = write_func(f)
                 f.flush()
                 os.fsync(f.fileno())
 
@@ -128,6 +173,8 @@ class WalletStorage(Logger):
                                   f"left {write_attempts} write attempts")
                 continue
             os.chmod(self.path, mode)
+            if self.pubkey and self._chunked:
+                self._chunks = written
             self._file_exists = True
             self.logger.info(f"saved {self.path}")
             break
@@ -162,6 +209,9 @@ class WalletStorage(Logger):
         ECIES, private key derived from a password,
         1: password is provided by user
         2: password is derived from an xpub; used with hw wallets
+
+        Both 1 and 2 can be stored in legacy (single ECIES message)
+        or chunked AEAD format, see is_chunked_encryption
         """
         return self._encryption_version
 
@@ -196,7 +246,9 @@ class WalletStorage(Logger):
         if self.is_past_initial_decryption():
             return
         ec_key = self.get_eckey_from_password(password)
-        if self.raw:
+        if self._chunked:
+            s = self._decrypt_chunked(ec_key)
+        elif self.raw:
             enc_magic = self._get_encryption_magic()
             s = zlib.decompress(ec_key.decrypt_message(self.raw, enc_magic))
             s = s.decode('utf8')
@@ -216,6 +268,134 @@ class WalletStorage(Logger):
             s = s.decode('utf8')
         return s
 
+    def is_chunked_encryption(self) -> bool:
+        return self.is_encrypted() and self._chunked
+
+    @staticmethod
+    def _chunked_key_from_ecdh(ecdh_point: ecc.ECPubkey) -> bytes:
+        ecdh_key = ecdh_point.get_public_key_bytes(compressed=True)
+        return hashlib.sha256(b'storage chunked encryption' + ecdh_key).digest()
+
+    @staticmethod
+    def _encrypt_record(key, header, record_type, data) -> bytes:
+        nonce = os.urandom(12)
+        ciphertext = chacha20_poly1305_encrypt(
+            key=key, nonce=nonce, data=data,
+            associated_data=header + bytes([record_type]))
+        return (CHUNKED_ENC_RECORD_HEAD.pack(record_type, len(ciphertext), nonce)
+                + ciphertext)
+
+    @staticmethod
+    def _split_chunks(data: str):
+        '''Split data into chunks at content defined boundaries'''
+        size = CHUNKED_ENC_CHUNK_SIZE
+        min_size = size // 2
+        max_size = size * 4
+        sep = CHUNKED_ENC_SEPARATOR
+        data_len = len(data)
+        start = 0
+        while data_len - start > min_size:
+            prev = pos = start + min_size
+            end = min(start + max_size, data_len)
+            while True:
+                pos = data.find(sep, pos, end)
+                if pos < 0:
+                    pos = end
+                    break
+                pos += len(sep)
+                # cut probability is 2/size per character since previous
+                # separator, independent of separators density
+                window = data[max(start, pos-CHUNKED_ENC_WINDOW):pos].encode('utf8')
+                if zlib.crc32(window) % size < 2 * (pos - prev):
+                    break
+                prev = pos
+            yield data[start:pos]
+            start = pos
+        if start < data_len:
+            yield data[start:]
+
+    def _write_chunked(self, f, data: str) -> dict:
+        '''Write data to file f chunk by chunk, records of chunks not
+        changed since last read/write are copied from the current file'''
+        if self._chunked_key is None:
+            ephemeral = ecc.ECPrivkey.generate_random_key()
+            ecdh_point = ecc.ECPubkey(bfh(self.pubkey)) * ephemeral.secret_scalar
+            header = (CHUNKED_ENC_MAGICS[self._encryption_version]
+                      + ephemeral.get_public_key_bytes(compressed=True))
+            self._chunked_key = (header, self._chunked_key_from_ecdh(ecdh_point))
+            self._chunks = {}
+        header, key = self._chunked_key
+        f.write(header)
+        offset = len(header)
+        chunks = {}
+        tags_hash = hashlib.sha256()
+        old_f = open(self.path, 'rb') if self._chunks else None
+        try:
+            for chunk in self._split_chunks(data):
+                chunk = chunk.encode('utf8')
+                chunk_hash = hashlib.sha256(chunk).digest()
+                old_record = self._chunks.get(chunk_hash)
+                if old_record is not None:
+                    old_offset, size = old_record
+                    old_f.seek(old_offset)
+                    record = old_f.read(size)
+                else:
+                    chunk = zlib.compress(chunk, level=zlib.Z_BEST_SPEED)
+                    record = self._encrypt_record(key, header,
+                                                  CHUNKED_ENC_DATA, chunk)
+                f.write(record)
+                chunks[chunk_hash] = (offset, len(record))
+                offset += len(record)
+                tags_hash.update(record[-16:])
+        finally:
+            if old_f:
+                old_f.close()
+        f.write(self._encrypt_record(key, header, CHUNKED_ENC_LAST,
+                                     tags_hash.digest()))
+        return chunks
+
+    def _decrypt_chunked(self, ec_key: ecc.ECPrivkey) -> str:
+        parts = []
+        chunks = {}
+        tags_hash = hashlib.sha256()
+        with open(self.path, 'rb') as f:
+            header = f.read(CHUNKED_ENC_HEADER_SIZE)
+            try:
+                ephemeral = ecc.ECPubkey(header[4:])
+            except Exception as e:
+                raise WalletFileException('invalid wallet file header') from e
+            key = self._chunked_key_from_ecdh(ephemeral * ec_key.secret_scalar)
+            offset = len(header)
+            while True:
+                head = f.read(CHUNKED_ENC_RECORD_HEAD.size)
+                if len(head) < CHUNKED_ENC_RECORD_HEAD.size:
+                    raise WalletFileException('wallet file is truncated')
+                record_type, size, nonce = CHUNKED_ENC_RECORD_HEAD.unpack(head)
+                ciphertext = f.read(size)
+                if len(ciphertext) < size:
+                    raise WalletFileException('wallet file is truncated')
+                try:
+                    data = chacha20_poly1305_decrypt(
+                        key=key, nonce=nonce, data=ciphertext,
+                        associated_data=header + bytes([record_type]))
+                except ValueError:
+                    if offset == len(header):
+                        raise InvalidPassword()
+                    raise WalletFileException('wallet file is corrupted')
+                if record_type == CHUNKED_ENC_LAST:
+                    if data != tags_hash.digest() or f.read(1):
+                        raise WalletFileException('wallet file is corrupted')
+                    break
+                chunk = zlib.decompress(data)
+                record_size = len(head) + size
+                chunks[hashlib.sha256(chunk).digest()] = (offset, record_size)
+                offset += record_size
+                tags_hash.update(ciphertext[-16:])
+                parts.append(chunk.decode('utf8'))
+        self._chunked_key = (header, key)
+        self._chunks = chunks
+        return ''.join(parts)
+
     def check_password(self, password) -> None:
         """Raises an InvalidPassword exception on invalid password"""
         if not self.is_encrypted():
@@ -226,19 +406,29 @@ class WalletStorage(Logger):
         if self.pubkey != self.get_eckey_from_password(password).get_public_key_hex():
             raise InvalidPassword()
 
-    def set_password(self, password, enc_version=None):
-        """Set a password to be used for encrypting this storage."""
+    def set_password(self, password, enc_version=None, *, chunked=None):
+        """Set a password to be used for encrypting this storage.
+
+        'chunked': switch to (True) or from (False) chunked format,
+        by default current format of the file is kept.
+        """
         if not self.is_past_initial_decryption():
             raise Exception("storage needs to be decrypted before changing password")
         if enc_version is None:
             enc_version = self._encryption_version
+        if chunked is None:
+            chunked = self._chunked
+        self._chunked_key = None
+        self._chunks = {}
         if password and enc_version != StorageEncryptionVersion.PLAINTEXT:
             ec_key = self.get_eckey_from_password(password)
             self.pubkey = ec_key.get_public_key_hex()
             self._encryption_version = enc_version
+            self._chunked = bool(chunked)
         else:
             self.pubkey = None
             self._encryption_version = StorageEncryptionVersion.PLAINTEXT
+            self._chunked = False
 
     def basename(self) -> str:
         return os.path.basename(self.path)
@@ -187,9 +187,18 @@ class Synchronizer(SynchronizerBase):
         self.requested_histories.add((addr, status))
         self._stale_histories.pop(addr, asyncio.Future()).cancel()
         h = address_to_scripthash(addr)
+        cache = self.network.shared_cache
+
+        async def fetch_history():
+            async with self._network_request_semaphore:
+                res = await self.interface.get_history_for_scripthash(h)
+            hist = [(item['tx_hash'], item['height']) for item in res]
+            if history_status(hist) == status:
+                cache.put(cache.HISTORIES, (h, status), res)
+            return res
+
         self._requests_sent += 1
-        async with self._network_request_semaphore:
-            result = await self.interface.get_history_for_scripthash(h)
+        result = await cache.get_history(h, status, fetch_history)
         self._requests_answered += 1
         self.logger.info(f"receiving history {addr} {len(result)}")
         hist = list(map(lambda item: (item['tx_hash'], item['height']), result))
@@ -235,10 +244,17 @@ class Synchronizer(SynchronizerBase):
                 await group.spawn(self._get_transaction(tx_hash, allow_server_not_finding_tx=allow_server_not_finding_tx))
 
     async def _get_transaction(self, tx_hash, *, allow_server_not_finding_tx=False):
-        self._requests_sent += 1
-        try:
+        cache = self.network.shared_cache
+
+        async def fetch_tx():
             async with self._network_request_semaphore:
                 raw_tx = await self.interface.get_transaction(tx_hash)
+            cache.put(cache.TXS, tx_hash, raw_tx)  # txid checked by interface
+            return raw_tx
+
+        self._requests_sent += 1
+        try:
+            raw_tx = await cache.get_transaction(tx_hash, fetch_tx)
         except RPCError as e:
             # most likely, "No such mempool or blockchain transaction"
             if allow_server_not_finding_tx:
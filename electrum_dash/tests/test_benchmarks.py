@@ -0,0 +1,464 @@
+import ast
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from ipaddress import ip_address
+
+from electrum_dash.bitcoin import int_to_hex, var_int
+from electrum_dash.coinchooser import CoinChooserPrivateSend
+from electrum_dash.crypto import sha256d
+from electrum_dash.dash_msg import DashCmd, DashSMLEntry
+from electrum_dash.dash_ps_util import PS_DENOMS_VALS
+from electrum_dash.dash_tx import serialize_extra_payload, to_varbytes
+from electrum_dash.ecc import (ECPrivkey, ECC_MAX_WORKERS, verify_many,
+                               verify_signature)
+from electrum_dash.logging import get_logger
+from electrum_dash.storage import WalletStorage, StorageEncryptionVersion
+from electrum_dash.transaction import (PartialTransaction, PartialTxInput,
+                                       PartialTxOutput, TxOutpoint,
+                                       Transaction, BCDataStream,
+                                       SIGN_PARALLEL_MIN_INPUTS)
+from electrum_dash.util import bfh, bh2u, is_hex_str
+
+from . import TestCaseForTestnet
+
+
+_logger = get_logger(__name__)
+
+
+def bench(func, *args, repeat=1, **kwargs):
+    '''Run func repeat times, return (result, secs per run)'''
+    start = time.perf_counter()
+    for i in range(repeat):
+        res = func(*args, **kwargs)
+    return res, (time.perf_counter() - start) / repeat
+
+
+def load_tx_vectors(*test_modules):
+    '''Collect raw txs from string literals of test modules which are
+    deserialized and serialized back unchanged'''
+    res = []
+    tests_dir = os.path.dirname(__file__)
+    for test_module in test_modules:
+        with open(os.path.join(tests_dir, f'{test_module}.py')) as fd:
+            tree = ast.parse(fd.read())
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Constant):
+                continue
+            raw = node.value
+            if not isinstance(raw, str) or not is_hex_str(raw):
+                continue
+            try:
+                tx = Transaction(raw)
+                if tx.serialize_to_network() != raw:
+                    continue
+            except Exception:
+                continue
+            res.append(raw)
+    return res
+
+
+def reference_serialize_preimage(tx, txin_index):
+    '''Sighash preimage built as hex from all inputs and outputs'''
+    nLocktime = int_to_hex(tx.locktime, 4)
+    inputs = tx.inputs()
+    outputs = tx.outputs()
+    nHashType = int_to_hex(1, 4)
+    preimage_script = tx.get_preimage_script(inputs[txin_index])
+    txins = var_int(len(inputs)) + ''.join(
+        tx.serialize_input(txin, preimage_script if txin_index == k else '')
+        for k, txin in enumerate(inputs))
+    txouts = var_int(len(outputs)) + ''.join(o.serialize_to_network().hex()
+                                             for o in outputs)
+    if tx.tx_type:
+        uVersion = int_to_hex(tx.version, 2)
+        uTxType = int_to_hex(tx.tx_type, 2)
+        vExtra = bh2u(to_varbytes(serialize_extra_payload(tx)))
+        return (uVersion + uTxType + txins + txouts + nLocktime
+                + vExtra + nHashType)
+    nVersion = int_to_hex(tx.version, 4)
+    return nVersion + txins + txouts + nLocktime + nHashType
+
+
+class TestSighashBenchmark(TestCaseForTestnet):
+
+    privkey = bfh('a' * 64)
+
+    def make_tx(self, inputs_cnt):
+        eckey = ECPrivkey(self.privkey)
+        pubkey = eckey.get_public_key_bytes(compressed=True)
+        inputs = []
+        for i in range(inputs_cnt):
+            prevout = TxOutpoint(txid=sha256d(i.to_bytes(4, 'little')),
+                                 out_idx=i % 3)
+            txin = PartialTxInput(prevout=prevout)
+            txin.script_type = 'p2pkh'
+            txin.pubkeys = [pubkey]
+            txin.num_sig = 1
+            txin._trusted_value_sats = 100001
+            inputs.append(txin)
+        outputs = [PartialTxOutput.from_address_and_value(
+            'yUyx5hJsEwAukTdRy7UihU57rC37Y4y2ZX', 100000 * inputs_cnt)]
+        return PartialTransaction.from_io(inputs, outputs, locktime=1000)
+
+    def test_preimage_hash(self):
+        for inputs_cnt in [1, 100, 1000]:
+            tx = self.make_tx(inputs_cnt)
+            shared = tx._calc_shared_txdigest_fields()
+            for i in {0, inputs_cnt // 2, inputs_cnt - 1}:
+                ref = reference_serialize_preimage(tx, i)
+                assert tx.serialize_preimage(i) == ref
+                assert tx.preimage_hash(i) == sha256d(bfh(ref))
+                assert (tx.preimage_hash(i, shared_txdigest_fields=shared)
+                        == sha256d(bfh(ref)))
+
+    def test_sign(self):
+        keypairs = {ECPrivkey(self.privkey).get_public_key_hex():
+                    (self.privkey, True)}
+        for inputs_cnt in [1, 100, 1000]:
+            tx = self.make_tx(inputs_cnt)
+            ref_tx = self.make_tx(inputs_cnt)
+            shared = tx._calc_shared_txdigest_fields()
+
+            def ref_hashes():
+                return [sha256d(bfh(reference_serialize_preimage(ref_tx, i)))
+                        for i in range(inputs_cnt)]
+
+            def hashes():
+                return [tx.preimage_hash(i, shared_txdigest_fields=shared)
+                        for i in range(inputs_cnt)]
+
+            ref_res, ref_secs = bench(ref_hashes)
+            res, secs = bench(hashes)
+            assert res == ref_res
+
+            signed, sign_secs = bench(tx.sign, keypairs)
+            assert signed == inputs_cnt
+            assert tx.is_complete()
+            _logger.info(f'sighash preimages of {inputs_cnt} inputs:'
+                         f' reference {ref_secs:.4f}s, shared {secs:.4f}s,'
+                         f' sign {sign_secs:.4f}s')
+
+    def test_sign_parallel(self):
+        keypairs = {ECPrivkey(self.privkey).get_public_key_hex():
+                    (self.privkey, True)}
+        for inputs_cnt in [1, SIGN_PARALLEL_MIN_INPUTS, 100, 1000]:
+            tx = self.make_tx(inputs_cnt)
+            signed, secs = bench(tx.sign, keypairs)
+            assert signed == inputs_cnt
+
+            parallel_tx = self.make_tx(inputs_cnt)
+            signed, parallel_secs = bench(parallel_tx.sign, keypairs,
+                                          parallel=True)
+            assert signed == inputs_cnt
+            assert parallel_tx.is_complete()
+            assert parallel_tx.serialize() == tx.serialize()
+            # already signed inputs are skipped
+            assert parallel_tx.sign(keypairs, parallel=True) == 0
+            _logger.info(f'sign {inputs_cnt} inputs: serial {secs:.4f}s,'
+                         f' parallel {parallel_secs:.4f}s'
+                         f' ({ECC_MAX_WORKERS} workers)')
+
+
+class TestVerifyManyBenchmark(TestCaseForTestnet):
+
+    def test_verify_many(self):
+        items_cnt = 1000
+        eckeys = [ECPrivkey(sha256d(bytes([i]))) for i in range(10)]
+        items = []
+        for i in range(items_cnt):
+            eckey = eckeys[i % len(eckeys)]
+            msg_hash = sha256d(i.to_bytes(4, 'little'))
+            sig = eckey.sign(msg_hash)
+            if i % 7 == 0:
+                msg_hash = sha256d(msg_hash)
+            items.append((eckey.get_public_key_bytes(), sig, msg_hash))
+
+        ref_res, ref_secs = bench(
+            lambda: [verify_signature(*item) for item in items], repeat=3)
+        res, secs = bench(verify_many, items, repeat=3)
+        assert res == ref_res
+        assert res.count(False) == len(range(0, items_cnt, 7))
+        _logger.info(f'verify {items_cnt} signatures: single {ref_secs:.4f}s,'
+                     f' verify_many {secs:.4f}s ({ECC_MAX_WORKERS} workers)')
+
+
+class TestTxSerializationBenchmark(TestCaseForTestnet):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.raw_txs = load_tx_vectors('test_transaction', 'test_dash_tx')
+        cls.raw_txs_bytes = [bfh(raw) for raw in cls.raw_txs]
+
+    def bench_all(self, name, func, raws, repeat=20):
+        res, secs = bench(lambda: [func(raw) for raw in raws], repeat=repeat)
+        _logger.info(f'{name}: {len(raws)} txs {secs*1000:.3f}ms')
+        return res
+
+    def test_vectors(self):
+        assert len(self.raw_txs) > 50
+        for raw, raw_bytes in zip(self.raw_txs, self.raw_txs_bytes):
+            tx = Transaction(raw_bytes)
+            assert tx.serialize() == raw
+            assert tx.serialize_as_bytes() == raw_bytes
+            tx.inputs()
+            tx.invalidate_ser_cache()
+            assert tx.serialize_to_network_bytes() == raw_bytes
+            assert tx.txid() == sha256d(raw_bytes)[::-1].hex()
+
+    def test_benchmark(self):
+        def parse(raw):
+            tx = Transaction(raw)
+            tx.inputs()
+            return tx
+
+        def txid(raw):
+            return parse(raw).txid()
+
+        def reserialize(raw):
+            tx = parse(raw)
+            tx.invalidate_ser_cache()
+            return tx.serialize_as_bytes()
+
+        self.bench_all('parse hex', parse, self.raw_txs)
+        self.bench_all('parse bytes', parse, self.raw_txs_bytes)
+        txids = self.bench_all('parse and txid', txid, self.raw_txs_bytes)
+        assert txids == [sha256d(raw)[::-1].hex()
+                         for raw in self.raw_txs_bytes]
+        res = self.bench_all('parse and serialize', reserialize,
+                             self.raw_txs_bytes)
+        assert res == self.raw_txs_bytes
+
+
+class TestBCDataStreamBenchmark(TestCaseForTestnet):
+
+    COINBASE_TX = ('01000000010000000000000000000000000000000000000000000000'
+                   '000000000000000000ffffffff25033ca0030400001256124d696e65'
+                   '6420627920425443204775696c640800000d41000007daffffffff01'
+                   'c00d1298000000001976a91427a1f12771de5cc3b73941664b2537c1'
+                   '5316be4388ac00000000')
+
+    def make_mnlistdiff(self, mns_cnt):
+        s = BCDataStream()
+        s.write_uint16(1)                           # version
+        s.write(b'\x01'*32 + b'\x02'*32)            # baseBlockHash, blockHash
+        s.write_uint32(1)                           # totalTransactions
+        s.write_compact_size(1)                     # merkleHashes
+        s.write(b'\x03'*32)
+        s.write_compact_size(1)                     # merkleFlags
+        s.write(b'\x01')
+        s.write(bfh(self.COINBASE_TX))               # cbTx
+        s.write_compact_size(0)                     # deletedMNs
+        s.write_compact_size(mns_cnt)               # mnList
+        for i in range(mns_cnt):
+            sml_entry = DashSMLEntry(1, i.to_bytes(32, 'little'), b'\x05'*32,
+                                     ip_address('127.0.0.1'), 9999,
+                                     b'\x06'*48, b'\x07'*20, 1,
+                                     None, None, None)
+            s.write(sml_entry.serialize(include_version=True))
+        return bytes(s.input)
+
+    def test_parse_mnlistdiff(self):
+        mns_cnt = 13000
+        payload = self.make_mnlistdiff(mns_cnt)
+        assert len(payload) > 1900000
+
+        tracemalloc.start()
+        try:
+            diff, secs = bench(DashCmd, 'mnlistdiff', payload)
+            size, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        diff = diff.payload
+        assert len(diff.mnList) == mns_cnt
+        assert diff.mnList[-1].proRegTxHash == (mns_cnt-1).to_bytes(32, 'little')
+        assert diff.cbTx.txid() == sha256d(bfh(self.COINBASE_TX))[::-1].hex()
+        _logger.info(f'parse mnlistdiff of {len(payload)} bytes:'
+                     f' {secs:.4f}s, traced memory {size/1e6:.2f}MB,'
+                     f' peak {peak/1e6:.2f}MB')
+
+        diff, secs = bench(DashCmd, 'mnlistdiff', payload, repeat=3)
+        _logger.info(f'parse mnlistdiff of {len(payload)} bytes:'
+                     f' {secs:.4f}s')
+
+
+def reference_ps_select_tx(coins, outputs, fee_estimator_vb, min_rounds):
+    '''Spend PS coins selection which builds tx for each candidate'''
+    base_tx = PartialTransaction.from_io([], outputs[:])
+    spent_amount = base_tx.output_value()
+    all_coins = [c for c in coins if c.ps_rounds >= min_rounds]
+    max_rounds = max([c.ps_rounds for c in all_coins])
+    res = []
+    for use_repeated_txids in [False, True]:
+        for use_ps_rounds in range(min_rounds, max_rounds + 1):
+            sel_coins = [c for c in all_coins if c.ps_rounds <= use_ps_rounds]
+            if not use_repeated_txids:
+                used_txids = []
+                unique_coins = []
+                for c in sel_coins:
+                    txid = c.prevout.txid.hex()
+                    if txid not in used_txids:
+                        used_txids.append(txid)
+                        unique_coins.append(c)
+                sel_coins = unique_coins
+            if sum([c.value_sats() for c in sel_coins]) < spent_amount:
+                continue
+            sel_coins = sorted(sel_coins, key=lambda x: x.value_sats(),
+                               reverse=True)
+            selected = []
+            skip_value = inputs_val = 0
+            for c in sel_coins:
+                val = c.value_sats()
+                if val == skip_value:
+                    continue
+                if inputs_val + val <= spent_amount:
+                    inputs_val += val
+                    selected.append(c)
+                    continue
+                tx = PartialTransaction.from_io([], outputs[:])
+                tx.add_inputs(selected + [c])
+                estimated_fee = fee_estimator_vb(tx.estimated_size())
+                fee = tx.input_value() - spent_amount
+                if fee < estimated_fee:
+                    inputs_val += val
+                    selected.append(c)
+                    continue
+                res.append((fee, use_ps_rounds, use_repeated_txids, tx))
+                if fee - estimated_fee >= PS_DENOMS_VALS[0]:
+                    skip_value = val
+                else:
+                    break
+    res = sorted(res, key=lambda x: x[:3])
+    return res[0][3]
+
+
+class FakePSManager:
+
+    limit_spend_fee = False
+
+
+class TestPSCoinChooserBenchmark(TestCaseForTestnet):
+
+    def make_denoms(self, denoms_cnt, denoms_vals=PS_DENOMS_VALS):
+        eckey = ECPrivkey(bfh('b' * 64))
+        pubkey = eckey.get_public_key_bytes(compressed=True)
+        rand = random.Random(1)
+        coins = []
+        for i in range(denoms_cnt):
+            txid = sha256d(rand.randrange(denoms_cnt // 3).to_bytes(4, 'little'))
+            txin = PartialTxInput(prevout=TxOutpoint(txid=txid, out_idx=i))
+            txin.script_type = 'p2pkh'
+            txin.pubkeys = [pubkey]
+            txin.num_sig = 1
+            txin._trusted_value_sats = rand.choice(denoms_vals)
+            txin.ps_rounds = rand.randrange(2, 8)
+            coins.append(txin)
+        return coins
+
+    def test_make_tx(self):
+        psman = FakePSManager()
+        fee_estimator_vb = lambda size: size
+
+        coins = self.make_denoms(5000)
+        amounts = [12345, 7654321, 1234567890, 9876543210]
+        small_coins = self.make_denoms(5000, PS_DENOMS_VALS[:2])
+        small_amounts = [123456, 5432109, 23456789]
+        for coins, amount in itertools.chain(
+                zip([coins]*len(amounts), amounts),
+                zip([small_coins]*len(small_amounts), small_amounts)):
+            outputs = [PartialTxOutput.from_address_and_value(
+                'yUyx5hJsEwAukTdRy7UihU57rC37Y4y2ZX', amount)]
+            ref_tx, ref_secs = bench(reference_ps_select_tx, coins, outputs,
+                                     fee_estimator_vb, 2)
+            chooser = CoinChooserPrivateSend(psman)
+            tx, secs = bench(lambda: chooser.make_tx(
+                coins=coins, outputs=outputs,
+                fee_estimator_vb=fee_estimator_vb, min_rounds=2))
+            assert tx.serialize() == ref_tx.serialize()
+            assert tx.get_fee() >= tx.estimated_size()
+            _logger.info(f'spend {amount} from {len(coins)} PS denoms:'
+                         f' reference {ref_secs:.4f}s, indexed {secs:.4f}s')
+
+
+class TestStorageEncryptionBenchmark(TestCaseForTestnet):
+
+    def test_write_read(self):
+        rand = random.Random(1)
+        data = json.dumps({rand.randbytes(32).hex(): [rand.randbytes(40).hex(), i]
+                           for i in range(30000)})
+        changed_data = data[:-10] + 'x' * 10
+        for chunked in (False, True):
+            path = os.path.join(self.electrum_path, f'wallet_{chunked}')
+            storage = WalletStorage(path)
+            storage.set_password('pw', StorageEncryptionVersion.USER_PASSWORD,
+                                 chunked=chunked)
+            tracemalloc.start()
+            _, write_secs = bench(storage.write, data)
+            write_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            _, rewrite_secs = bench(storage.write, changed_data)
+            storage = WalletStorage(path)
+            assert storage.is_chunked_encryption() == chunked
+            _, read_secs = bench(storage.decrypt, 'pw')
+            assert storage.read() == changed_data
+            _logger.info(f'storage encryption chunked={chunked},'
+                         f' {len(data)} chars: write {write_secs:.4f}s'
+                         f' (peak {write_peak // 1024} KiB),'
+                         f' rewrite {rewrite_secs:.4f}s, read {read_secs:.4f}s')
+
+
+def import_times(imports):
+    '''Run imports in new interpreter with -X importtime, return
+    (total secs, loaded modules, {module: self import time in secs})'''
+    package_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    code = (f'import sys, time; start = time.perf_counter(); {imports};'
+            f' print(time.perf_counter() - start);'
+            f' print(" ".join(sys.modules))')
+    res = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                         cwd=package_dir, capture_output=True, text=True,
+                         check=True)
+    total, modules = res.stdout.splitlines()
+    times = {}
+    for line in res.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, module = line[12:].split('|')
+        if self_us.strip() == 'self [us]':
+            continue
+        times[module.strip()] = int(self_us) / 1e6
+    return float(total), set(modules.split()), times
+
+
+class TestImportTimeBenchmark(TestCaseForTestnet):
+
+    # modules used by command line client to send command to daemon
+    CLI_CLIENT_IMPORTS = ('import electrum_dash.commands, electrum_dash.daemon,'
+                          ' electrum_dash.storage')
+    # subsystems which should be loaded on first use only
+    LAZY_MODULES = ['electrum_dash.network', 'electrum_dash.wallet',
+                    'electrum_dash.dash_ps', 'electrum_dash.dash_net',
+                    'electrum_dash.protx_list', 'electrum_dash.blspy_wrapper',
+                    'electrum_dash.exchange_rate', 'electrum_dash.interface',
+                    'qrcode']
+    IMPORT_TIME_BUDGET = 2.0  # seconds, ~0.35s measured
+
+    def test_cli_client_import_time(self):
+        total, modules, times = import_times(self.CLI_CLIENT_IMPORTS)
+        eagerly_imported = [m for m in self.LAZY_MODULES if m in modules]
+        assert not eagerly_imported, eagerly_imported
+        slowest = sorted(times.items(), key=lambda x: -x[1])[:5]
+        _logger.info(f'cli client imports: {total:.3f}s, slowest: '
+                     + ', '.join(f'{m} {t:.3f}s' for m, t in slowest))
+        assert total < self.IMPORT_TIME_BUDGET, total
+
+        # full package still loads on first use
+        total, modules, times = import_times('import electrum_dash;'
+                                             ' electrum_dash.Wallet')
+        assert 'electrum_dash.wallet' in modules
+        _logger.info(f'electrum_dash.Wallet import: {total:.3f}s')
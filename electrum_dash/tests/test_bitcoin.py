@@ -1,5 +1,6 @@
 import base64
 import sys
+from unittest import mock
 
 from electrum_dash.bitcoin import (public_key_to_p2pkh, address_from_private_key,
                                    is_address, is_private_key,
@@ -219,6 +220,39 @@ class Test_bitcoin(ElectrumTestCase):
         sig2 = eckey2.sign_transaction(bfh('642a2e66332f507c92bda910158dfe46fc10afbf72218764899d3af99a043fac'))
         self.assertEqual('30440220618513f4cfc87dde798ce5febae7634c23e7b9254a1eabf486be820f6a7c2c4702204fef459393a2b931f949e63ced06888f35e286e446dc46feb24b5b5f81c6ed52', sig2.hex())
 
+    def test_verify_many(self):
+        eckey1 = ecc.ECPrivkey(bfh('7e1255fddb52db1729fc3ceb21a46f95b8d9fe94cc83425e936a6c5223bb679d'))
+        eckey2 = ecc.ECPrivkey(bfh('c7ce8c1462c311eec24dff9e2532ac6241e50ae57e7d1833af21942136972f23'))
+        pubkey1 = eckey1.get_public_key_bytes(compressed=True)
+        pubkey2 = eckey2.get_public_key_bytes(compressed=False)
+        h1 = bfh('5a548b12369a53faaa7e51b5081829474ebdd9c924b3a8230b69aa0be254cd94')
+        h2 = bfh('642a2e66332f507c92bda910158dfe46fc10afbf72218764899d3af99a043fac')
+        sig1 = eckey1.sign(h1)
+        sig2 = eckey2.sign(h2)
+        r, s = ecc.get_r_and_s_from_sig_string(sig1)
+        sig1_high_s = ecc.sig_string_from_r_and_s(r, ecc.CURVE_ORDER - s)
+        items = [
+            (pubkey1, sig1, h1),
+            (pubkey2, sig2, h2),
+            (pubkey1, sig1, h2),            # wrong msg hash
+            (pubkey2, sig1, h1),            # wrong pubkey
+            (pubkey1, sig1_high_s, h1),     # normalized
+            (b'\x02' + b'\x00'*32, sig1, h1),  # invalid pubkey
+            (pubkey1, b'\xff'*64, h1),      # invalid sig
+            (pubkey1, sig1[:-1], h1),       # wrong sig length
+            (pubkey1, sig1, h1[:-1]),       # wrong msg hash length
+        ]
+        expected = [True, True, False, False, True,
+                    False, False, False, False]
+        self.assertEqual(expected, ecc.verify_many(items))
+        self.assertEqual(expected, [ecc.verify_signature(*item)
+                                    for item in items])
+        self.assertEqual([], ecc.verify_many([]))
+        many_items = items * ecc.VERIFY_PARALLEL_MIN_ITEMS
+        with mock.patch.object(ecc, 'ECC_MAX_WORKERS', 4):
+            self.assertEqual(expected * ecc.VERIFY_PARALLEL_MIN_ITEMS,
+                             ecc.verify_many(many_items))
+
     @needs_test_with_all_aes_implementations
     def test_aes_homomorphic(self):
         """Make sure AES is homomorphic."""
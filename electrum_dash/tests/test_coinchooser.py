@@ -1,7 +1,30 @@
-from electrum_dash.coinchooser import CoinChooserPrivacy
+from electrum_dash.bitcoin import pubkey_to_address
+from electrum_dash.coinchooser import (CoinChooserPrivacy, CoinChooserBnB,
+                                       COIN_CHOOSERS, BucketArrays)
+from electrum_dash.crypto import sha256d
+from electrum_dash.ecc import ECPrivkey
+from electrum_dash.transaction import (PartialTransaction, PartialTxInput,
+                                       PartialTxOutput, TxOutpoint)
 from electrum_dash.util import NotEnoughFunds
 
-from . import ElectrumTestCase
+from . import ElectrumTestCase, TestCaseForTestnet
+
+
+def make_coins(values, block_height=100):
+    coins = []
+    for i, value in enumerate(values):
+        eckey = ECPrivkey(sha256d(i.to_bytes(4, 'little')))
+        pubkey = eckey.get_public_key_bytes(compressed=True)
+        prevout = TxOutpoint(txid=sha256d(bytes([i % 256])*4), out_idx=i)
+        txin = PartialTxInput(prevout=prevout)
+        txin.script_type = 'p2pkh'
+        txin.pubkeys = [pubkey]
+        txin.num_sig = 1
+        txin.block_height = block_height
+        txin._trusted_value_sats = value
+        txin._trusted_address = pubkey_to_address('p2pkh', pubkey.hex())
+        coins.append(txin)
+    return coins
 
 
 class TestCoinChooser(ElectrumTestCase):
@@ -18,3 +41,67 @@ class TestCoinChooser(ElectrumTestCase):
             coin_chooser.bucket_candidates_any([], sufficient_funds)
         with self.assertRaises(NotEnoughFunds):
             coin_chooser.bucket_candidates_prefer_confirmed([], sufficient_funds)
+
+    def test_bucket_arrays(self):
+        coin_chooser = CoinChooserPrivacy(enable_output_value_rounding=False)
+        coins = make_coins([1000, 2000, 3000])
+        coins[1].ps_rounds = 2
+        coins[2].ps_rounds = -1  # ps_collateral
+        buckets = coin_chooser.bucketize_coins(coins, fee_estimator_vb=lambda s: s)
+        arrays = BucketArrays(buckets)
+        self.assertEqual([0, 1, 2], arrays.get_indexes(buckets))
+        self.assertEqual([2, 0], arrays.get_indexes(buckets[2:] + buckets[:1]))
+        self.assertEqual(4000, arrays.value([0, 2]))
+        self.assertEqual(buckets[0].weight + buckets[1].weight, arrays.weight([0, 1]))
+        self.assertEqual(-1, arrays.max_max_rounds([]))
+        self.assertEqual(-1, arrays.max_max_rounds([0]))
+        self.assertEqual(2, arrays.max_max_rounds([0, 1]))
+        self.assertEqual(1e9 + 1, arrays.max_max_rounds([1, 2]))
+
+
+class TestCoinChooserBnB(TestCaseForTestnet):
+
+    ADDR = 'yUyx5hJsEwAukTdRy7UihU57rC37Y4y2ZX'
+    DUST = 546
+
+    def make_tx(self, chooser, coins, amount):
+        outputs = [PartialTxOutput.from_address_and_value(self.ADDR, amount)]
+        return chooser.make_tx(coins=coins, inputs=[], outputs=outputs,
+                               change_addrs=[self.ADDR],
+                               fee_estimator_vb=lambda size: size,
+                               dust_threshold=self.DUST)
+
+    def test_changeless(self):
+        assert COIN_CHOOSERS['BranchAndBound'] == CoinChooserBnB
+        values = [110000, 230000, 370000, 410000, 530000, 670000, 790000]
+        coins = make_coins(values)
+        chooser = CoinChooserBnB(enable_output_value_rounding=False)
+        for excess in [0, 100, self.DUST]:
+            # exact amount for 370000 + 530000 inputs
+            outputs = [PartialTxOutput.from_address_and_value(self.ADDR, 0)]
+            tx = PartialTransaction.from_io(coins[2:3] + coins[4:5], outputs)
+            amount = 900000 - tx.estimated_size() - excess
+            tx = self.make_tx(chooser, coins, amount)
+            assert len(tx.outputs()) == 1
+            fee = tx.get_fee()
+            assert tx.estimated_size() <= fee < tx.estimated_size() + 2*self.DUST
+            assert tx.input_value() == 900000 or excess > 0
+
+    def test_fallback(self):
+        values = [110000, 230000, 370000]
+        chooser = CoinChooserBnB(enable_output_value_rounding=False)
+        privacy_chooser = CoinChooserPrivacy(enable_output_value_rounding=False)
+        tx = self.make_tx(chooser, make_coins(values), 300000)
+        ref_tx = self.make_tx(privacy_chooser, make_coins(values), 300000)
+        assert len(tx.outputs()) == 2
+        assert tx.serialize() == ref_tx.serialize()
+        with self.assertRaises(NotEnoughFunds):
+            self.make_tx(chooser, make_coins(values), 800000)
+
+    def test_many_coins(self):
+        values = [100000 + 1237*i for i in range(2000)]
+        coins = make_coins(values)
+        chooser = CoinChooserBnB(enable_output_value_rounding=False)
+        tx = self.make_tx(chooser, coins, 1000000)
+        assert tx.input_value() - tx.output_value() >= tx.estimated_size()
+        assert tx.output_value() >= 1000000
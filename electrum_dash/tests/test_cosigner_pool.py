@@ -0,0 +1,164 @@
+import asyncio
+import threading
+from xmlrpc.server import SimpleXMLRPCServer
+
+from electrum_dash.plugins.cosigner_pool.cosigner_pool import (
+    CosignerPoolServer, Listener)
+from electrum_dash.util import create_and_start_event_loop
+
+from . import ElectrumTestCase
+
+
+class LocalCosignerPool:
+    '''Stand-in cosigner pool XML-RPC server'''
+
+    def __init__(self, *, multicall=True, multicall_http_error=False):
+        self.messages = {}
+        self.requests_cnt = 0
+        self.server = SimpleXMLRPCServer(('127.0.0.1', 0), allow_none=True,
+                                         logRequests=False)
+        self.server.register_function(self.get, 'get')
+        self.server.register_function(self.put, 'put')
+        self.server.register_function(self.delete, 'delete')
+        if multicall:
+            self.server.register_multicall_functions()
+        self.server._dispatch = self.count_dispatch(self.server._dispatch)
+        if multicall_http_error:
+            # request handler responds with HTTP 500 on exception
+            self.server._marshaled_dispatch = self.reject_multicall(
+                self.server._marshaled_dispatch)
+        host, port = self.server.server_address
+        self.url = f'http://{host}:{port}/'
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def count_dispatch(self, dispatch):
+        def _dispatch(method, params):
+            if method != 'get' or not self.multicall_active:
+                self.requests_cnt += 1
+            return dispatch(method, params)
+        return _dispatch
+
+    def reject_multicall(self, marshaled_dispatch):
+        def _marshaled_dispatch(data, *args, **kwargs):
+            if b'system.multicall' in data:
+                self.requests_cnt += 1
+                raise Exception('multicall rejected')
+            return marshaled_dispatch(data, *args, **kwargs)
+        return _marshaled_dispatch
+
+    @property
+    def multicall_active(self):
+        return 'system.multicall' in self.server.funcs
+
+    def get(self, keyhash):
+        return self.messages.get(keyhash)
+
+    def put(self, keyhash, message):
+        self.messages[keyhash] = message
+
+    def delete(self, keyhash):
+        self.messages.pop(keyhash, None)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+class TestCosignerPool(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.asyncio_loop, self._stop_loop, self._loop_thread = create_and_start_event_loop()
+
+    def tearDown(self):
+        super().tearDown()
+        self.asyncio_loop.call_soon_threadsafe(self._stop_loop.set_result, 1)
+        self._loop_thread.join(timeout=1)
+
+    def run_coro(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.asyncio_loop).result()
+
+    def test_get_many(self):
+        for multicall in [True, False]:
+            pool = LocalCosignerPool(multicall=multicall)
+            try:
+                server = CosignerPoolServer(pool.url)
+                self.run_coro(server.put_many([('k1', 'm1'), ('k3', 'm3')]))
+                pool.requests_cnt = 0
+                res = self.run_coro(server.get_many(['k1', 'k2', 'k3']))
+                self.assertEqual({'k1': 'm1', 'k3': 'm3'}, res)
+                self.assertEqual(multicall, server.multicall)
+                # one request with multicall, else failed multicall + 3 gets
+                self.assertEqual(1 if multicall else 4, pool.requests_cnt)
+            finally:
+                pool.close()
+
+    def test_get_many_multicall_http_error(self):
+        pool = LocalCosignerPool(multicall=False, multicall_http_error=True)
+        try:
+            server = CosignerPoolServer(pool.url)
+            self.run_coro(server.put('k2', 'm2'))
+            pool.requests_cnt = 0
+            res = self.run_coro(server.get_many(['k1', 'k2']))
+            self.assertEqual({'k2': 'm2'}, res)
+            self.assertFalse(server.multicall)
+            self.assertEqual(3, pool.requests_cnt)  # rejected multicall + 2 gets
+        finally:
+            pool.close()
+
+        # multicall is not disabled if server is unreachable
+        server = CosignerPoolServer(pool.url, timeout=5)
+        with self.assertRaises(Exception):
+            self.run_coro(server.get_many(['k1']))
+        self.assertTrue(server.multicall)
+
+    def test_listener(self):
+        pool = LocalCosignerPool()
+        try:
+            server = CosignerPoolServer(pool.url)
+            received = []
+            got_message = threading.Event()
+
+            def on_receive(keyhash, message):
+                received.append((keyhash, message))
+                got_message.set()
+
+            listener = Listener(server, on_receive, loop=self.asyncio_loop,
+                                poll_interval=60)
+            listener.start()
+            listener.set_keyhashes(['k1', 'k2'])
+            self.run_coro(server.put('k2', 'm2'))
+            listener.wakeup()
+            self.assertTrue(got_message.wait(timeout=10))
+            self.assertEqual([('k2', 'm2')], received)
+            self.assertEqual({'k2'}, listener.received)
+
+            self.run_coro(listener.delete('k2'))
+            self.assertEqual({}, pool.messages)
+            self.assertEqual(set(), listener.received)
+            listener.stop()
+            self.assertFalse(listener.is_running())
+        finally:
+            pool.close()
+
+        # received keyhash is discarded even if deletion failed
+        listener.received.add('k1')
+        self.run_coro(listener.delete('k1'))
+        self.assertEqual(set(), listener.received)
+
+    def test_backoff(self):
+        pool = LocalCosignerPool()
+        server = CosignerPoolServer(pool.url, timeout=5)
+        pool.close()  # server is unreachable now
+        listener = Listener(server, lambda k, m: None, loop=self.asyncio_loop,
+                            poll_interval=2)
+        listener.keyhashes = ['k1']
+        delays = []
+        for i in range(10):
+            self.run_coro(listener.poll())
+            delays.append(listener.next_delay())
+        self.assertEqual([4, 8, 16, 32, 64, 128, 256, 300, 300, 300], delays)
+        listener.failures = 0
+        self.assertEqual(2, listener.next_delay())
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import os
+import time
+from base64 import b64encode
+
+from aiohttp import web
+
+from electrum_dash.daemon import (AuthenticatedServer, RPCStats, DaemonClient,
+                                  DaemonNotRunning, get_lockfile)
+from electrum_dash.simple_config import SimpleConfig
+from electrum_dash.util import create_and_start_event_loop
+
+from . import ElectrumTestCase
+
+
+class RequestMock:
+
+    def __init__(self, data, user='user', password='pass'):
+        self.data = data
+        credentials = b64encode(f'{user}:{password}'.encode()).decode()
+        self.headers = {'Authorization': f'Basic {credentials}'}
+
+    async def text(self):
+        return json.dumps(self.data)
+
+
+class TestAuthenticatedServer(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.asyncio_loop, self._stop_loop, self._loop_thread = create_and_start_event_loop()
+        self.server = AuthenticatedServer('user', 'pass')
+
+        async def ping():
+            return True
+
+        async def sleep_and_echo(secs, value):
+            await asyncio.sleep(secs)
+            return value
+
+        async def fail():
+            raise Exception('failed')
+
+        for f in (ping, sleep_and_echo, fail):
+            self.server.register_method(f)
+
+    def tearDown(self):
+        super().tearDown()
+        self.asyncio_loop.call_soon_threadsafe(self._stop_loop.set_result, 1)
+        self._loop_thread.join(timeout=1)
+
+    def handle(self, request):
+        coro = self.server.handle(request)
+        resp = asyncio.run_coroutine_threadsafe(coro, self.asyncio_loop).result()
+        return resp.status, resp.text
+
+    def test_single_call(self):
+        call = {'jsonrpc': '2.0', 'id': '1', 'method': 'ping', 'params': []}
+        status, text = self.handle(RequestMock(call))
+        self.assertEqual(200, status)
+        self.assertEqual({'jsonrpc': '2.0', 'id': '1', 'result': True},
+                         json.loads(text))
+        status, text = self.handle(RequestMock(call, password='wrong'))
+        self.assertEqual(403, status)
+        status, text = self.handle(RequestMock({'id': '1',
+                                                'method': 'unknown'}))
+        self.assertEqual(500, status)
+
+    def test_batch(self):
+        calls = [
+            {'jsonrpc': '2.0', 'id': '1', 'method': 'sleep_and_echo',
+             'params': [0.3, 'a']},
+            {'jsonrpc': '2.0', 'id': '2', 'method': 'sleep_and_echo',
+             'params': {'secs': 0.3, 'value': 'b'}},
+            {'jsonrpc': '2.0', 'id': '3', 'method': 'fail'},
+            {'jsonrpc': '2.0', 'method': 'ping'},  # notification
+            {'jsonrpc': '2.0', 'id': '5', 'method': 'unknown'},
+            {'jsonrpc': '2.0', 'id': '6'},
+            'garbage',
+        ]
+        start = time.monotonic()
+        status, text = self.handle(RequestMock(calls))
+        self.assertEqual(200, status)
+        self.assertLess(time.monotonic() - start, 0.6)  # run concurrently
+        res = json.loads(text)
+        self.assertEqual(6, len(res))
+        self.assertEqual('a', res[0]['result'])
+        self.assertEqual('b', res[1]['result'])
+        self.assertEqual({'code': 1, 'message': 'failed'}, res[2]['error'])
+        self.assertEqual('5', res[3]['id'])
+        self.assertEqual(-32601, res[3]['error']['code'])
+        for r in res[4:]:
+            self.assertEqual(None, r['id'])
+            self.assertEqual(-32600, r['error']['code'])
+        status, text = self.handle(RequestMock([]))
+        self.assertEqual(500, status)
+        status, text = self.handle(RequestMock([calls[3]]))
+        self.assertEqual(204, status)
+
+        stats = self.server.rpc_stats.to_json()
+        self.assertEqual({'fail', 'ping', 'sleep_and_echo'}, set(stats))
+        self.assertEqual(2, stats['sleep_and_echo']['count'])
+        self.assertEqual(0, stats['sleep_and_echo']['errors'])
+        self.assertEqual({'<=500ms': 2}, stats['sleep_and_echo']['histogram'])
+        self.assertEqual(1, stats['fail']['errors'])
+
+    def test_batch_limits(self):
+        call = {'jsonrpc': '2.0', 'id': '1', 'method': 'ping'}
+        max_size = self.server.MAX_BATCH_SIZE
+        status, text = self.handle(RequestMock([call] * (max_size + 1)))
+        self.assertEqual(500, status)
+        status, text = self.handle(RequestMock([call] * max_size))
+        self.assertEqual(200, status)
+        self.assertEqual(max_size, len(json.loads(text)))
+
+        max_concurrency = self.server.MAX_BATCH_CONCURRENCY
+        calls = [{'jsonrpc': '2.0', 'id': str(i), 'method': 'sleep_and_echo',
+                  'params': [0.2, i]} for i in range(max_concurrency + 1)]
+        start = time.monotonic()
+        status, text = self.handle(RequestMock(calls))
+        self.assertEqual(200, status)
+        self.assertGreaterEqual(time.monotonic() - start, 0.4)
+        self.assertEqual(list(range(max_concurrency + 1)),
+                         [r['result'] for r in json.loads(text)])
+
+    def test_rpc_stats(self):
+        stats = RPCStats()
+        for secs in (0.0005, 0.001, 0.003, 10):
+            stats.record('getinfo', secs)
+        stats.record('getinfo', 0.004, error=True)
+        res = stats.to_json()['getinfo']
+        self.assertEqual(5, res['count'])
+        self.assertEqual(1, res['errors'])
+        self.assertEqual(10000, res['max_ms'])
+        self.assertEqual({'<=1ms': 2, '<=5ms': 2, '>5000ms': 1},
+                         res['histogram'])
+
+    def test_daemon_client(self):
+        config = SimpleConfig({'electrum_path': self.electrum_path,
+                               'rpcuser': 'user', 'rpcpassword': 'pass'})
+        client = DaemonClient(config, self.asyncio_loop)
+        with self.assertRaises(DaemonNotRunning):
+            client.request('ping')
+
+        peers = set()
+
+        async def handle(request):
+            peers.add(request.transport.get_extra_info('sockname'))
+            peers.add(request.transport.get_extra_info('peername'))
+            return await self.server.handle(request)
+
+        async def start_server():
+            app = web.Application()
+            app.router.add_post('/', handle)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            return runner, site._server.sockets[0].getsockname()
+
+        def run_server(create_time):
+            runner, sockname = asyncio.run_coroutine_threadsafe(
+                start_server(), self.asyncio_loop).result()
+            with open(get_lockfile(config), 'w') as f:
+                f.write(repr((sockname[:2], create_time)))
+            return runner
+
+        def stop_server(runner):
+            asyncio.run_coroutine_threadsafe(
+                runner.cleanup(), self.asyncio_loop).result()
+
+        runner = run_server(time.time() - 3600)  # long running daemon
+        try:
+            for i in range(20):
+                self.assertEqual(True, client.request('ping'))
+            self.assertEqual('a', client.request('sleep_and_echo', (0, 'a')))
+            self.assertEqual(2, len(peers))  # one connection reused
+
+            # daemon restarted on other port
+            stop_server(runner)
+            runner = run_server(time.time())
+            self.assertEqual(True, client.request('ping'))
+        finally:
+            client.close()
+            stop_server(runner)
+            os.unlink(get_lockfile(config))
@@ -7,13 +7,14 @@ import shutil
 import tempfile
 import time
 from collections import defaultdict, Counter
+from decimal import Decimal
 from pprint import pprint
 
 from electrum_dash import dash_ps, ecc
 from electrum_dash.address_synchronizer import (TX_HEIGHT_LOCAL,
                                                 TX_HEIGHT_UNCONF_PARENT,
                                                 TX_HEIGHT_UNCONFIRMED)
-from electrum_dash.bitcoin import COIN
+from electrum_dash.bitcoin import COIN, pubkey_to_address
 from electrum_dash.dash_ps_util import (COLLATERAL_VAL, CREATE_COLLATERAL_VAL,
                                         CREATE_COLLATERAL_VALS, PS_DENOMS_VALS,
                                         MIN_DENOM_VAL, PSMinRoundsCheckFailed,
@@ -23,11 +24,14 @@ from electrum_dash.dash_ps_util import (COLLATERAL_VAL, CREATE_COLLATERAL_VAL,
                                         FILTERED_TXID, FILTERED_ADDR,
                                         PSCoinRounds, ps_coin_rounds_str,
                                         calc_tx_size, calc_tx_fee, to_duffs,
-                                        MixingStats, PSFeeTooHigh)
+                                        MixingStats, MixingRates,
+                                        PSDenomsToMix, PSFeeTooHigh)
 from electrum_dash.dash_ps_wallet import (KPStates, KP_ALL_TYPES, KP_SPENDABLE,
                                           KP_PS_COINS, KP_PS_CHANGE,
-                                          PSKsInternalAddressCorruption)
+                                          PSKsInternalAddressCorruption,
+                                          derive_keypairs)
 from electrum_dash.dash_tx import PSTxTypes, SPEC_TX_NAMES
+from electrum_dash.exchange_rate import FxThread
 from electrum_dash import keystore
 from electrum_dash.simple_config import SimpleConfig
 from electrum_dash.storage import WalletStorage
@@ -91,7 +95,8 @@ class PSWalletTestCase(TestCaseForTestnet):
             wallet_data = wallet_data.decode('utf-8')
         with open(self.wallet_path, 'w') as wfh:
             wfh.write(wallet_data)
-        self.config = SimpleConfig({'electrum_path': self.user_dir})
+        self.config = SimpleConfig({'electrum_path': self.user_dir,
+                                    'wallet_save_delay': 0})
         self.config.set_key('dynamic_fees', False, True)
         self.storage = WalletStorage(self.wallet_path)
         self.w_db = WalletDB(self.storage.read(), manual_upgrades=True)
@@ -311,6 +316,128 @@ class PSWalletTestCase(TestCaseForTestnet):
         assert ms.dsa.success_cnt == 1
         assert ms.dsa.error_cnt == 1
 
+    def test_MixingRates(self):
+        mr = MixingRates()
+        assert mr.sessions_per_hour == 0
+        assert mr.rounds_per_hour == 0
+
+        mr.start_time = time.time() - 1800
+        mr.on_session_completed(3)
+        mr.on_session_completed(5)
+        assert round(mr.sessions_per_hour) == 4
+        assert round(mr.rounds_per_hour) == 16
+
+        # completed sessions out of window are not counted
+        mr.start_time = time.time() - 7200
+        mr.completed.appendleft((time.time() - 3700, 9))
+        assert round(mr.sessions_per_hour) == 2
+        assert round(mr.rounds_per_hour) == 8
+        assert len(mr.completed) == 2
+
+        mr.reset()
+        assert len(mr.completed) == 0
+        assert mr.rounds_per_hour == 0
+
+    def test_PSDenomsToMix(self):
+        d1, d2 = PS_DENOMS_VALS[0], PS_DENOMS_VALS[1]
+        denoms = PSDenomsToMix({'a:0': ('addr1', d1, 1),
+                                'a:1': ('addr2', d1, 0),
+                                'b:0': ('addr3', d1, 0),
+                                'c:0': ('addr4', d1, 2),
+                                'd:0': ('addr5', d2, 0)})
+        assert len(denoms) == 5
+        assert denoms.cnt_by_values == {d1: 4, d2: 1}
+        assert denoms.candidates(d2, 5) == [('d:0', ('addr5', d2, 0))]
+        assert denoms.candidates(PS_DENOMS_VALS[2], 5) == []
+        # distinct txids, lesser rounds first
+        for i in range(10):
+            selected = [o for o, d in denoms.candidates(d1, 5)]
+            assert len(selected) == 3
+            assert {o[0] for o in selected} == {'a', 'b', 'c'}
+            assert selected[-1] == 'c:0'
+            selected = [o for o, d in denoms.candidates(d1, 2)]
+            assert sorted(selected) == ['a:1', 'b:0']
+        selected = denoms.candidates(d1, 5, exclude_txids={'b'})
+        assert sorted(o for o, d in selected) == ['a:1', 'c:0']
+        # random selection
+        selected = set()
+        for i in range(200):
+            selected.update(o for o, d in denoms.candidates(d1, 1))
+        assert selected == {'a:1', 'b:0'}
+        values = Counter(denoms.random_value() for i in range(500))
+        assert set(values) == {d1, d2}
+        assert values[d1] > values[d2]
+
+        assert denoms.pop('a:1') == ('addr2', d1, 0)
+        assert denoms.pop('a:1', None) is None
+        del denoms['d:0']
+        assert d2 not in denoms.index
+        assert denoms.cnt_by_values == {d1: 3}
+        assert sorted(o for o, d in denoms.candidates(d1, 5)) == ['a:0',
+                                                                  'b:0',
+                                                                  'c:0']
+        assert sorted(denoms.index[d1][0]._txids) == ['b']
+        denoms['b:0'] = ('addr3', d1, 1)  # replace with other rounds
+        assert len(denoms) == 3
+        assert 0 not in denoms.index[d1]
+        assert denoms.random_value() == d1
+        assert PSDenomsToMix().random_value() is None
+
+    def test_denom_values_to_schedule(self):
+        psman = self.wallet.psman
+        assert psman.max_sessions_per_denom == 4
+        psman.max_sessions_per_denom = 100
+        assert psman.max_sessions_per_denom == psman.max_max_sessions
+        psman.max_sessions_per_denom = 0
+        assert psman.max_sessions_per_denom == psman.min_max_sessions
+        psman.max_sessions_per_denom = 2
+
+        d1, d2 = PS_DENOMS_VALS[0], PS_DENOMS_VALS[1]
+        psman._denoms_to_mix_cache = PSDenomsToMix({'a:0': ('addr1', d1, 0),
+                                                    'b:0': ('addr2', d1, 1),
+                                                    'c:0': ('addr3', d2, 0)})
+        assert psman._denom_values_to_schedule() == {d1: 2, d2: 1}
+
+        psman.running_mixes[None] += 2
+        assert psman.running_mixes_cnt == 2
+        assert psman._reserve_mix_denom_value(d1)
+        assert psman._reserve_mix_denom_value(d1)
+        assert psman.running_mixes_cnt == 2
+        assert psman._denom_values_to_schedule() == {d2: 1}
+        psman.running_mixes[None] += 1
+        assert not psman._reserve_mix_denom_value(d1)
+        assert psman._reserve_mix_denom_value(d2)
+        assert psman.running_mixes_cnt == 3
+        assert psman._denom_values_to_schedule() == {d2: 1}
+
+    def test_start_denominate_wfl_without_dsq(self):
+        psman = self.wallet.psman
+        d1 = PS_DENOMS_VALS[0]
+        psman._denoms_to_mix_cache = PSDenomsToMix({'a:0': ('addr1', d1, 0)})
+        psman.state = PSStates.Mixing
+        psman.RECENT_DSQ_WAIT_TIME = 0.1
+        started = []
+
+        class FakeDashNet:
+            async def wait_recent_dsq(self, recent_mns, denoms, timeout):
+                await asyncio.sleep(timeout)  # no dsq arrives
+
+        def _start_denominate_wfl(dval):
+            started.append((dval, psman.running_mixes_cnt))
+
+        psman.dash_net = FakeDashNet()
+        psman._start_denominate_wfl = _start_denominate_wfl
+        orig_random = random.random
+        try:
+            random.random = lambda: 0.9  # wait recent dsq first
+            coro = psman.start_denominate_wfl()
+            asyncio.get_event_loop().run_until_complete(coro)
+        finally:
+            random.random = orig_random
+        # new queue is created after dsq wait, session slot is released
+        assert started == [(d1, 1)]
+        assert psman.running_mixes_cnt == 0
+
     def test_find_untracked_ps_txs(self):
         w = self.wallet
         psman = w.psman
@@ -411,6 +538,93 @@ class PSWalletTestCase(TestCaseForTestnet):
             assert not tx['group_txid']
             assert tx['group_data'] == []
 
+    def test_iter_detailed_history(self):
+        w = self.wallet
+        coro = w.psman.find_untracked_ps_txs(log=False)
+        asyncio.get_event_loop().run_until_complete(coro)
+        h = w.get_detailed_history()
+        txs = h['transactions']
+        stats = {}
+        it = w.iter_detailed_history(stats=stats)
+        assert next(it) == txs[0]
+        assert stats['first_item'] == txs[0]
+        assert list(it) == txs[1:]
+        assert w.get_detailed_history_summary(stats) == h['summary']
+
+        # filters are applied in the history index
+        height = txs[40]['height']
+        h = w.get_detailed_history(from_height=height)
+        filtered = list(w.iter_detailed_history(from_height=height))
+        assert filtered == h['transactions']
+        assert 0 < len(filtered) < len(txs)
+        assert all(tx['height'] >= height for tx in filtered)
+        ts = txs[40]['timestamp']
+        filtered = list(w.iter_detailed_history(to_timestamp=ts))
+        assert 0 < len(filtered) < len(txs)
+        assert all(tx['timestamp'] < ts for tx in filtered)
+
+        # conflicting filters raise before iteration
+        with self.assertRaises(Exception):
+            w.iter_detailed_history(from_height=1, from_timestamp=1)
+
+    def test_acquisition_cost_engine(self):
+        w = self.wallet
+        engine = w.acquisition_cost
+        ccy = 'USD'
+        price_func = lambda ts: Decimal(int(ts) % 1000 + 1) / 7
+
+        def ref_average_price(txid):  # recursive computation
+            input_value = 0
+            total_price = 0
+            for addr in w.db.get_txi_addresses(txid):
+                for ser, v in w.db.get_txi_addr(txid, addr):
+                    input_value += v
+                    total_price += ref_coin_price(ser.split(':')[0], v)
+            return total_price / (input_value/Decimal(COIN))
+
+        def ref_coin_price(txid, txin_value):
+            if w.db.get_txi_addresses(txid):
+                return ref_average_price(txid) * txin_value/Decimal(COIN)
+            fiat_value = w.get_fiat_value(txid, ccy)
+            if fiat_value is not None:
+                return fiat_value
+            return (w.price_at_timestamp(txid, price_func)
+                    * txin_value/Decimal(COIN))
+
+        spending = [txid for txid in w.db.list_transactions()
+                    if w.db.get_txi_addresses(txid)]
+        assert len(spending) > 50
+        txid = spending[-1]
+        assert engine.average_price(txid, price_func, ccy) == \
+            ref_average_price(txid)
+        for txid in spending:
+            assert w.average_price(txid, price_func, ccy) == \
+                ref_average_price(txid)
+        assert len(engine._prices[ccy]) == len(spending)
+
+        # set fiat value of funding tx invalidates its descendants
+        funding = [txid for txid in w.db.list_transactions()
+                   if not w.db.get_txi_addresses(txid)]
+        depending = {txid: w.get_depending_transactions(txid)
+                     for txid in funding}
+        txid = min(funding, key=lambda txid: len(depending[txid]))
+
+        class FakeFxThread:
+            remove_thousands_separator = staticmethod(
+                FxThread.remove_thousands_separator)
+            ccy_amount_str = FxThread.ccy_amount_str
+            timestamp_rate = staticmethod(price_func)
+
+        fx = FakeFxThread()
+        fx.ccy = ccy
+        assert w.set_fiat_value(txid, ccy, '123.45', fx, COIN) is False
+        assert w.get_fiat_value(txid, ccy) == Decimal('123.45')
+        assert (len(engine._prices[ccy])
+                == len(set(spending) - depending[txid]))
+        for txid in spending:
+            assert w.average_price(txid, price_func, ccy) == \
+                ref_average_price(txid)
+
     def test_ps_history_show_grouped(self):
         psman = self.wallet.psman
         coro = psman.find_untracked_ps_txs(log=False)
@@ -3989,6 +4203,55 @@ class PSWalletTestCase(TestCaseForTestnet):
         keystore_d['addr_deriv_offset'] = 2
         assert psman.ps_keystore.dump() == keystore_d
 
+    @enable_ps_ks
+    def test_derive_keypairs(self):
+        w = self.wallet
+        psman = w.psman
+        for ks in [w.keystore, psman.ps_keystore]:
+            sequences = [[0, 0], [0, 5], [1, 3]]
+            xprv = ks.get_master_private_key(None)
+            derivations = [ks.get_private_key_derivation(seq)
+                           for seq in sequences]
+            keypairs = derive_keypairs(xprv, derivations)
+            for seq, (pubkey, sec) in zip(sequences, keypairs):
+                assert pubkey == ks.derive_pubkey(*seq).hex()
+                assert sec == ks.get_private_key(seq, None)
+
+    @enable_ps_ks
+    def test_cache_keypairs_ready_to_denominate(self):
+        w = self.wallet
+        psman = w.psman
+        assert not psman.keypairs_ready_to_denominate
+
+        psman.state = PSStates.Mixing
+        ready_on_spendable = []
+        cache_kp_spendable = psman._cache_kp_spendable
+
+        def _cache_kp_spendable(password):
+            ready_on_spendable.append(psman.keypairs_ready_to_denominate)
+            return cache_kp_spendable(password)
+        psman._cache_kp_spendable = _cache_kp_spendable
+        psman._cache_keypairs(password=None)
+        del psman._cache_kp_spendable
+        assert ready_on_spendable == [True]  # denoms keys are cached first
+        assert psman.keypairs_state == KPStates.Ready
+        assert psman.keypairs_ready_to_denominate
+        assert len(psman._keypairs_cache[KP_PS_COINS]) > 100
+        for addr, (pubkey, sec) in psman._keypairs_cache[KP_PS_COINS].items():
+            assert ecc.ECPrivkey(sec[0]).get_public_key_hex() == pubkey
+            assert pubkey_to_address(psman.ps_ks_txin_type, pubkey) == addr
+
+        psman.keypairs_state = KPStates.Caching
+        assert psman.keypairs_ready_to_denominate
+        psman._kp_denoms_cached = False
+        assert not psman.keypairs_ready_to_denominate
+
+        psman.state = PSStates.Ready
+        psman._cache_keypairs(password=None)  # stopped on mixing state check
+        assert psman.keypairs_state == KPStates.Empty
+        assert psman._keypairs_cache == {}
+        assert not psman.keypairs_ready_to_denominate
+
     @enable_ps_ks
     def test_ps_ks_after_wallet_password_set_standard_bip32(self):
         w = self.wallet
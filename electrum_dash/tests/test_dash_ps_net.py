@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from electrum_dash.dash_msg import DashDsqMsg
+from electrum_dash.dash_ps_net import (PSDenoms, PSDsqStore,
+                                       PRIVATESEND_QUEUE_TIMEOUT)
+
+from . import ElectrumTestCase
+
+
+def make_dsq(n_denom, protx_n, n_time=None):
+    if n_time is None:
+        n_time = int(time.time())
+    return DashDsqMsg(int(n_denom), bytes([protx_n])*32, n_time, 0, b'\x00'*96)
+
+
+class PSDsqStoreTestCase(ElectrumTestCase):
+
+    def setUp(self):
+        super(PSDsqStoreTestCase, self).setUp()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        super(PSDsqStoreTestCase, self).tearDown()
+
+    def test_add(self):
+        store = PSDsqStore()
+        dsq = make_dsq(PSDenoms.D1, 1)
+        assert store.add(dsq)
+        assert not store.add(dsq)  # duplicate
+        assert not store.add(make_dsq(PSDenoms.D1, 1, dsq.nTime))
+        assert not store.add(make_dsq(3, 2))  # unknown nDenom
+        expired_time = int(time.time()) - PRIVATESEND_QUEUE_TIMEOUT - 1
+        assert not store.add(make_dsq(PSDenoms.D1, 3, expired_time))
+        assert store.add(make_dsq(PSDenoms.D10, 1))
+        assert len(store) == 2
+        assert len(store.shards[PSDenoms.D1]) == 1
+        assert len(store.shards[PSDenoms.D10]) == 1
+
+        # popped dsq is not added again
+        assert store.pop() is not None
+        assert store.pop() is not None
+        assert store.pop() is None
+        assert not store.add(dsq)
+
+        store = PSDsqStore(shard_max_size=2, seen_max_size=3)
+        for i in range(4):
+            store.add(make_dsq(PSDenoms.D1, i))
+        assert len(store) == 2
+        assert len(store.seen) == 3
+
+    def test_pop(self):
+        store = PSDsqStore()
+        now = int(time.time())
+        dsq1 = make_dsq(PSDenoms.D1, 1, now - 3)
+        dsq2 = make_dsq(PSDenoms.D10, 2, now - 2)
+        dsq3 = make_dsq(PSDenoms.D1, 3, now - 1)
+        for dsq in [dsq1, dsq2, dsq3]:
+            assert store.add(dsq)
+
+        assert store.pop([PSDenoms.D0_1]) is None
+        assert store.pop([PSDenoms.D10]) == dsq2
+        # newest first, unsuitable dsq is dropped
+        assert store.pop(is_suitable=lambda d: d != dsq3) == dsq1
+        assert store.pop() is None
+
+        dsq4 = make_dsq(PSDenoms.D1, 4)
+        store.add(dsq4)
+        dsq4.nTime -= PRIVATESEND_QUEUE_TIMEOUT + 1
+        assert store.pop() is None
+        assert len(store) == 0
+
+    def test_wait(self):
+        store = PSDsqStore()
+        dsq1 = make_dsq(PSDenoms.D1, 1)
+        dsq2 = make_dsq(PSDenoms.D10, 2)
+
+        async def add_later():
+            await asyncio.sleep(0.1)
+            store.add(dsq1)
+            await asyncio.sleep(0.1)
+            store.add(dsq2)
+
+        async def wait_dsq():
+            self.loop.create_task(add_later())
+            res = await store.wait([PSDenoms.D10], timeout=5)
+            return res, len(store)
+
+        res, store_len = self.loop.run_until_complete(wait_dsq())
+        assert res == dsq2
+        assert store_len == 1
+        assert not any(store.waiters.values())
+
+        res = self.loop.run_until_complete(store.wait([PSDenoms.D1],
+                                                      timeout=5))
+        assert res == dsq1
+
+        res = self.loop.run_until_complete(store.wait(timeout=0.1))
+        assert res is None
+        assert not any(store.waiters.values())
@@ -0,0 +1,64 @@
+import json
+import os
+from datetime import datetime
+from decimal import Decimal
+
+from electrum_dash.exchange_rate import ExchangeBase, HistoricalRates
+
+from . import ElectrumTestCase
+
+
+class FakeExchange(ExchangeBase):
+
+    def history_ccys(self):
+        return ['USD']
+
+
+class TestHistoricalRates(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.exchange = FakeExchange(lambda: None, lambda: None)
+
+    def test_from_dict(self):
+        h = HistoricalRates.from_dict({'2020-01-01': 40.5,
+                                       '2020-01-04': '41.12345678',
+                                       'garbage': 1})
+        self.assertEqual(4, len(h))
+        self.assertEqual(Decimal('40.5'), h.rate(datetime(2020, 1, 1, 23)))
+        self.assertEqual(None, h.rate(datetime(2020, 1, 2)))
+        self.assertEqual(Decimal('41.12345678'), h.rate(datetime(2020, 1, 4)))
+        self.assertEqual(None, h.rate(datetime(2019, 12, 31)))
+        self.assertEqual(None, h.rate(datetime(2020, 1, 5)))
+        self.assertEqual(None, HistoricalRates.from_dict({}))
+
+    def test_write_read(self):
+        filename = os.path.join(self.electrum_path, 'FakeExchange_USD.rates')
+        h = HistoricalRates.from_dict({'2021-05-01': 300, '2021-05-03': 310})
+        h.write(filename)
+        h2 = HistoricalRates.read(filename)
+        self.assertEqual(list(h.values), list(h2.values))
+        self.assertEqual(Decimal(310), h2.rate(datetime(2021, 5, 3)))
+        h2.close()
+        self.assertEqual(None, h2.rate(datetime(2021, 5, 3)))
+        with open(filename, 'ab') as f:
+            f.write(b'\x00')  # wrong size
+        self.assertEqual(None, HistoricalRates.read(filename))
+
+    def test_convert_legacy_cache(self):
+        filename = os.path.join(self.electrum_path, 'FakeExchange_USD')
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'2021-05-01': 300.25}))
+        h = self.exchange.read_historical_rates('USD', self.electrum_path)
+        self.assertFalse(os.path.exists(filename))
+        self.assertTrue(os.path.exists(filename + '.rates'))
+        d_t = datetime(2021, 5, 1)
+        self.assertEqual(Decimal('300.25'), h.rate(d_t))
+        self.assertEqual(Decimal('300.25'),
+                         self.exchange.historical_rate('USD', d_t))
+        self.assertEqual('NaN', self.exchange.historical_rate('EUR', d_t))
+
+        exchange = FakeExchange(lambda: None, lambda: None)
+        h = exchange.read_historical_rates('USD', self.electrum_path)
+        self.assertEqual(Decimal('300.25'), h.rate(d_t))
+        h.close()
@@ -1,5 +1,6 @@
 import unittest
 
+from electrum_dash import constants
 from electrum_dash.protx_list import MNList
 from electrum_dash.constants import CHUNK_SIZE
 
@@ -29,3 +30,32 @@ class ProTxListTestCase(unittest.TestCase):
                 assert 0 < (calc_height - base_height) <= CHUNK_SIZE
                 if (height - base_height) > CHUNK_SIZE:
                     assert (calc_height + 1) % CHUNK_SIZE == 0
+
+    def test_calc_getmnlistd_ranges(self):
+        llmq_offset = MNList.LLMQ_OFFSET
+        act_h = constants.net.DIP3_ACTIVATION_HEIGHT
+        calc_ranges = MNList.calc_getmnlistd_ranges
+
+        # up to date
+        assert calc_ranges(100000, 100000 + llmq_offset) == []
+        assert calc_ranges(100000, 100000, get_mns=True) == []
+
+        # single range as with one peer
+        assert calc_ranges(1, act_h + 100) == [(1, act_h + 1)]
+        assert calc_ranges(100000, 100020) == [(100000, 100020 - llmq_offset)]
+        assert calc_ranges(100000, 100005, get_mns=True) == [(100000, 100005)]
+
+        # non overlapping consecutive ranges
+        base_height = act_h + 10
+        height = base_height + 5*CHUNK_SIZE
+        for get_mns in [False, True]:
+            ranges = calc_ranges(base_height, height, get_mns, 4)
+            assert len(ranges) == 4
+            assert ranges[0][0] == base_height
+            for (b1, h1), (b2, h2) in zip(ranges, ranges[1:]):
+                assert b1 < h1 == b2 < h2
+            for b, h in ranges:
+                assert 0 < h - b <= CHUNK_SIZE
+            ranges = calc_ranges(base_height, height, get_mns, 100)
+            assert ranges[-1][1] == (height if get_mns
+                                     else height - llmq_offset)
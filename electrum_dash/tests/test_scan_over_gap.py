@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+from unittest import mock
+
+from electrum_dash import bitcoin
+from electrum_dash.network import Network
+from electrum_dash.plugins.scan_over_gap.scan_over_gap import (
+    AdaptiveLimiter, Scan, ScanOverGapPlugin, WalletScan)
+from electrum_dash.simple_config import SimpleConfig
+from electrum_dash.util import create_and_start_event_loop
+from electrum_dash.wallet_db import WalletDB
+
+from . import ElectrumTestCase
+
+
+def derive(i):
+    return bitcoin.hash160_to_p2pkh(i.to_bytes(20, 'big'))
+
+
+def scripthash(i):
+    script = bitcoin.address_to_script(derive(i))
+    return bitcoin.script_to_scripthash(script)
+
+
+class FakeNetwork:
+
+    default_server = 'localhost:50002:s'
+
+    def __init__(self, funded, fail_cnt=0):
+        self.funded = {scripthash(i): v for i, v in funded.items()}
+        self.fail_cnt = fail_cnt
+        self.batches = []
+
+    async def get_balances_for_scripthashes(self, shs):
+        await asyncio.sleep(0)
+        if self.fail_cnt:
+            self.fail_cnt -= 1
+            raise Exception('server busy')
+        self.batches.append(len(shs))
+        return [{'confirmed': self.funded.get(sh, 0), 'unconfirmed': 0}
+                for sh in shs]
+
+
+class FakeWallet:
+
+    def __init__(self):
+        self.db = WalletDB('', manual_upgrades=False)
+        self.saves_cnt = 0
+
+    def save_db(self, *, flush=False):
+        self.saves_cnt += 1
+
+
+class TestScanOverGap(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.asyncio_loop, self._stop_loop, self._loop_thread = create_and_start_event_loop()
+        config = SimpleConfig({'electrum_path': self.electrum_path})
+        self.plugin = ScanOverGapPlugin(None, config, 'scan_over_gap')
+        self.plugin.BATCH_SIZE = 10
+        self.plugin.RETRY_DELAY = 0
+        self.wallet = FakeWallet()
+
+    def tearDown(self):
+        super().tearDown()
+        self.asyncio_loop.call_soon_threadsafe(self._stop_loop.set_result, 1)
+        self._loop_thread.join(timeout=1)
+
+    def run_coro(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.asyncio_loop).result()
+
+    def new_scan(self, start_idx=0):
+        return Scan(derive=derive, create_addr=None, num_addrs=None, gap=20,
+                    start_idx=start_idx, next_idx=start_idx, for_change=0)
+
+    def run_scan(self, network, cnt):
+        with mock.patch.object(Network, 'get_instance',
+                               return_value=network):
+            self.run_coro(self.plugin.do_scan(self.wallet, cnt))
+
+    def test_batched_scan(self):
+        s = self.new_scan(start_idx=5)
+        ws = self.plugin.wallet_scans[self.wallet] = WalletScan()
+        ws.scans[s.key] = s
+        network = FakeNetwork({7: 1000, 40: 2000}, fail_cnt=1)
+        self.run_scan(network, 35)
+        self.assertEqual(None, ws.error)
+        self.assertFalse(ws.running)
+        self.assertEqual([10, 10, 10, 5], sorted(network.batches,
+                                                 reverse=True))
+        self.assertEqual(40, s.next_idx)
+        self.assertEqual(set(), s.uncompleted)
+        self.assertEqual(1000, sum(s.balances.values()))
+        self.assertEqual({}, s.errors)
+        self.assertEqual(4, self.wallet.saves_cnt)
+
+        # scan next addresses from saved checkpoint
+        checkpoint = self.wallet.db.get(self.plugin.CHECKPOINT_KEY)
+        s2 = self.new_scan(start_idx=5)
+        s2.restore_checkpoint(checkpoint[s2.key])
+        self.assertEqual(40, s2.next_idx)
+        self.assertEqual(s.balances, s2.balances)
+        ws.scans[s.key] = s2
+        self.run_scan(network, 10)
+        self.assertEqual(50, s2.next_idx)
+        self.assertEqual(3000, sum(s2.balances.values()))
+
+    def test_parallel_derivation(self):
+        threads = set()
+        locked = []
+
+        def slow_derive(i):
+            threads.add(threading.get_ident())
+            locked.append(self.plugin.wallet_scans_lock.locked())
+            time.sleep(0.005)
+            return derive(i)
+
+        s = Scan(derive=slow_derive, create_addr=None, num_addrs=None,
+                 gap=20, start_idx=0, next_idx=0, for_change=0)
+        ws = self.plugin.wallet_scans[self.wallet] = WalletScan()
+        ws.scans[s.key] = s
+        network = FakeNetwork({33: 1000})
+        self.run_scan(network, 80)
+        self.assertEqual(None, ws.error)
+        self.assertGreater(len(threads), 1)
+        self.assertFalse(any(locked))
+        self.assertEqual(80, s.next_idx)
+        self.assertEqual(set(range(80)), set(s.addrs))
+        self.assertEqual(1000, sum(s.balances.values()))
+
+    def test_resume_interrupted_scan(self):
+        s = self.new_scan()
+        s.restore_checkpoint({'start_idx': 0, 'next_idx': 30,
+                              'found': {'3': 500},
+                              'unscanned': list(range(20, 30))})
+        self.assertEqual({3: 500}, {i: b for i, b in s.balances.items()
+                                    if b})
+        self.assertEqual(set(range(20, 30)), s.uncompleted)
+        ws = self.plugin.wallet_scans[self.wallet] = WalletScan()
+        ws.scans[s.key] = s
+        network = FakeNetwork({25: 100})
+        self.run_scan(network, 100)  # only unscanned are queried
+        self.assertEqual([10], network.batches)
+        self.assertEqual(30, s.next_idx)
+        self.assertEqual(600, sum(s.balances.values()))
+
+        s = self.new_scan(start_idx=2)  # wallet addresses changed
+        s.restore_checkpoint({'start_idx': 0, 'next_idx': 30})
+        self.assertEqual(2, s.next_idx)
+        self.assertEqual({}, s.balances)
+
+    def test_adaptive_limiter(self):
+        limiter = AdaptiveLimiter(initial=2, maximum=3)
+
+        async def request(fail):
+            async with limiter:
+                await asyncio.sleep(0)
+                if fail:
+                    raise Exception('failed')
+
+        async def run():
+            await request(False)
+            self.assertEqual(3, limiter.limit)
+            await request(False)
+            self.assertEqual(3, limiter.limit)
+            with self.assertRaises(Exception):
+                await request(True)
+            self.assertEqual(1, limiter.limit)
+            await asyncio.gather(*[request(False) for i in range(5)])
+            self.assertEqual(0, limiter.active)
+        self.run_coro(run())
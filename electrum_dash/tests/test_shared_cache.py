@@ -0,0 +1,109 @@
+import asyncio
+
+from electrum_dash.shared_cache import LRUStore, SharedCache
+from electrum_dash.simple_config import SimpleConfig
+from electrum_dash.transaction import Transaction
+from electrum_dash.util import create_and_start_event_loop
+from electrum_dash.wallet_db import WalletDB
+
+from . import ElectrumTestCase
+
+
+RAW_TX = ('01000000012a5c9a94fcde98f5581cd00162c60a13936ceb75389ea65bf3'
+          '8633b424eb4031000000006c493046022100a82bbc57a0136751e5433f41cf00'
+          '0b3f1a99c6744775e76ec764fb78c54ee100022100f9e80b7de89de861dc6fb0'
+          'c1429d5da72c2b6b2ee2406bc9bfb1beedd729d985012102e61d176da16edd1d'
+          '258a200ad9759ef63adf8e14cd97f53227bae35cdb84d2f6ffffffff0140420f'
+          '00000000001976a914230ac37834073a42146f11ef8414ae929feaafc388ac00'
+          '000000')
+
+
+class TestLRUStore(ElectrumTestCase):
+
+    def test_evict_by_size(self):
+        store = LRUStore(10, len)
+        store.put('a', 'xxxx')
+        store.put('b', 'xxxx')
+        self.assertEqual('xxxx', store.get('a'))  # 'b' is oldest now
+        store.put('c', 'xxxx')
+        self.assertEqual(8, store.size)
+        self.assertNotIn('b', store)
+        self.assertIn('a', store)
+        store.put('d', 'x' * 11)  # too big to store
+        self.assertNotIn('d', store)
+        self.assertEqual('xxxx', store.pop('a'))
+        self.assertEqual(4, store.size)
+
+
+class TestSharedCache(ElectrumTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.asyncio_loop, self._stop_loop, self._loop_thread = create_and_start_event_loop()
+        self.config = SimpleConfig({'electrum_path': self.electrum_path})
+        self.cache = SharedCache(self.config)
+
+    def tearDown(self):
+        super().tearDown()
+        self.asyncio_loop.call_soon_threadsafe(self._stop_loop.set_result, 1)
+        self._loop_thread.join(timeout=1)
+
+    def run_coro(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.asyncio_loop).result()
+
+    def test_merge_concurrent_requests(self):
+        cache = self.cache
+        requests = []
+
+        async def fetch():
+            requests.append(1)
+            await asyncio.sleep(0.1)
+            cache.put(cache.HISTORIES, ('sh', 'status'), ['h'])
+            return ['h']
+
+        async def get_many():
+            return await asyncio.gather(*[
+                cache.get_history('sh', 'status', fetch) for i in range(5)])
+
+        self.assertEqual([['h']] * 5, self.run_coro(get_many()))
+        self.assertEqual(1, len(requests))
+        self.assertEqual(['h'], self.run_coro(
+            cache.get_history('sh', 'status', fetch)))
+        self.assertEqual(1, len(requests))
+        stats = cache.get_stats()['histories']
+        self.assertEqual({'misses': 1, 'merged': 4, 'hits': 1,
+                          'count': 1, 'size': 1}, stats)
+
+    def test_fetch_error(self):
+        cache = self.cache
+
+        async def fetch():
+            await asyncio.sleep(0.1)
+            raise Exception('not found')
+
+        async def get_two():
+            return await asyncio.gather(
+                cache.get_merkle('txid', 1, fetch),
+                cache.get_merkle('txid', 1, fetch),
+                return_exceptions=True)
+
+        res = self.run_coro(get_two())
+        self.assertEqual(['not found'] * 2, [str(e) for e in res])
+        self.assertEqual(0, cache.get_stats()['proofs']['count'])
+
+    def test_transaction_from_wallet_db(self):
+        cache = self.cache
+        tx = Transaction(RAW_TX)
+        txid = tx.txid()
+        db = WalletDB('', manual_upgrades=False)
+        db.add_transaction(txid, tx)
+        cache.register_db(db)
+
+        async def fetch():
+            raise Exception('should not be called')
+
+        self.assertEqual(RAW_TX, self.run_coro(
+            cache.get_transaction(txid, fetch)))
+        self.assertEqual(1, cache.get_stats()['txs']['db_hits'])
+        cache.unregister_db(db)
+        self.assertEqual(0, cache.get_stats()['wallets'])
@@ -2,7 +2,9 @@ import os
 
 from unittest.mock import patch
 
-from electrum_dash.storage import WalletStorage
+from electrum_dash import storage as storage_module
+from electrum_dash.storage import WalletStorage, StorageEncryptionVersion
+from electrum_dash.util import InvalidPassword, WalletFileException
 
 from . import ElectrumTestCase
 
@@ -49,3 +51,75 @@ class TestWalletStorage(ElectrumTestCase):
         with patch('os.replace', new_callable=ReplaceWithPermissionErrorMock):
             with self.assertRaises(PermissionError):
                 storage.write(data)
+
+    def test_chunked_encryption(self):
+        path = os.path.join(self.electrum_path, 'default_wallet')
+        data = ''.join(f'{{"key{i}": "value {i} \u20ac"}}, ' for i in range(5000))
+        storage = WalletStorage(path)
+        storage.set_password('pw', StorageEncryptionVersion.USER_PASSWORD,
+                             chunked=True)
+        with patch.object(storage_module, 'CHUNKED_ENC_CHUNK_SIZE', 10000):
+            storage.write(data)
+            with open(path, 'rb') as fd:
+                assert fd.read(4) == b'BIC1'
+            storage = WalletStorage(path)
+            assert storage.is_encrypted_with_user_pw()
+            assert storage.is_chunked_encryption()
+            with self.assertRaises(InvalidPassword):
+                storage.decrypt('wrong')
+            storage.decrypt('pw')
+            assert storage.read() == data
+            storage.check_password('pw')
+            chunks = list(WalletStorage._split_chunks(data))
+            assert ''.join(chunks) == data
+            assert len(chunks) > 5
+            assert max(map(len, chunks)) <= 40000
+            assert len(storage._chunks) == len(chunks)
+
+            # only changed chunks are re-encrypted, on insertion too
+            new_data = data[:50000] + 'x' + data[50000:]
+            with patch.object(WalletStorage, '_encrypt_record',
+                              wraps=WalletStorage._encrypt_record) as enc:
+                storage.write(new_data)
+                assert enc.call_count == 2  # changed chunk + last record
+            storage = WalletStorage(path)
+            storage.decrypt('pw')
+            assert storage.read() == new_data
+
+            # truncated or modified file is detected
+            with open(path, 'rb') as fd:
+                raw = fd.read()
+            i = len(raw) // 2
+            for corrupted in [raw[:-20], raw[:i] + bytes([raw[i] ^ 1]) + raw[i+1:]]:
+                with open(path, 'wb') as fd:
+                    fd.write(corrupted)
+                with self.assertRaises(WalletFileException):
+                    WalletStorage(path).decrypt('pw')
+
+    def test_legacy_encryption(self):
+        path = os.path.join(self.electrum_path, 'default_wallet')
+        storage = WalletStorage(path)
+        # legacy encrypted file is read and written in the same format
+        storage.pubkey = storage.get_eckey_from_password('pw').get_public_key_hex()
+        storage._encryption_version = StorageEncryptionVersion.USER_PASSWORD
+        storage.write('testdata')
+        storage = WalletStorage(path)
+        assert storage.is_encrypted_with_user_pw()
+        assert not storage.is_chunked_encryption()
+        storage.decrypt('pw')
+        assert storage.read() == 'testdata'
+        storage.write('testdata2')
+        with open(path, 'r') as fd:
+            assert fd.read(4) == 'QklF'  # base64 of BIE1
+        # changing password keeps the format unless upgrade is requested
+        storage.set_password('pw2')
+        storage.write('testdata2')
+        storage = WalletStorage(path)
+        assert not storage.is_chunked_encryption()
+        storage.decrypt('pw2')
+        storage.set_password('pw2', chunked=True)
+        storage.write('testdata2')
+        storage = WalletStorage(path)
+        assert storage.is_chunked_encryption()
+        storage.decrypt('pw2')
+        assert storage.read() == 'testdata2'
@@ -62,6 +62,30 @@ class TestBCDataStream(ElectrumTestCase):
         self.assertEqual(s.read_bytes(1), b'r')
         self.assertEqual(s.read_bytes(0), b'')
 
+    def test_view(self):
+        s = transaction.BCDataStream()
+        with self.assertRaises(transaction.SerializationError):
+            s.read_view(1)
+        s.write(b'foo')
+        s.write(bytearray(b'bar'))
+        view = s.read_view(4)
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(view, b'foob')
+        self.assertEqual(s.read_bytes(1), b'a')
+        s.write(b'baz')  # written while view is exported
+        self.assertEqual(view, b'foob')
+        self.assertEqual(s.read_view(4), b'rbaz')
+        with self.assertRaises(transaction.SerializationError):
+            s.read_view(1)
+        self.assertEqual(s.read_view(0), b'')
+
+        raw = b'\xfd\x01\x02\x03'
+        s = transaction.BCDataStream()
+        s.write(raw)
+        self.assertIs(s.input, raw)  # bytes are not copied
+        self.assertEqual(s.read_varint(), 0x0201)
+        self.assertEqual(s.read_view(1), b'\x03')
+
     def test_bool(self):
         s = transaction.BCDataStream()
         s.write(b'f\x00\x00b')
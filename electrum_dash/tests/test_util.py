@@ -1,3 +1,4 @@
+import io
 from decimal import Decimal
 
 from electrum_dash.util import (format_satoshis, format_fee_satoshis, parse_URI,
@@ -5,7 +6,8 @@ from electrum_dash.util import (format_satoshis, format_fee_satoshis, parse_URI,
                                 is_ip_address, list_enabled_bits,
                                 format_satoshis_plain, is_private_netaddress,
                                 is_hex_str, is_integer, is_non_negative_integer,
-                                is_int_or_float, is_non_negative_int_or_float)
+                                is_int_or_float, is_non_negative_int_or_float,
+                                json_encode, json_encode_iter, Satoshis)
 
 from . import ElectrumTestCase
 
@@ -316,3 +318,10 @@ class TestUtil(ElectrumTestCase):
         self.assertFalse(is_private_netaddress("[2a00:1450:400e:80d::200e]"))
         self.assertFalse(is_private_netaddress("8.8.8.8"))
         self.assertFalse(is_private_netaddress("example.com"))
+
+    def test_json_encode_iter(self):
+        for items in [[], [1], [{'b': Satoshis(1), 'a': [1, {'c': None}]},
+                                'x', {}, [Decimal('1.5')]]]:
+            f = io.StringIO()
+            json_encode_iter(iter(items), f)
+            self.assertEqual(json_encode(items), f.getvalue())
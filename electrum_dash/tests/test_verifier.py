@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
+import asyncio
 
 from electrum_dash.bitcoin import hash_encode
+from electrum_dash.interface import GracefulDisconnect
+from electrum_dash.logging import Logger
+from electrum_dash.shared_cache import SharedCache
+from electrum_dash.simple_config import SimpleConfig
 from electrum_dash.transaction import Transaction
-from electrum_dash.util import bfh
+from electrum_dash.util import bfh, create_and_start_event_loop
 from electrum_dash.verifier import SPV, InnerNodeOfSpvProofIsValidTx
 
 from . import TestCaseForTestnet
@@ -48,3 +53,92 @@ class VerifierTestCase(TestCaseForTestnet):
         f_tx_hash = hash_encode(bfh(VALID_64_BYTE_TX[:64]))
         with self.assertRaises(InnerNodeOfSpvProofIsValidTx):
             SPV.hash_merkle_root(fake_mbranch, f_tx_hash, 6)
+
+
+TX_HEIGHT = 100
+GOOD_PROOF = {'block_height': TX_HEIGHT, 'pos': 3, 'merkle': MERKLE_BRANCH}
+BAD_PROOF = {'block_height': TX_HEIGHT, 'pos': 2, 'merkle': MERKLE_BRANCH}
+
+
+class FakeBlockchain:
+
+    def read_header(self, height):
+        return {'version': 1, 'prev_block_hash': '00' * 32,
+                'merkle_root': MERKLE_ROOT, 'timestamp': 1, 'bits': 0,
+                'nonce': 0, 'block_height': height}
+
+
+class FakeNetwork:
+
+    def __init__(self, config, proof):
+        self.config = config
+        self.shared_cache = SharedCache(config)
+        self.bhi_lock = asyncio.Lock()
+        self.proof = proof
+        self.requests = 0
+
+    def blockchain(self):
+        return FakeBlockchain()
+
+    async def get_merkle_for_transaction(self, tx_hash, tx_height):
+        self.requests += 1
+        return self.proof
+
+
+class FakeWallet:
+
+    def __init__(self):
+        self.verified = {}
+
+    def diagnostic_name(self):
+        return 'fake_wallet'
+
+    def add_verified_tx(self, tx_hash, info):
+        self.verified[tx_hash] = info
+
+
+class SharedCacheProofTestCase(TestCaseForTestnet):
+
+    def setUp(self):
+        super().setUp()
+        self.asyncio_loop, self._stop_loop, self._loop_thread = create_and_start_event_loop()
+        self.config = SimpleConfig({'electrum_path': self.electrum_path})
+        self.tx_hash = Transaction(VALID_64_BYTE_TX).txid()
+
+    def tearDown(self):
+        super().tearDown()
+        self.asyncio_loop.call_soon_threadsafe(self._stop_loop.set_result, 1)
+        self._loop_thread.join(timeout=1)
+
+    def run_coro(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.asyncio_loop).result()
+
+    def make_spv(self, server_proof):
+        network = FakeNetwork(self.config, server_proof)
+        # bad proof in shared cache put by other server
+        key = (self.tx_hash, TX_HEIGHT)
+        network.shared_cache.put(SharedCache.PROOFS, key, BAD_PROOF)
+        spv = SPV.__new__(SPV)
+        spv.network = network
+        spv.wallet = FakeWallet()
+        Logger.__init__(spv)
+        spv._network_request_semaphore = asyncio.Semaphore(1)
+        spv._reset()
+        return spv
+
+    def test_bad_cached_proof_is_refetched(self):
+        spv = self.make_spv(GOOD_PROOF)
+        self.run_coro(spv._request_and_verify_single_proof(self.tx_hash,
+                                                           TX_HEIGHT))
+        self.assertEqual(1, spv.network.requests)
+        self.assertIn(self.tx_hash, spv.wallet.verified)
+        cached = spv.network.shared_cache.stores[SharedCache.PROOFS]
+        self.assertEqual(GOOD_PROOF, cached.get((self.tx_hash, TX_HEIGHT)))
+
+    def test_bad_server_proof_disconnects(self):
+        spv = self.make_spv(BAD_PROOF)
+        with self.assertRaises(GracefulDisconnect):
+            self.run_coro(spv._request_and_verify_single_proof(self.tx_hash,
+                                                               TX_HEIGHT))
+        self.assertEqual(1, spv.network.requests)
+        self.assertEqual({}, spv.wallet.verified)
@@ -13,9 +13,10 @@ from electrum_dash.wallet_db import FINAL_SEED_VERSION
 from electrum_dash.wallet import (Abstract_Wallet, Standard_Wallet, create_new_wallet,
                              restore_wallet_from_text, Imported_Wallet, Wallet)
 from electrum_dash.exchange_rate import ExchangeBase, FxThread
+from electrum_dash.acquisition_cost import AcquisitionCostEngine
 from electrum_dash.util import TxMinedInfo, InvalidPassword
 from electrum_dash.bitcoin import COIN
-from electrum_dash.wallet_db import WalletDB
+from electrum_dash.wallet_db import WalletDB, WalletSaver
 from electrum_dash.simple_config import SimpleConfig
 from electrum_dash import util
 
@@ -36,7 +37,8 @@ class WalletTestCase(ElectrumTestCase):
     def setUp(self):
         super(WalletTestCase, self).setUp()
         self.user_dir = tempfile.mkdtemp()
-        self.config = SimpleConfig({'electrum_path': self.user_dir})
+        self.config = SimpleConfig({'electrum_path': self.user_dir,
+                                    'wallet_save_delay': 0})
 
         self.wallet_path = os.path.join(self.user_dir, "somewallet")
 
@@ -85,6 +87,65 @@ class TestWalletStorage(WalletTestCase):
         for key, value in some_dict.items():
             self.assertEqual(d[key], value)
 
+class TestWalletSaver(WalletTestCase):
+
+    def test_coalesce_saves(self):
+        storage = WalletStorage(self.wallet_path)
+        db = WalletDB('', manual_upgrades=True)
+        saver = WalletSaver(db, storage, delay=60)
+        for i in range(10):
+            db.put('counter', i)
+            saver.request_save()
+        self.assertTrue(saver.has_pending_save())
+        self.assertFalse(storage.file_exists())
+        saver._on_timer()
+        self.assertFalse(saver.has_pending_save())
+        with open(self.wallet_path, "r") as f:
+            self.assertEqual(9, json.loads(f.read())['counter'])
+        stats = saver.get_stats()
+        self.assertEqual(10, stats['saves_requested'])
+        self.assertEqual(1, stats['saves_performed'])
+
+    def test_flush(self):
+        storage = WalletStorage(self.wallet_path)
+        db = WalletDB('', manual_upgrades=True)
+        saver = WalletSaver(db, storage, delay=60)
+        db.put('a', 'b')
+        saver.request_save()
+        saver.request_save()
+        self.assertTrue(saver.has_pending_save())
+        saver.flush()
+        self.assertFalse(saver.has_pending_save())
+        with open(self.wallet_path, "r") as f:
+            self.assertEqual('b', json.loads(f.read())['a'])
+        saver.flush()  # nothing modified
+        self.assertEqual(2, saver.saves_requested)
+        self.assertEqual(1, saver.saves_performed)
+
+    def test_no_delay(self):
+        storage = WalletStorage(self.wallet_path)
+        db = WalletDB('', manual_upgrades=True)
+        saver = WalletSaver(db, storage, delay=0)
+        db.put('a', 'b')
+        saver.request_save()
+        self.assertFalse(saver.has_pending_save())
+        self.assertTrue(storage.file_exists())
+        self.assertEqual(1, saver.saves_performed)
+
+    def test_directory_removed(self):
+        wallet_dir = os.path.join(self.user_dir, 'temp')
+        os.mkdir(wallet_dir)
+        storage = WalletStorage(os.path.join(wallet_dir, 'somewallet'))
+        db = WalletDB('', manual_upgrades=True)
+        saver = WalletSaver(db, storage, delay=60)
+        db.put('a', 'b')
+        saver.request_save()
+        shutil.rmtree(wallet_dir)
+        saver._on_timer()  # pending save is skipped
+        self.assertFalse(os.path.exists(wallet_dir))
+        self.assertEqual(0, saver.saves_performed)
+
+
 class FakeExchange(ExchangeBase):
     def __init__(self, rate):
         super().__init__(lambda self: None, lambda self: None)
@@ -106,6 +167,7 @@ class FakeWallet:
         self.fiat_value = fiat_value
         self.db = WalletDB("{}", manual_upgrades=True)
         self.db.transactions = self.db.verified_tx = {'abc':'Tx'}
+        self.acquisition_cost = AcquisitionCostEngine(self)
 
     def get_tx_height(self, txid):
         # because we use a current timestamp, and history is empty,
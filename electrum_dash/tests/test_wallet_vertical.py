@@ -1213,3 +1213,47 @@ class TestWalletCaches(TestCaseForTestnet):
 
         w.remove_transaction(txidA)
         assert w._tx_deltas_cache == {}
+
+    @mock.patch.object(wallet.Abstract_Wallet, 'save_db')
+    def test_tx_calc_cache(self, mock_save_db):
+        w = restore_wallet_from_text("hint shock chair puzzle shock traffic drastic note dinosaur mention suggest sweet",
+                                     path='if_this_exists_mocking_failed_648151893',
+                                     gap_limit=5,
+                                     config=self.config)['wallet']  # type: Abstract_Wallet
+        txidA, rawA = self.transactions[0]
+        txidB, rawB = self.transactions[1]
+
+        # tx B arrives before its prev tx A
+        w.add_transaction(Transaction(rawB), allow_unrelated=True)
+        txB = w.db.get_transaction(txidB)
+        assert w.get_tx_fee(txidB) is None
+        assert w.get_wallet_delta(txB).delta == 0
+        assert w.get_tx_fee(txidB) is None
+        assert w.get_wallet_delta(txB).delta == 0
+        stats = w.get_tx_calc_cache_stats()
+        assert stats['tx_fee']['hits'] == 1
+        assert stats['wallet_delta']['hits'] == 1
+        assert stats['wallet_delta']['size'] == 1
+
+        # cached values of B are invalidated when A arrives
+        w.add_transaction(Transaction(rawA))
+        assert w.get_tx_fee(txidB) == 1000
+        delta = w.get_wallet_delta(txB)
+        assert delta.delta == -83501163
+        assert delta.fee == 1000
+        assert delta.is_all_input_ismine
+        assert w.get_tx_fee(txidA) is None
+        assert w.get_wallet_delta(w.db.get_transaction(txidA)).delta == 83501163
+        assert w.get_wallet_delta(txB) == delta
+        stats = w.get_tx_calc_cache_stats()
+        assert stats['wallet_delta']['hits'] == 3  # get_tx_fee uses delta
+        assert stats['wallet_delta']['size'] == 2
+
+        # partial txs are not cached
+        ptx = PartialTransaction.from_tx(txB)
+        w.get_wallet_delta(ptx)
+        assert w.get_tx_calc_cache_stats()['wallet_delta']['hits'] == 3
+
+        w.remove_transaction(txidA)
+        assert w._wallet_delta_cache == {}
+        assert w._tx_fee_cache == {}
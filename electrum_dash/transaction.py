@@ -30,6 +30,7 @@
 import struct
 import io
 import base64
+import hashlib
 from typing import (Sequence, Union, NamedTuple, Tuple, Optional, Iterable,
                     Callable, List, Dict, Set, TYPE_CHECKING)
 from collections import defaultdict
@@ -44,7 +45,7 @@ from .util import profiler, to_bytes, bh2u, bfh, chunks, is_hex_str
 from .bitcoin import (TYPE_ADDRESS, TYPE_SCRIPT, hash_160,
                       hash160_to_p2sh, hash160_to_p2pkh,
                       var_int, TOTAL_COIN_SUPPLY_LIMIT_IN_BTC, COIN,
-                      int_to_hex, push_script, b58_address_to_hash160,
+                      int_to_bytes, var_int_bytes, push_script, b58_address_to_hash160,
                       opcodes, add_number_to_script, base_decode, base_encode,
                       construct_script)
 from .crypto import sha256d
@@ -59,6 +60,8 @@ if TYPE_CHECKING:
 _logger = get_logger(__name__)
 DEBUG_PSBT_PARSING = False
 
+SIGN_PARALLEL_MIN_INPUTS = 16  # lesser count of inputs is signed serially
+
 
 class SerializationError(Exception):
     """ Thrown when there's a problem deserializing or serializing """
@@ -91,8 +94,13 @@ class MissingTxInputAmount(Exception):
 SIGHASH_ALL = 1
 
 
+struct_b = struct.Struct('<b')
+struct_B = struct.Struct('<B')
+struct_le_h = struct.Struct('<h')
 struct_le_H = struct.Struct('<H')
+struct_le_i = struct.Struct('<i')
 struct_le_I = struct.Struct('<I')
+struct_le_q = struct.Struct('<q')
 struct_le_Q = struct.Struct('<Q')
 
 unpack_le_uint16_from = struct_le_H.unpack_from
@@ -116,14 +124,14 @@ class TxOutput:
     def serialize_to_network(self) -> bytes:
         buf = int.to_bytes(self.value, 8, byteorder="little", signed=False)
         script = self.scriptpubkey
-        buf += bfh(var_int(len(script.hex()) // 2))
+        buf += var_int_bytes(len(script))
         buf += script
         return buf
 
     @classmethod
     def from_network_bytes(cls, raw: bytes) -> 'TxOutput':
         vds = BCDataStream()
-        vds.write(raw)
+        vds.clear_and_set_bytes(raw)
         txout = parse_output(vds)
         if vds.can_read_more():
             raise SerializationError('extra junk at the end of TxOutput bytes')
@@ -190,7 +198,7 @@ class TxOutpoint(NamedTuple):
         return [self.txid.hex(), self.out_idx]
 
     def serialize_to_network(self) -> bytes:
-        return self.txid[::-1] + bfh(int_to_hex(self.out_idx, 4))
+        return self.txid[::-1] + int_to_bytes(self.out_idx, 4)
 
     def is_coinbase(self) -> bool:
         return self.txid == bytes(32)
@@ -241,10 +249,22 @@ class BCDataStream(object):
     """Workalike python implementation of Bitcoin's CDataStream class."""
 
     def __init__(self):
-        self.input = None  # type: Optional[bytearray]
+        self.input = None  # type: Optional[Union[bytes, bytearray]]
         self.read_cursor = 0
+        self._view = None  # type: Optional[memoryview]
+
+    def _release_view(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+
+    def _get_view(self) -> memoryview:
+        if self._view is None:
+            self._view = memoryview(self.input)
+        return self._view
 
     def clear(self):
+        self._release_view()
         self.input = None
         self.read_cursor = 0
 
@@ -256,9 +276,16 @@ class BCDataStream(object):
     def write(self, _bytes: Union[bytes, bytearray]):  # Initialize with string of _bytes
         assert isinstance(_bytes, (bytes, bytearray))
         if self.input is None:
-            self.input = bytearray(_bytes)
-        else:
-            self.input += bytearray(_bytes)
+            # bytes are immutable and can be read without copying
+            self.input = _bytes if type(_bytes) == bytes else bytearray(_bytes)
+            return
+        self._release_view()
+        if type(self.input) == bytes:
+            self.input = bytearray(self.input)
+        try:
+            self.input += _bytes
+        except BufferError:  # buffer is exported with read_view results
+            self.input = self.input + _bytes
 
     def read_string(self, encoding='ascii'):
         # Strings are encoded depending on length:
@@ -281,17 +308,32 @@ class BCDataStream(object):
         self.write_compact_size(len(string))
         self.write(string)
 
+    def read_view(self, length: int) -> memoryview:
+        """Read length bytes as memoryview on stream data, without copying.
+        The view must not be used after the stream is written to.
+        """
+        if self.input is None:
+            raise SerializationError("call write(bytes) before trying to deserialize")
+        assert length >= 0
+        read_begin = self.read_cursor
+        read_end = read_begin + length
+        if 0 <= read_begin <= read_end <= len(self.input):
+            self.read_cursor = read_end
+            return self._get_view()[read_begin:read_end]
+        else:
+            raise SerializationError('attempt to read past end of buffer')
+
     def read_bytes(self, length: int) -> bytes:
         if self.input is None:
             raise SerializationError("call write(bytes) before trying to deserialize")
         assert length >= 0
-        input_len = len(self.input)
         read_begin = self.read_cursor
         read_end = read_begin + length
-        if 0 <= read_begin <= read_end <= input_len:
-            result = self.input[read_begin:read_end]  # type: bytearray
-            self.read_cursor += length
-            return bytes(result)
+        if 0 <= read_begin <= read_end <= len(self.input):
+            self.read_cursor = read_end
+            if type(self.input) == bytes:
+                return self.input[read_begin:read_end]
+            return self._get_view()[read_begin:read_end].tobytes()
         else:
             raise SerializationError('attempt to read past end of buffer')
 
@@ -308,38 +350,38 @@ class BCDataStream(object):
         return len(self.input) - self.read_cursor
 
     def read_boolean(self) -> bool: return self.read_bytes(1) != b'\x00'
-    def read_char(self): return self._read_num('<b')
-    def read_uchar(self): return self._read_num('<B')
-    def read_int16(self): return self._read_num('<h')
-    def read_uint16(self): return self._read_num('<H')
-    def read_int32(self): return self._read_num('<i')
-    def read_uint32(self): return self._read_num('<I')
-    def read_int64(self): return self._read_num('<q')
-    def read_uint64(self): return self._read_num('<Q')
-    def read_varint(self): return self._read_varint()
+    def read_char(self): return self._read_struct(struct_b)
+    def read_uchar(self): return self._read_struct(struct_B)
+    def read_int16(self): return self._read_struct(struct_le_h)
+    def read_uint16(self): return self._read_struct(struct_le_H)
+    def read_int32(self): return self._read_struct(struct_le_i)
+    def read_uint32(self): return self._read_struct(struct_le_I)
+    def read_int64(self): return self._read_struct(struct_le_q)
+    def read_uint64(self): return self._read_struct(struct_le_Q)
+    def read_varint(self): return self.read_compact_size()
 
     def write_boolean(self, val): return self.write(b'\x01' if val else b'\x00')
-    def write_char(self, val): return self._write_num('<b', val)
-    def write_uchar(self, val): return self._write_num('<B', val)
-    def write_int16(self, val): return self._write_num('<h', val)
-    def write_uint16(self, val): return self._write_num('<H', val)
-    def write_int32(self, val): return self._write_num('<i', val)
-    def write_uint32(self, val): return self._write_num('<I', val)
-    def write_int64(self, val): return self._write_num('<q', val)
-    def write_uint64(self, val): return self._write_num('<Q', val)
+    def write_char(self, val): return self._write_struct(struct_b, val)
+    def write_uchar(self, val): return self._write_struct(struct_B, val)
+    def write_int16(self, val): return self._write_struct(struct_le_h, val)
+    def write_uint16(self, val): return self._write_struct(struct_le_H, val)
+    def write_int32(self, val): return self._write_struct(struct_le_i, val)
+    def write_uint32(self, val): return self._write_struct(struct_le_I, val)
+    def write_int64(self, val): return self._write_struct(struct_le_q, val)
+    def write_uint64(self, val): return self._write_struct(struct_le_Q, val)
 
     def read_compact_size(self):
         try:
             size = self.input[self.read_cursor]
             self.read_cursor += 1
             if size == 253:
-                size = self._read_num('<H')
+                size = self._read_struct(struct_le_H)
             elif size == 254:
-                size = self._read_num('<I')
+                size = self._read_struct(struct_le_I)
             elif size == 255:
-                size = self._read_num('<Q')
+                size = self._read_struct(struct_le_Q)
             return size
-        except IndexError as e:
+        except (IndexError, TypeError) as e:
             raise SerializationError("attempt to read past end of buffer") from e
 
     def write_compact_size(self, size):
@@ -348,54 +390,24 @@ class BCDataStream(object):
         elif size < 253:
             self.write(bytes([size]))
         elif size < 2**16:
-            self.write(b'\xfd')
-            self._write_num('<H', size)
+            self.write(b'\xfd' + struct_le_H.pack(size))
         elif size < 2**32:
-            self.write(b'\xfe')
-            self._write_num('<I', size)
+            self.write(b'\xfe' + struct_le_I.pack(size))
         elif size < 2**64:
-            self.write(b'\xff')
-            self._write_num('<Q', size)
+            self.write(b'\xff' + struct_le_Q.pack(size))
         else:
             raise Exception(f"size {size} too large for compact_size")
 
-    def _read_num(self, format):
+    def _read_struct(self, st: struct.Struct):
         try:
-            (i,) = struct.unpack_from(format, self.input, self.read_cursor)
-            self.read_cursor += struct.calcsize(format)
+            (i,) = st.unpack_from(self.input, self.read_cursor)
         except Exception as e:
             raise SerializationError(e) from e
+        self.read_cursor += st.size
         return i
 
-    def _read_le_uint16(self):
-        result, = unpack_le_uint16_from(self.binary, self.cursor)
-        self.cursor += 2
-        return result
-
-    def _read_le_uint32(self):
-        result, = unpack_le_uint32_from(self.binary, self.cursor)
-        self.cursor += 4
-        return result
-
-    def _read_le_uint64(self):
-        result, = unpack_le_uint64_from(self.binary, self.cursor)
-        self.cursor += 8
-        return result
-
-    def _read_varint(self):
-        n = self.input[self.read_cursor]
-        self.read_cursor += 1
-        if n < 253:
-            return n
-        if n == 253:
-            return self._read_le_uint16()
-        if n == 254:
-            return self._read_le_uint32()
-        return self._read_le_uint64()
-
-    def _write_num(self, format, num):
-        s = struct.pack(format, num)
-        self.write(s)
+    def _write_struct(self, st: struct.Struct, num):
+        self.write(st.pack(num))
 
 
 def script_GetOp(_bytes : bytes):
@@ -503,7 +515,7 @@ def get_address_from_output_script(_bytes: bytes, *, net=None) -> Optional[str]:
 
 
 def parse_input(vds: BCDataStream) -> TxInput:
-    prevout_hash = vds.read_bytes(32)[::-1]
+    prevout_hash = bytes(vds.read_view(32)[::-1])
     prevout_n = vds.read_uint32()
     prevout = TxOutpoint(txid=prevout_hash, out_idx=prevout_n)
     script_sig = vds.read_bytes(vds.read_compact_size())
@@ -532,7 +544,7 @@ def multisig_script(public_keys: Sequence[str], m: int) -> str:
 
 
 class Transaction:
-    _cached_network_ser: Optional[str]
+    _cached_network_ser: Optional[bytes]
 
     def __str__(self):
         return self.serialize()
@@ -541,10 +553,11 @@ class Transaction:
         if raw is None:
             self._cached_network_ser = None
         elif isinstance(raw, str):
-            self._cached_network_ser = raw.strip() if raw else None
-            assert is_hex_str(self._cached_network_ser)
+            raw = raw.strip() if raw else None
+            assert is_hex_str(raw)
+            self._cached_network_ser = bfh(raw)
         elif isinstance(raw, (bytes, bytearray)):
-            self._cached_network_ser = bh2u(raw)
+            self._cached_network_ser = bytes(raw)
         else:
             raise Exception(f"cannot initialize transaction from {raw}")
         self._inputs = None  # type: List[TxInput]
@@ -626,9 +639,8 @@ class Transaction:
         if self._inputs is not None:
             return
 
-        raw_bytes = bfh(self._cached_network_ser)
         vds = BCDataStream()
-        vds.write(raw_bytes)
+        vds.clear_and_set_bytes(self._cached_network_ser)
         Transaction.read_vds(vds, alone_data=True, tx=self)
 
     @classmethod
@@ -756,12 +768,16 @@ class Transaction:
 
     @classmethod
     def serialize_input(self, txin: TxInput, script: str) -> str:
+        return self.serialize_input_bytes(txin, bfh(script)).hex()
+
+    @classmethod
+    def serialize_input_bytes(self, txin: TxInput, script: bytes) -> bytes:
         # Prev hash and index
-        s = txin.prevout.serialize_to_network().hex()
+        s = txin.prevout.serialize_to_network()
         # Script length, script, sequence
-        s += var_int(len(script)//2)
+        s += var_int_bytes(len(script))
         s += script
-        s += int_to_hex(txin.nsequence, 4)
+        s += int_to_bytes(txin.nsequence, 4)
         return s
 
     def invalidate_ser_cache(self):
@@ -769,38 +785,46 @@ class Transaction:
         self._cached_txid = None
 
     def serialize(self) -> str:
-        if not self._cached_network_ser:
-            self._cached_network_ser = self.serialize_to_network(estimate_size=False, include_sigs=True)
-        return self._cached_network_ser
+        return Transaction.serialize_as_bytes(self).hex()
 
     def serialize_as_bytes(self) -> bytes:
-        return bfh(self.serialize())
+        if not self._cached_network_ser:
+            self._cached_network_ser = self.serialize_to_network_bytes(estimate_size=False, include_sigs=True)
+        return self._cached_network_ser
 
     def serialize_to_network(self, *, estimate_size=False, include_sigs=True) -> str:
         """Serialize the transaction as used on the Bitcoin network, into hex.
         `include_sigs` signals whether to include scriptSigs.
         """
+        return self.serialize_to_network_bytes(estimate_size=estimate_size,
+                                               include_sigs=include_sigs).hex()
+
+    def serialize_to_network_bytes(self, *, estimate_size=False, include_sigs=True) -> bytes:
+        """Serialize the transaction as used on the Bitcoin network, into bytes.
+        `include_sigs` signals whether to include scriptSigs.
+        """
         self.deserialize()
-        nVersion = int_to_hex(self.version, 4)
-        nLocktime = int_to_hex(self.locktime, 4)
+        nLocktime = int_to_bytes(self.locktime, 4)
         inputs = self.inputs()
         outputs = self.outputs()
 
-        def create_script_sig(txin: TxInput) -> str:
-            if include_sigs:
-                return self.input_script(txin, estimate_size=estimate_size)
-            return ''
-        txins = var_int(len(inputs)) + ''.join(self.serialize_input(txin, create_script_sig(txin))
-                                               for txin in inputs)
-        txouts = var_int(len(outputs)) + ''.join(o.serialize_to_network().hex() for o in outputs)
+        def create_script_sig(txin: TxInput) -> bytes:
+            if not include_sigs:
+                return b''
+            if txin.script_sig is not None:
+                return txin.script_sig
+            return bfh(self.input_script(txin, estimate_size=estimate_size))
+        txins = var_int_bytes(len(inputs)) + b''.join(self.serialize_input_bytes(txin, create_script_sig(txin))
+                                                      for txin in inputs)
+        txouts = var_int_bytes(len(outputs)) + b''.join(o.serialize_to_network() for o in outputs)
 
         if self.tx_type:
-            uVersion = int_to_hex(self.version, 2)
-            uTxType = int_to_hex(self.tx_type, 2)
-            vExtra = bh2u(to_varbytes(serialize_extra_payload(self)))
+            uVersion = int_to_bytes(self.version, 2)
+            uTxType = int_to_bytes(self.tx_type, 2)
+            vExtra = to_varbytes(serialize_extra_payload(self))
             return uVersion + uTxType + txins + txouts + nLocktime + vExtra
         else:
-            nVersion = int_to_hex(self.version, 4)
+            nVersion = int_to_bytes(self.version, 4)
             return nVersion + txins + txouts + nLocktime
 
     def to_qr_data(self) -> str:
@@ -815,11 +839,11 @@ class Transaction:
             if not self.is_complete():
                 return None
             try:
-                ser = self.serialize_to_network()
+                ser = self.serialize_to_network_bytes()
             except UnknownTxinType:
                 # we might not know how to construct scriptSig for some scripts
                 return None
-            self._cached_txid = bh2u(sha256d(bfh(ser))[::-1])
+            self._cached_txid = sha256d(ser)[::-1].hex()
         return self._cached_txid
 
     def add_info_from_wallet(self, wallet: 'Abstract_Wallet', **kwargs) -> None:
@@ -870,7 +894,7 @@ class Transaction:
         if not self.is_complete() or self._cached_network_ser is None:
             return len(self.serialize_to_network(estimate_size=True)) // 2
         else:
-            return len(self._cached_network_ser) // 2  # ASCII hex string
+            return len(self._cached_network_ser)
 
     def estimated_base_size(self):
         """Return an estimated base transaction size in bytes."""
@@ -1401,6 +1425,14 @@ class PartialTxOutput(TxOutput, PSBTSection):
         self._unknown.update(other_txout._unknown)
 
 
+class SharedTxDigestFields(NamedTuple):
+    # parts of sighash preimage shared by all inputs of tx
+    prefix: bytes                   # version, tx type, inputs count
+    txins: bytes                    # inputs serialized with empty scriptSig
+    txins_offsets: Sequence[int]    # offsets of inputs in txins
+    suffix: bytes                   # outputs, locktime, extra payload
+
+
 class PartialTransaction(Transaction):
 
     def __init__(self):
@@ -1647,33 +1679,79 @@ class PartialTransaction(Transaction):
         except MissingTxInputAmount:
             return None
 
-    def serialize_preimage(self, txin_index: int) -> str:
-        nVersion = int_to_hex(self.version, 4)
-        nLocktime = int_to_hex(self.locktime, 4)
+    def _calc_shared_txdigest_fields(self) -> SharedTxDigestFields:
         inputs = self.inputs()
         outputs = self.outputs()
+        if self.tx_type:
+            prefix = int_to_bytes(self.version, 2) + int_to_bytes(self.tx_type, 2)
+        else:
+            prefix = int_to_bytes(self.version, 4)
+        prefix += var_int_bytes(len(inputs))
+        txins = []
+        txins_offsets = [0]
+        for txin in inputs:
+            ser_txin = (txin.prevout.serialize_to_network() + b'\x00'
+                        + struct.pack('<I', txin.nsequence))
+            txins.append(ser_txin)
+            txins_offsets.append(txins_offsets[-1] + len(ser_txin))
+        suffix = [var_int_bytes(len(outputs))]
+        suffix.extend(o.serialize_to_network() for o in outputs)
+        suffix.append(struct.pack('<I', self.locktime))
+        if self.tx_type:
+            suffix.append(to_varbytes(serialize_extra_payload(self)))
+        return SharedTxDigestFields(prefix=prefix,
+                                    txins=b''.join(txins),
+                                    txins_offsets=txins_offsets,
+                                    suffix=b''.join(suffix))
+
+    def _preimage_parts(self, txin_index: int, *,
+                        shared_txdigest_fields: SharedTxDigestFields = None) -> Sequence[bytes]:
+        inputs = self.inputs()
         txin = inputs[txin_index]
         sighash = txin.sighash if txin.sighash is not None else SIGHASH_ALL
         if sighash != SIGHASH_ALL:
             raise Exception("only SIGHASH_ALL signing is supported!")
-        nHashType = int_to_hex(sighash, 4)
-        preimage_script = self.get_preimage_script(txin)
-        txins = var_int(len(inputs)) + ''.join(self.serialize_input(txin, preimage_script if txin_index==k else '')
-                                               for k, txin in enumerate(inputs))
-        txouts = var_int(len(outputs)) + ''.join(o.serialize_to_network().hex() for o in outputs)
-        if self.tx_type:
-            uVersion = int_to_hex(self.version, 2)
-            uTxType = int_to_hex(self.tx_type, 2)
-            vExtra = bh2u(to_varbytes(serialize_extra_payload(self)))
-            preimage = uVersion + uTxType + txins + txouts + nLocktime + vExtra + nHashType
-        else:
-            nVersion = int_to_hex(self.version, 4)
-            preimage = nVersion + txins + txouts + nLocktime + nHashType
-        return preimage
-
-    def sign(self, keypairs) -> int:
+        if shared_txdigest_fields is None:
+            shared_txdigest_fields = self._calc_shared_txdigest_fields()
+        prefix, txins, txins_offsets, suffix = shared_txdigest_fields
+        preimage_script = bfh(self.get_preimage_script(txin))
+        ser_txin = (txin.prevout.serialize_to_network()
+                    + var_int_bytes(len(preimage_script)) + preimage_script
+                    + struct.pack('<I', txin.nsequence))
+        txins = memoryview(txins)
+        return [prefix,
+                txins[:txins_offsets[txin_index]],
+                ser_txin,
+                txins[txins_offsets[txin_index+1]:],
+                suffix,
+                struct.pack('<I', sighash)]
+
+    def serialize_preimage(self, txin_index: int, *,
+                           shared_txdigest_fields: SharedTxDigestFields = None) -> str:
+        parts = self._preimage_parts(txin_index,
+                                     shared_txdigest_fields=shared_txdigest_fields)
+        return b''.join(parts).hex()
+
+    def preimage_hash(self, txin_index: int, *,
+                      shared_txdigest_fields: SharedTxDigestFields = None) -> bytes:
+        """Returns sha256d of sighash preimage for txin, shared parts
+        are hashed without joining into preimage.
+        """
+        parts = self._preimage_parts(txin_index,
+                                     shared_txdigest_fields=shared_txdigest_fields)
+        h = hashlib.sha256()
+        for part in parts:
+            h.update(part)
+        return hashlib.sha256(h.digest()).digest()
+
+    def sign(self, keypairs, *, parallel=False) -> int:
         # keypairs:  pubkey_hex -> (secret_bytes, is_compressed)
+        # parallel: precompute signatures in thread pool, result is the same
         signed_txins_cnt = 0
+        shared_txdigest_fields = None
+        sigs = {}
+        if parallel and len(self.inputs()) >= SIGN_PARALLEL_MIN_INPUTS:
+            sigs = self._sign_parallel(keypairs)
         for i, txin in enumerate(self.inputs()):
             pubkeys = [pk.hex() for pk in txin.pubkeys]
             for pubkey in pubkeys:
@@ -1682,8 +1760,12 @@ class PartialTransaction(Transaction):
                 if pubkey not in keypairs:
                     continue
                 _logger.info(f"adding signature for {pubkey}")
-                sec, compressed = keypairs[pubkey]
-                sig = self.sign_txin(i, sec)
+                sig = sigs.get((i, pubkey))
+                if sig is None:
+                    sec, compressed = keypairs[pubkey]
+                    if shared_txdigest_fields is None:
+                        shared_txdigest_fields = self._calc_shared_txdigest_fields()
+                    sig = self.sign_txin(i, sec, shared_txdigest_fields=shared_txdigest_fields)
                 self.add_signature_to_txin(txin_idx=i, signing_pubkey=pubkey, sig=sig)
                 signed_txins_cnt += 1
 
@@ -1691,10 +1773,52 @@ class PartialTransaction(Transaction):
         self.invalidate_ser_cache()
         return signed_txins_cnt
 
-    def sign_txin(self, txin_index, privkey_bytes) -> str:
+    def _sign_parallel(self, keypairs) -> Dict[Tuple[int, str], str]:
+        '''Sighashes are calculated first, then signed in thread pool
+        (libsecp256k1 calls release GIL). Signatures are deterministic
+        (RFC6979), so same as in serial signing'''
+        shared_txdigest_fields = self._calc_shared_txdigest_fields()
+        jobs = []
+        for i, txin in enumerate(self.inputs()):
+            if txin.is_complete():
+                continue
+            pre_hash = None
+            for pk in txin.pubkeys:
+                pubkey = pk.hex()
+                if pubkey not in keypairs:
+                    continue
+                if pre_hash is None:
+                    txin.validate_data(for_signing=True)
+                    pre_hash = self.preimage_hash(
+                        i, shared_txdigest_fields=shared_txdigest_fields)
+                jobs.append(((i, pubkey), keypairs[pubkey][0], pre_hash))
+
+        def sign_jobs(jobs_chunk):
+            privkeys = {}
+            res = []
+            for key, sec, pre_hash in jobs_chunk:
+                privkey = privkeys.get(sec)
+                if privkey is None:
+                    privkey = privkeys[sec] = ecc.ECPrivkey(sec)
+                sig = privkey.sign_transaction(pre_hash)
+                res.append((key, bh2u(sig) + '01'))  # SIGHASH_ALL
+            return res
+
+        if not jobs:
+            return {}
+        chunk_size = -(-len(jobs) // ecc.ECC_MAX_WORKERS)
+        sigs = {}
+        executor = ecc.get_ecc_executor()
+        for res in executor.map(sign_jobs, chunks(jobs, chunk_size)):
+            sigs.update(res)
+        return sigs
+
+    def sign_txin(self, txin_index, privkey_bytes, *,
+                  shared_txdigest_fields: SharedTxDigestFields = None) -> str:
         txin = self.inputs()[txin_index]
         txin.validate_data(for_signing=True)
-        pre_hash = sha256d(bfh(self.serialize_preimage(txin_index)))
+        pre_hash = self.preimage_hash(txin_index,
+                                      shared_txdigest_fields=shared_txdigest_fields)
         privkey = ecc.ECPrivkey(privkey_bytes)
         sig = privkey.sign_transaction(pre_hash)
         sig = bh2u(sig) + '01'  # SIGHASH_ALL
@@ -52,11 +52,9 @@ from struct import Struct
 
 import attr
 import aiohttp
-from aiohttp_socks import ProxyConnector, ProxyType
 import aiorpcx
 from aiorpcx import TaskGroup
 import certifi
-import dns.resolver
 
 from .i18n import _
 from .logging import get_logger, Logger, ShortcutInjectingFilter
@@ -416,6 +414,17 @@ def json_encode(obj):
         s = repr(obj)
     return s
 
+def json_encode_iter(items, f):
+    '''Write items to file f as JSON list, one item at a time.
+    Output is the same as of json_encode(list(items))'''
+    first = True
+    for item in items:
+        s = json.dumps(item, sort_keys=True, indent=4, cls=MyEncoder)
+        f.write('[\n    ' if first else ',\n    ')
+        f.write(s.replace('\n', '\n    '))
+        first = False
+    f.write('[]' if first else '\n]')
+
 def json_decode(x):
     try:
         return json.loads(x, parse_float=Decimal)
@@ -1149,6 +1158,7 @@ def make_aiohttp_session(proxy: Optional[dict], headers=None, timeout=None):
     ssl_context = ssl.create_default_context(purpose=ssl.Purpose.SERVER_AUTH, cafile=ca_path)
 
     if proxy:
+        from aiohttp_socks import ProxyConnector, ProxyType
         connector = ProxyConnector(
             proxy_type=ProxyType.SOCKS5 if proxy['mode'] == 'socks5' else ProxyType.SOCKS4,
             host=proxy['host'],
@@ -1364,6 +1374,7 @@ def list_enabled_bits(x: int) -> Sequence[int]:
 
 
 def resolve_dns_srv(host: str):
+    import dns.resolver
     srv_records = dns.resolver.resolve(host, 'SRV')
     # priority: prefer lower
     # weight: tie breaker; prefer higher
@@ -95,10 +95,23 @@ class SPV(NetworkJobOnDefaultServer):
             self.requested_merkle.add(tx_hash)
             await self.taskgroup.spawn(self._request_and_verify_single_proof, tx_hash, tx_height)
 
-    async def _request_and_verify_single_proof(self, tx_hash, tx_height):
-        try:
+    async def _request_and_verify_single_proof(self, tx_hash, tx_height,
+                                               *, use_cache=True):
+        cache = self.network.shared_cache
+        cache_key = (tx_hash, tx_height)
+        from_server = False  # proof is fetched by this request
+
+        async def fetch_merkle():
+            nonlocal from_server
+            from_server = True
             async with self._network_request_semaphore:
-                merkle = await self.network.get_merkle_for_transaction(tx_hash, tx_height)
+                return await self.network.get_merkle_for_transaction(tx_hash, tx_height)
+
+        try:
+            if use_cache:
+                merkle = await cache.get_merkle(*cache_key, fetch_merkle)
+            else:
+                merkle = await fetch_merkle()
         except UntrustedServerReturnedError as e:
             if not isinstance(e.original_exception, aiorpcx.jsonrpc.RPCError):
                 raise
@@ -120,11 +133,22 @@ class SPV(NetworkJobOnDefaultServer):
         try:
             verify_tx_is_in_block(tx_hash, merkle_branch, pos, header, tx_height)
         except MerkleVerificationFailure as e:
+            cache.remove_merkle(tx_hash)
+            if not from_server:
+                # cached proof can come from other server, do not blame
+                # this one before its own proof is checked
+                self.logger.info(f'cached merkle proof for {tx_hash}'
+                                 f' failed: {repr(e)}, refetching')
+                await self._request_and_verify_single_proof(
+                    tx_hash, cache_key[1], use_cache=False)
+                return
             if self.network.config.get("skipmerklecheck"):
                 self.logger.info(f"skipping merkle proof check {tx_hash}")
             else:
                 self.logger.info(repr(e))
                 raise GracefulDisconnect(e) from e
+        else:
+            cache.put(cache.PROOFS, cache_key, merkle)
         # we passed all the tests
         self.merkle_roots[tx_hash] = header.get('merkle_root')
         self.requested_merkle.discard(tx_hash)
@@ -186,6 +210,9 @@ class SPV(NetworkJobOnDefaultServer):
                 self.remove_spv_proof_for_tx(tx_hash)
 
     def remove_spv_proof_for_tx(self, tx_hash):
+        # can be called from non asyncio threads
+        self.network.asyncio_loop.call_soon_threadsafe(
+            self.network.shared_cache.remove_merkle, tx_hash)
         self.merkle_roots.pop(tx_hash, None)
         self.requested_merkle.discard(tx_hash)
 
@@ -68,7 +68,7 @@ from .keystore import (load_keystore, Hardware_KeyStore, KeyStore, KeyStoreWithM
                        AddressIndexGeneric, CannotDerivePubkey)
 from .util import multisig_type
 from .storage import StorageEncryptionVersion, WalletStorage
-from .wallet_db import WalletDB
+from .wallet_db import WalletDB, WalletSaver
 from . import transaction, bitcoin, coinchooser, paymentrequest, ecc, bip32
 from .transaction import (Transaction, TxInput, UnknownTxinType, TxOutput,
                           PartialTransaction, PartialTxInput, PartialTxOutput, TxOutpoint)
@@ -79,6 +79,7 @@ from .address_synchronizer import (AddressSynchronizer, TX_HEIGHT_LOCAL,
 from .invoices import Invoice, OnchainInvoice, InvoiceExt
 from .invoices import PR_PAID, PR_UNPAID, PR_UNKNOWN, PR_EXPIRED, PR_UNCONFIRMED, PR_TYPE_ONCHAIN
 from .contacts import Contacts
+from .acquisition_cost import AcquisitionCostEngine
 from .interface import NetworkException
 from .mnemonic import Mnemonic
 from .logging import get_logger
@@ -196,7 +197,7 @@ async def sweep(
         locktime = get_locktime_for_new_transaction(network)
 
     tx = PartialTransaction.from_io(inputs, outputs, locktime=locktime, version=tx_version)
-    tx.sign(keypairs)
+    tx.sign(keypairs, parallel=True)
     return tx
 
 
@@ -257,6 +258,8 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
         assert self.config is not None, "config must not be None"
         self.db = db
         self.storage = storage
+        save_delay = config.get('wallet_save_delay', WalletSaver.DEFAULT_DELAY)
+        self.saver = WalletSaver(db, storage, delay=save_delay)
         # load addresses needs to be called before constructor for sanity checks
         db.load_addresses(self.wallet_type)
         self.keystore = None  # type: Optional[KeyStore]  # will be set by load_keystore
@@ -282,11 +285,15 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
         if self.db.get('wallet_type') is None:
             self.db.put('wallet_type', self.wallet_type)
         self.contacts = Contacts(self.db)
-        self._coin_price_cache = {}
+        self.acquisition_cost = AcquisitionCostEngine(self)
 
-    def save_db(self):
-        if self.storage:
-            self.db.write(self.storage)
+    def save_db(self, *, flush=False):
+        '''Request coalesced db write done from background saver thread,
+        with flush=True write pending changes on the calling thread'''
+        if flush:
+            self.saver.flush()
+        else:
+            self.saver.request_save()
 
     def save_backup(self, backup_dir):
         new_db = WalletDB(self.db.dump(), manual_upgrades=False)
@@ -304,9 +311,11 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
             async with ignore_after(5):
                 await super().stop()
         finally:  # even if we get cancelled
+            util.unregister_callback(self.on_fx_history)
             if any([ks.is_requesting_to_be_rewritten_to_wallet_file for ks in self.get_keystores()]):
                 self.save_keystore()
-            self.save_db()
+            self.save_db(flush=True)
+            self.logger.info(f'wallet saver stats: {self.saver.get_stats()}')
 
     def set_up_to_date(self, b):
         super().set_up_to_date(b)
@@ -320,10 +329,17 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
                           f' manager is in {self.psman.state} state')
                     return
         super().clear_history()
+        self.acquisition_cost.clear()
         self.save_db()
 
     def start_network(self, network):
         AddressSynchronizer.start_network(self, network)
+        if network:
+            util.register_callback(self.on_fx_history, ['on_history'])
+
+    def on_fx_history(self, event):
+        # historical rates updated
+        self.acquisition_cost.clear()
 
     def load_and_cleanup(self):
         self.load_keystore()
@@ -450,6 +466,7 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
             if ccy not in self.fiat_value:
                 self.fiat_value[ccy] = {}
             self.fiat_value[ccy][txid] = text
+        self.acquisition_cost.invalidate([txid])
         return reset
 
     def get_fiat_value(self, txid, ccy):
@@ -677,8 +694,11 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
         # return last balance
         return balance
 
-    def get_onchain_history(self, *, domain=None, group_ps=False):
+    def get_onchain_history(self, *, domain=None, group_ps=False,
+                            from_timestamp=None, to_timestamp=None,
+                            from_height=None, to_height=None):
         monotonic_timestamp = 0
+        now = time.time()
         for hist_item in self.get_history(domain=domain, config=self.config,
                                           group_ps=group_ps):
             mined_ts = hist_item.tx_mined_status.timestamp
@@ -686,6 +706,16 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
             if not mined_ts and islock:
                 mined_ts = islock
             monotonic_timestamp = max(monotonic_timestamp, (mined_ts or 999_999_999_999))
+            # filter items before building them
+            if from_timestamp and (mined_ts or now) < from_timestamp:
+                continue
+            if to_timestamp and (mined_ts or now) >= to_timestamp:
+                continue
+            height = hist_item.tx_mined_status.height
+            if from_height is not None and from_height > height > 0:
+                continue
+            if to_height is not None and (height >= to_height or height <= 0):
+                continue
             yield {
                 'txid': hist_item.txid,
                 'fee_sat': hist_item.fee,
@@ -899,10 +929,16 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
     def add_transaction(self, tx, *, allow_unrelated=False):
         is_known = bool(self.db.get_transaction(tx.txid()))
         tx_was_added = super().add_transaction(tx, allow_unrelated=allow_unrelated)
+        if tx_was_added:
+            self.acquisition_cost.invalidate([tx.txid()])
         if tx_was_added and not is_known:
             self._maybe_set_tx_label_based_on_invoices(tx)
         return tx_was_added
 
+    def remove_transaction(self, tx_hash):
+        self.acquisition_cost.invalidate([tx_hash])
+        super().remove_transaction(tx_hash)
+
     @profiler
     def get_full_history(self, fx=None, *, onchain_domain=None, group_ps=False):
         transactions_tmp = OrderedDictWithIndex()
@@ -965,34 +1001,69 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
             to_height=None,
             group_ps=False):
         # History with capital gains, using utxo pricing
+        stats = {}
+        out = list(self.iter_detailed_history(from_timestamp=from_timestamp,
+                                              to_timestamp=to_timestamp,
+                                              fx=fx,
+                                              show_addresses=show_addresses,
+                                              from_height=from_height,
+                                              to_height=to_height,
+                                              group_ps=group_ps,
+                                              stats=stats))
+        summary = self.get_detailed_history_summary(
+            stats, from_timestamp=from_timestamp, to_timestamp=to_timestamp,
+            from_height=from_height, to_height=to_height, fx=fx)
+        return {
+            'transactions': out,
+            'summary': summary
+        }
+
+    def iter_detailed_history(
+            self, *,
+            from_timestamp=None,
+            to_timestamp=None,
+            fx=None,
+            show_addresses=False,
+            from_height=None,
+            to_height=None,
+            group_ps=False,
+            domain=None,
+            stats=None):
+        '''Generator of detailed history items. Filters are applied
+        before items are built. Flow totals and first/last items are
+        collected to stats dict if it is passed'''
         if (from_timestamp is not None or to_timestamp is not None) \
                 and (from_height is not None or to_height is not None):
             raise Exception('timestamp and block height based filtering cannot be used together')
-
+        if stats is None:
+            stats = {}
+        stats.update({
+            'income': 0,
+            'expenditures': 0,
+            'capital_gains': Decimal(0),
+            'fiat_income': Decimal(0),
+            'fiat_expenditures': Decimal(0),
+            'first_item': None,
+            'last_item': None,
+        })
+        onchain_history = self.get_onchain_history(
+            domain=domain, group_ps=group_ps,
+            from_timestamp=from_timestamp, to_timestamp=to_timestamp,
+            from_height=from_height, to_height=to_height)
+        return self._iter_detailed_history(onchain_history, fx=fx,
+                                           show_addresses=show_addresses,
+                                           stats=stats)
+
+    def _iter_detailed_history(self, onchain_history, *, fx, show_addresses,
+                               stats):
         show_fiat = fx and fx.is_enabled() and fx.get_history_config()
-        out = []
-        income = 0
-        expenditures = 0
-        capital_gains = Decimal(0)
-        fiat_income = Decimal(0)
-        fiat_expenditures = Decimal(0)
-        now = time.time()
         def_dip2 = not self.psman.unsupported
         show_dip2 = self.config.get('show_dip2_tx_type', def_dip2)
-        for item in self.get_onchain_history(group_ps=group_ps):
+        for item in onchain_history:
             timestamp = item['timestamp']
             islock = item['islock']
             if not timestamp and islock:
                 item['timestamp'] = timestamp = islock
-            if from_timestamp and (timestamp or now) < from_timestamp:
-                continue
-            if to_timestamp and (timestamp or now) >= to_timestamp:
-                continue
-            height = item['height']
-            if from_height is not None and from_height > height > 0:
-                continue
-            if to_height is not None and (height >= to_height or height <= 0):
-                continue
             if show_dip2:
                 tx_type = item['tx_type']
                 tx_type_name = SPEC_TX_NAMES.get(tx_type, str(tx_type))
@@ -1005,105 +1076,107 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
                 group_data = (group_delta_sat, group_balance_sat, group_txids)
                 item['group_data'] = group_data
             tx_hash = item['txid']
-            tx = self.db.get_transaction(tx_hash)
             tx_fee = item['fee_sat']
             item['fee'] = Satoshis(tx_fee) if tx_fee is not None else None
             if show_addresses:
+                tx = self.db.get_transaction(tx_hash)
                 item['inputs'] = list(map(lambda x: x.to_json(), tx.inputs()))
                 item['outputs'] = list(map(lambda x: {'address': x.get_ui_address_str(), 'value': Satoshis(x.value)},
                                            tx.outputs()))
             # fixme: use in and out values
             value = item['bc_value'].value
             if value < 0:
-                expenditures += -value
+                stats['expenditures'] += -value
             else:
-                income += value
+                stats['income'] += value
             # fiat computations
             if show_fiat:
                 fiat_fields = self.get_tx_item_fiat(tx_hash=tx_hash, amount_sat=value, fx=fx, tx_fee=tx_fee)
                 fiat_value = fiat_fields['fiat_value'].value
                 item.update(fiat_fields)
                 if value < 0:
-                    capital_gains += fiat_fields['capital_gain'].value
-                    fiat_expenditures += -fiat_value
+                    stats['capital_gains'] += fiat_fields['capital_gain'].value
+                    stats['fiat_expenditures'] += -fiat_value
                 else:
-                    fiat_income += fiat_value
-            out.append(item)
-        # add summary
-        if out:
-            first_item = out[0]
-            last_item = out[-1]
-            if from_height or to_height:
-                start_height = from_height
-                end_height = to_height
-            else:
-                start_height = first_item['height'] - 1
-                end_height = last_item['height']
+                    stats['fiat_income'] += fiat_value
+            if stats['first_item'] is None:
+                stats['first_item'] = item
+            stats['last_item'] = item
+            yield item
+
+    def get_detailed_history_summary(self, stats, *, from_timestamp=None,
+                                     to_timestamp=None, from_height=None,
+                                     to_height=None, fx=None):
+        '''Summary of history from stats collected by iter_detailed_history'''
+        first_item = stats['first_item']
+        last_item = stats['last_item']
+        if first_item is None:
+            return {}
+        show_fiat = fx and fx.is_enabled() and fx.get_history_config()
+        if from_height or to_height:
+            start_height = from_height
+            end_height = to_height
+        else:
+            start_height = first_item['height'] - 1
+            end_height = last_item['height']
 
-            b = first_item['bc_balance'].value
-            v = first_item['bc_value'].value
-            start_balance = None if b is None or v is None else b - v
-            end_balance = last_item['bc_balance'].value
+        b = first_item['bc_balance'].value
+        v = first_item['bc_value'].value
+        start_balance = None if b is None or v is None else b - v
+        end_balance = last_item['bc_balance'].value
 
-            if from_timestamp is not None and to_timestamp is not None:
-                start_timestamp = from_timestamp
-                end_timestamp = to_timestamp
-            else:
-                start_timestamp = first_item['timestamp']
-                end_timestamp = last_item['timestamp']
-
-            start_coins = self.get_utxos(
-                domain=None,
-                block_height=start_height,
-                confirmed_funding_only=True,
-                confirmed_spending_only=True,
-                nonlocal_only=True)
-            end_coins = self.get_utxos(
-                domain=None,
-                block_height=end_height,
-                confirmed_funding_only=True,
-                confirmed_spending_only=True,
-                nonlocal_only=True)
-
-            def summary_point(timestamp, height, balance, coins):
-                date = timestamp_to_datetime(timestamp)
-                out = {
-                    'date': date,
-                    'block_height': height,
-                    'BTC_balance': Satoshis(balance),
-                }
-                if show_fiat:
-                    ap = self.acquisition_price(coins, fx.timestamp_rate, fx.ccy)
-                    lp = self.liquidation_price(coins, fx.timestamp_rate, timestamp)
-                    out['acquisition_price'] = Fiat(ap, fx.ccy)
-                    out['liquidation_price'] = Fiat(lp, fx.ccy)
-                    out['unrealized_gains'] = Fiat(lp - ap, fx.ccy)
-                    out['fiat_balance'] = Fiat(fx.historical_value(balance, date), fx.ccy)
-                    out['BTC_fiat_price'] = Fiat(fx.historical_value(COIN, date), fx.ccy)
-                return out
-
-            summary_start = summary_point(start_timestamp, start_height, start_balance, start_coins)
-            summary_end = summary_point(end_timestamp, end_height, end_balance, end_coins)
-            flow = {
-                'BTC_incoming': Satoshis(income),
-                'BTC_outgoing': Satoshis(expenditures)
+        if from_timestamp is not None and to_timestamp is not None:
+            start_timestamp = from_timestamp
+            end_timestamp = to_timestamp
+        else:
+            start_timestamp = first_item['timestamp']
+            end_timestamp = last_item['timestamp']
+
+        start_coins = self.get_utxos(
+            domain=None,
+            block_height=start_height,
+            confirmed_funding_only=True,
+            confirmed_spending_only=True,
+            nonlocal_only=True)
+        end_coins = self.get_utxos(
+            domain=None,
+            block_height=end_height,
+            confirmed_funding_only=True,
+            confirmed_spending_only=True,
+            nonlocal_only=True)
+
+        def summary_point(timestamp, height, balance, coins):
+            date = timestamp_to_datetime(timestamp)
+            out = {
+                'date': date,
+                'block_height': height,
+                'BTC_balance': Satoshis(balance),
             }
             if show_fiat:
-                flow['fiat_currency'] = fx.ccy
-                flow['fiat_incoming'] = Fiat(fiat_income, fx.ccy)
-                flow['fiat_outgoing'] = Fiat(fiat_expenditures, fx.ccy)
-                flow['realized_capital_gains'] = Fiat(capital_gains, fx.ccy)
-            summary = {
-                'begin': summary_start,
-                'end': summary_end,
-                'flow': flow,
-            }
-
-        else:
-            summary = {}
+                ap = self.acquisition_price(coins, fx.timestamp_rate, fx.ccy)
+                lp = self.liquidation_price(coins, fx.timestamp_rate, timestamp)
+                out['acquisition_price'] = Fiat(ap, fx.ccy)
+                out['liquidation_price'] = Fiat(lp, fx.ccy)
+                out['unrealized_gains'] = Fiat(lp - ap, fx.ccy)
+                out['fiat_balance'] = Fiat(fx.historical_value(balance, date), fx.ccy)
+                out['BTC_fiat_price'] = Fiat(fx.historical_value(COIN, date), fx.ccy)
+            return out
+
+        summary_start = summary_point(start_timestamp, start_height, start_balance, start_coins)
+        summary_end = summary_point(end_timestamp, end_height, end_balance, end_coins)
+        flow = {
+            'BTC_incoming': Satoshis(stats['income']),
+            'BTC_outgoing': Satoshis(stats['expenditures'])
+        }
+        if show_fiat:
+            flow['fiat_currency'] = fx.ccy
+            flow['fiat_incoming'] = Fiat(stats['fiat_income'], fx.ccy)
+            flow['fiat_outgoing'] = Fiat(stats['fiat_expenditures'], fx.ccy)
+            flow['realized_capital_gains'] = Fiat(stats['capital_gains'], fx.ccy)
         return {
-            'transactions': out,
-            'summary': summary
+            'begin': summary_start,
+            'end': summary_end,
+            'flow': flow,
         }
 
     def acquisition_price(self, coins, price_func, ccy):
@@ -1849,12 +1922,15 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
 
     def add_verified_tx(self, tx_hash, info):
         super().add_verified_tx(tx_hash, info)
+        self.acquisition_cost.invalidate([tx_hash])
         self._update_request_statuses_touched_by_tx(tx_hash)
 
     def undo_verifications(self, blockchain, above_height):
         reorged_txids = super().undo_verifications(blockchain, above_height)
+        self.acquisition_cost.invalidate(reorged_txids)
         for txid in reorged_txids:
             self._update_request_statuses_touched_by_tx(txid)
+        return reorged_txids
 
     def _update_request_statuses_touched_by_tx(self, tx_hash: str) -> None:
         # FIXME in some cases if tx2 replaces unconfirmed tx1 in the mempool, we are not called.
@@ -2030,7 +2106,11 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
                 enc_version = self.get_available_storage_encryption_version()
             else:
                 enc_version = StorageEncryptionVersion.PLAINTEXT
-            self.storage.set_password(new_pw, enc_version)
+            # chunked format is opt-in, upgrade on password change
+            chunked = self.config.get('wallet_chunked_encryption') or None
+            with self.db.lock:  # do not race with background saver
+                self.storage.set_password(new_pw, enc_version,
+                                          chunked=chunked)
 
         if self.psman.enabled and old_pw is None and new_pw:
             self.psman.on_wallet_password_set()
@@ -2048,7 +2128,7 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
             self.psman.after_wallet_password_set(old_pw, new_pw)
         encrypt_keystore = self.can_have_keystore_encryption()
         self.db.set_keystore_encryption(bool(new_pw) and encrypt_keystore)
-        self.save_db()
+        self.save_db(flush=True)
 
     @abstractmethod
     def _update_password_for_keystore(self, old_pw: Optional[str], new_pw: Optional[str]) -> None:
@@ -2096,43 +2176,18 @@ class Abstract_Wallet(AddressSynchronizer, ABC):
 
     def average_price(self, txid, price_func, ccy) -> Decimal:
         """ Average acquisition price of the inputs of a transaction """
-        input_value = 0
-        total_price = 0
-        txi_addresses = self.db.get_txi_addresses(txid)
-        if not txi_addresses:
-            return Decimal('NaN')
-        for addr in txi_addresses:
-            d = self.db.get_txi_addr(txid, addr)
-            for ser, v in d:
-                input_value += v
-                total_price += self.coin_price(ser.split(':')[0], price_func, ccy, v)
-        return total_price / (input_value/Decimal(COIN))
+        return self.acquisition_cost.average_price(txid, price_func, ccy)
 
     def clear_coin_price_cache(self):
-        self._coin_price_cache = {}
+        self.acquisition_cost.clear()
 
     def coin_price(self, txid, price_func, ccy, txin_value) -> Decimal:
         """
         Acquisition price of a coin.
         This assumes that either all inputs are mine, or no input is mine.
         """
-        if txin_value is None:
-            return Decimal('NaN')
-        cache_key = "{}:{}:{}".format(str(txid), str(ccy), str(txin_value))
-        result = self._coin_price_cache.get(cache_key, None)
-        if result is not None:
-            return result
-        if self.db.get_txi_addresses(txid):
-            result = self.average_price(txid, price_func, ccy) * txin_value/Decimal(COIN)
-            self._coin_price_cache[cache_key] = result
-            return result
-        else:
-            fiat_value = self.get_fiat_value(txid, ccy)
-            if fiat_value is not None:
-                return fiat_value
-            else:
-                p = self.price_at_timestamp(txid, price_func)
-                return p * txin_value/Decimal(COIN)
+        return self.acquisition_cost.coin_price(txid, price_func, ccy,
+                                                txin_value)
 
     @abstractmethod
     def is_watching_only(self) -> bool:
@@ -2364,6 +2419,8 @@ class Imported_Wallet(Simple_Wallet):
             self.db.remove_addr_history(address)
             for tx_hash in transactions_to_remove:
                 self.remove_transaction(tx_hash)
+            for tx_hash in transactions_new:
+                self.invalidate_tx_calc_cache(tx_hash)
         self.set_label(address, None)
         self.remove_payment_request(address)
         self.set_frozen_state_of_addresses([address], False)
@@ -2888,7 +2945,7 @@ def create_new_wallet(*, path, config: SimpleConfig, passphrase=None, password=N
     wallet.update_password(old_pw=None, new_pw=password, encrypt_storage=encrypt_file)
     wallet.synchronize()
     msg = "Please keep your seed in a safe place; if you lose it, you will not be able to restore your wallet."
-    wallet.save_db()
+    wallet.save_db(flush=True)
     return {'seed': seed, 'wallet': wallet, 'msg': msg}
 
 
@@ -2936,7 +2993,7 @@ def restore_wallet_from_text(text, *, path, config: SimpleConfig,
     wallet.synchronize()
     msg = ("This wallet was restored offline. It may contain more addresses than displayed. "
            "Start a daemon and use load_wallet to sync its history.")
-    wallet.save_db()
+    wallet.save_db(flush=True)
     return {'wallet': wallet, 'msg': msg}
 
 
@@ -1750,3 +1750,94 @@ class WalletDB(JsonDB):
 
     def set_keystore_encryption(self, enable):
         self.put('use_encryption', enable)
+
+
+class WalletSaver(Logger):
+    '''Coalesce wallet db save requests and write them from a worker thread'''
+
+    DEFAULT_DELAY = 1.0  # seconds
+
+    def __init__(self, db: WalletDB, storage: Optional['WalletStorage'],
+                 *, delay: float = DEFAULT_DELAY):
+        Logger.__init__(self)
+        self.db = db
+        self.storage = storage
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._timer = None  # type: Optional[threading.Timer]
+        self.saves_requested = 0
+        self.saves_performed = 0
+        self.save_secs = 0.0
+
+    def request_save(self):
+        '''Schedule db write after delay, requests made meanwhile are merged'''
+        if not self.storage:
+            return
+        with self._lock:
+            self.saves_requested += 1
+            if self.delay <= 0:
+                timer = None
+            elif self._timer is not None:
+                return
+            else:
+                # Timer thread must not be daemon as WalletDB._write
+                # refuses to run in daemon threads, this also ensures
+                # pending write is done before interpreter exit
+                timer = self._timer = threading.Timer(self.delay,
+                                                      self._on_timer)
+                timer.name = 'WalletSaver'
+                timer.daemon = False
+        if timer is None:
+            self._save()
+        else:
+            timer.start()
+
+    def _on_timer(self):
+        '''Write db now, pending timer (if fired not by itself) is cancelled'''
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None and timer is not threading.current_thread():
+            timer.cancel()
+        try:
+            self._save()
+        except Exception as e:
+            self.logger.exception(f'wallet db save failed: {repr(e)}')
+
+    def flush(self):
+        '''Cancel pending delayed save and write db on the calling thread'''
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        self._save()
+
+    def has_pending_save(self) -> bool:
+        return self._timer is not None
+
+    def _save(self):
+        if not self.storage:
+            return
+        # short-lived wallet can be removed with its directory before
+        # delayed save is done, do not try to write it then
+        if not os.path.isdir(os.path.dirname(self.storage.path)):
+            self.logger.warning(f'wallet directory is removed,'
+                                f' skip saving {self.storage.path}')
+            return
+        with self.db.lock:
+            if not self.db.modified():
+                return
+            start = time.monotonic()
+            self.db.write(self.storage)
+            if self.db.modified():  # write was refused
+                return
+            self.save_secs += time.monotonic() - start
+            self.saves_performed += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                'saves_requested': self.saves_requested,
+                'saves_performed': self.saves_performed,
+                'save_secs': round(self.save_secs, 3),
+                'pending': self._timer is not None,
+            }